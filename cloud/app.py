@@ -1,54 +1,48 @@
-from fastapi import Depends, FastAPI, HTTPException, status
+from datetime import timedelta
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional, Union
+import json
+import os
 import socketio
+import zlib
 
-from .sql_app import auth, crud, models, schemas
-from .sql_app.database import SessionLocal, engine
+from .broadcast import ChangeBroadcaster, client_manager, profile_room
+from .sql_app import auth, cache, crud, models, schemas
+from .sql_app.database import AsyncSessionLocal, init_models
 from .sql_app.auth import get_current_user_from_token
 
 
-models.Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="TAB Report Crusher - Cloud Sync API",
     description="Syncs profiles, rules, and other settings.",
     version="0.1.0"
 )
 
+@app.on_event("startup")
+async def startup():
+    await init_models()
+
 # --- Database Dependency ---
-def get_db():
-    db = SessionLocal()
-    try:
+# Every endpoint is async and awaits the database, so a slow query never holds
+# up the event loop that also serves the Socket.IO clients.
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+        # Reached only if the request succeeded; hand its committed writes to the subscribers.
+        for change in crud.pop_committed_changes(db):
+            broadcaster.publish(*change)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# --- User Model & Schema (for auth) ---
-# TODO: Move these to models.py and schemas.py respectively
-class User(models.Base):
-    __tablename__ = "users"
-    id = models.Column(models.Integer, primary_key=True, index=True)
-    username = models.Column(models.String, unique=True, index=True)
-    hashed_password = models.Column(models.String)
-    role = models.Column(models.String, default="viewer") # 'viewer' or 'manager'
-
-class UserCreate(schemas.BaseModel):
-    username: str
-    password: str
-
-class UserInDB(schemas.BaseModel):
-    username: str
-    role: str
-
 # --- Authentication Endpoints ---
 @app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await crud.get_user_by_username(db, username=form_data.username)
+    # bcrypt is deliberately slow; verify off the event loop.
+    if not user or not await run_in_threadpool(auth.verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -61,11 +55,11 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/users/", response_model=schemas.UserInDB)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await crud.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user(db=db, user=user)
 
 
 # --- Dependency for verifying Manager role ---
@@ -78,8 +72,12 @@ async def get_current_manager(current_user: dict = Depends(get_current_user_from
     return current_user
 
 # --- WebSocket Server ---
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*", client_manager=client_manager())
 sio_app = socketio.ASGIApp(sio, app)
+broadcaster = ChangeBroadcaster(sio)
+
+# Subscriptions a single socket may hold; a client only needs the profiles it uses.
+MAX_SUBSCRIPTIONS = 100
 
 @sio.event
 async def connect(sid, environ):
@@ -89,7 +87,22 @@ async def connect(sid, environ):
 async def disconnect(sid):
     print(f"WebSocket disconnected: {sid}")
 
-# TODO: Add events for broadcasting profile/rule updates
+@sio.event
+async def subscribe(sid, data):
+    """Joins the rooms of data["profile_ids"]. Returns the ids subscribed to."""
+    profile_ids = [str(profile_id) for profile_id in (data or {}).get("profile_ids", [])][:MAX_SUBSCRIPTIONS]
+    for profile_id in profile_ids:
+        await sio.enter_room(sid, profile_room(profile_id))
+    return {"profile_ids": profile_ids}
+
+@sio.event
+async def unsubscribe(sid, data):
+    for profile_id in (data or {}).get("profile_ids", []):
+        await sio.leave_room(sid, profile_room(str(profile_id)))
+
+@app.on_event("shutdown")
+async def shutdown():
+    await broadcaster.drain()
 
 # --- API Endpoints ---
 
@@ -100,18 +113,70 @@ def read_root():
 # --- Profiles Endpoints ---
 
 @app.post("/profiles/", response_model=schemas.Profile)
-def create_profile(profile: schemas.ProfileCreate, db: Session = Depends(get_db)):
+async def create_profile(profile: schemas.ProfileCreate, db: AsyncSession = Depends(get_db)):
     # TODO: Add check for existing profile by name
-    return crud.create_profile(db=db, profile=profile)
+    return await crud.create_profile(db=db, profile=profile)
 
-@app.get("/profiles/", response_model=list[schemas.Profile])
-def read_profiles(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    profiles = crud.get_profiles(db, skip=skip, limit=limit)
-    return profiles
+def _profile_item(profile: models.Profile, summary: bool) -> dict:
+    """schemas.Profile, or schemas.ProfileListing for the summary view, as a dict."""
+    if summary:
+        return {
+            "id": profile.id,
+            "name": profile.name,
+            "version": profile.version,
+            "rules": [{"id": rule.id, "version": rule.version} for rule in profile.rules],
+        }
+    return {
+        "id": profile.id,
+        "name": profile.name,
+        "json_data": profile.json_data,
+        "version": profile.version,
+        "rules": [
+            {"id": rule.id, "profile_id": rule.profile_id, "yaml_rule": rule.yaml_rule, "version": rule.version}
+            for rule in profile.rules
+        ],
+    }
+
+@app.get(
+    "/profiles/",
+    # The body is serialized by hand (and cached), so this only documents it.
+    response_model=Union[List[schemas.Profile], List[schemas.ProfileListing]],
+    responses={200: {
+        "description": "schemas.Profile items, or schemas.ProfileListing items for view=summary",
+        "headers": {"X-Next-Cursor": {
+            "description": "The `after` value for the next page; absent on the last page",
+            "schema": {"type": "string"},
+        }},
+    }},
+)
+async def read_profiles(
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    view: Literal["full", "summary"] = "full",
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Profiles ordered by id, `limit` at a time. When there may be more, the
+    X-Next-Cursor header holds the `after` value for the next page.
+    view=summary returns schemas.ProfileListing items: versions without bodies.
+    """
+    # Pages are served from the cache until the change log moves on.
+    version = await crud.get_latest_version(db)
+    key = (view, after, limit)
+    page = cache.profile_listing.get(key, version)
+    if page is None:
+        profiles = await crud.get_profiles(db, after=after, limit=limit, summary=view == "summary")
+        body = json.dumps([_profile_item(profile, view == "summary") for profile in profiles]).encode()
+        next_cursor = profiles[-1].id if len(profiles) == limit else None
+        page = (body, next_cursor)
+        cache.profile_listing.put(key, version, page)
+    body, next_cursor = page
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/profiles/{profile_id}", response_model=schemas.Profile)
-def read_profile(profile_id: str, db: Session = Depends(get_db)):
-    db_profile = crud.get_profile(db, profile_id=profile_id)
+async def read_profile(profile_id: str, db: AsyncSession = Depends(get_db)):
+    db_profile = await crud.get_profile(db, profile_id=profile_id)
     if db_profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     return db_profile
@@ -121,35 +186,136 @@ def read_profile(profile_id: str, db: Session = Depends(get_db)):
 async def update_profile(
     profile_id: str,
     profile: schemas.ProfileCreate,
-    db: Session = Depends(get_db),
-    current_user: UserInDB = Depends(get_current_manager)
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserInDB = Depends(get_current_manager)
 ):
-    db_profile = crud.update_profile(db, profile_id, profile)
+    # Subscribers of the profile are notified by get_db once this returns.
+    db_profile = await crud.update_profile(db, profile_id, profile)
     if not db_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-
-    # Broadcast this update to all connected clients
-    await sio.emit('profile_updated', {'profile_id': profile_id, 'name': profile.name})
-    
     return db_profile
 
+@app.delete("/profiles/{profile_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_profile(
+    profile_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserInDB = Depends(get_current_manager)
+):
+    if not await crud.delete_profile(db, profile_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 # --- Rules Endpoints ---
 
 @app.post("/profiles/{profile_id}/rules/", response_model=schemas.Rule)
-def create_rule_for_profile(
-    profile_id: str, rule: schemas.RuleCreate, db: Session = Depends(get_db)
+async def create_rule_for_profile(
+    profile_id: str, rule: schemas.RuleCreate, db: AsyncSession = Depends(get_db)
 ):
     # TODO: Ensure profile exists before adding rule
-    return crud.create_rule_for_profile(db=db, rule=rule, profile_id=profile_id)
+    return await crud.create_rule_for_profile(db=db, rule=rule, profile_id=profile_id)
 
 @app.get("/rules/", response_model=list[schemas.Rule])
-def read_rules(profile_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    rules = crud.get_rules_by_profile(db, profile_id=profile_id, skip=skip, limit=limit)
+async def read_rules(profile_id: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    rules = await crud.get_rules_by_profile(db, profile_id=profile_id, skip=skip, limit=limit)
     return rules
 
+@app.put("/rules/{rule_id}", response_model=schemas.Rule)
+async def update_rule(
+    rule_id: str,
+    rule: schemas.RuleCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserInDB = Depends(get_current_manager)
+):
+    db_rule = await crud.update_rule(db, rule_id, rule)
+    if not db_rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return db_rule
+
+@app.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_rule(
+    rule_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserInDB = Depends(get_current_manager)
+):
+    if not await crud.delete_rule(db, rule_id):
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+# --- Sync Endpoints ---
+# Both responses are fully determined by the latest change log id, so it is
+# used as the ETag. A poll with a matching If-None-Match costs one indexed
+# max() query and returns an empty 304.
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.get("/versions", response_model=schemas.Versions)
+async def read_versions(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    version = await crud.get_latest_version(db)
+    etag = f'"v{version}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return await crud.get_versions(db, version)
+
+@app.get("/deltas", response_model=schemas.Deltas)
+async def read_deltas(request: Request, response: Response, since: int = 0, db: AsyncSession = Depends(get_db)):
+    """Profiles and rules created, updated or deleted after change log version `since`."""
+    version = await crud.get_latest_version(db)
+    etag = f'"d{since}-{version}"'
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return await crud.get_deltas(db, since, version)
+
+# Largest /sync/batch body accepted, after decompression.
+MAX_SYNC_BATCH_BYTES = int(os.environ.get("MAX_SYNC_BATCH_BYTES", str(64 * 1024 * 1024)))
+
+def _decode_sync_batch(body: bytes, content_encoding: str) -> schemas.SyncBatchIn:
+    if content_encoding == "gzip":
+        # Bounded, so a small compressed body cannot expand without limit.
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_SYNC_BATCH_BYTES)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Invalid gzip body")
+        if decompressor.unconsumed_tail:
+            raise HTTPException(status_code=413, detail="Sync batch too large")
+    elif content_encoding:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {content_encoding}")
+    if len(body) > MAX_SYNC_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail="Sync batch too large")
+    try:
+        return schemas.SyncBatchIn(**json.loads(body))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid sync batch: {e}")
+
+@app.post("/sync/batch", response_model=schemas.SyncBatchResult)
+async def sync_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserInDB = Depends(get_current_manager)
+):
+    """
+    Applies a desktop client's queued offline writes in one transaction. The
+    body is a schemas.SyncBatchIn, optionally gzip-compressed. Retrying with
+    the same batch_id is safe: an applied batch is not applied again.
+    """
+    body = await request.body()
+    content_encoding = request.headers.get("content-encoding", "").strip().lower()
+    # Decompressing and parsing a large batch would stall the event loop.
+    batch = await run_in_threadpool(_decode_sync_batch, body, content_encoding)
+    return await crud.apply_sync_batch(db, batch)
+
 # TODO: Implement /auth endpoint
-# TODO: Implement /deltas endpoint
-# TODO: Implement /versions endpoint
 
 # Placeholder for a protected route
 @app.get("/manager/test", dependencies=[Depends(get_current_manager)])
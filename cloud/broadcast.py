@@ -0,0 +1,91 @@
+"""
+Coalesced profile change broadcasts over Socket.IO.
+
+Clients join one room per profile they use (the `subscribe` event) and get a
+`profile_changes` message when that profile or its rules change. Changes to a
+profile within BROADCAST_WINDOW_MS are merged into one message carrying the
+new field values, the ids of deleted rules and the change log version, so a
+client can apply it as-is and resume /deltas polling from that version.
+
+Messages go through the Socket.IO client manager. Set SOCKETIO_MESSAGE_QUEUE
+to a Redis URL to fan them out to the sockets of every uvicorn worker;
+without it the default in-process manager is used, which is also what tests
+run against.
+"""
+
+import asyncio
+import os
+import sys
+
+import socketio
+
+BROADCAST_WINDOW_MS = int(os.environ.get("BROADCAST_WINDOW_MS", "250"))
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+
+def client_manager():
+    """The Socket.IO pub/sub backend: Redis when configured, else in-process."""
+    if SOCKETIO_MESSAGE_QUEUE:
+        # Needs the `redis` package.
+        return socketio.AsyncRedisManager(SOCKETIO_MESSAGE_QUEUE)
+    return socketio.AsyncManager()
+
+def profile_room(profile_id: str) -> str:
+    return f"profile:{profile_id}"
+
+class ChangeBroadcaster:
+    """Buffers committed changes per profile and emits each buffer once its window has passed."""
+
+    def __init__(self, sio: socketio.AsyncServer, window_ms: int = BROADCAST_WINDOW_MS):
+        self.sio = sio
+        self.window = window_ms / 1000
+        self._pending = {}
+        self._timers = {}
+        # Emits in flight, kept referenced until they finish.
+        self._tasks = set()
+
+    def publish(self, profile_id: str, version: int, entity_type: str, entity_id: str, op: str, fields: dict = None):
+        """
+        Queues one change. `fields` are the entity's values after an upsert
+        and None for a delete. Must be called on the event loop.
+        """
+        message = self._pending.get(profile_id)
+        if message is None:
+            message = self._pending[profile_id] = {
+                "profile_id": profile_id, "version": version, "profile": None, "deleted": False, "rules": {},
+            }
+            self._timers[profile_id] = asyncio.get_running_loop().call_later(self.window, self._flush, profile_id)
+        message["version"] = max(message["version"], version)
+        if entity_type == "rule":
+            # Last write wins: an upsert followed by a delete is a delete.
+            message["rules"][entity_id] = fields
+        elif op == "delete":
+            message["deleted"] = True
+            message["profile"] = None
+        else:
+            message["profile"] = {**(message["profile"] or {}), **fields}
+
+    def _flush(self, profile_id: str):
+        message = self._pending.pop(profile_id)
+        self._timers.pop(profile_id).cancel()
+        rules = message.pop("rules")
+        message["rules"] = {
+            "upserted": [{"id": rule_id, **fields} for rule_id, fields in rules.items() if fields is not None],
+            "deleted": [rule_id for rule_id, fields in rules.items() if fields is None],
+        }
+        task = asyncio.ensure_future(self._emit(profile_id, message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _emit(self, profile_id: str, message: dict):
+        try:
+            await self.sio.emit("profile_changes", message, room=profile_room(profile_id))
+        except Exception as e:
+            # Clients still catch up through /deltas.
+            print(f"Failed to broadcast changes to profile {profile_id}: {e}", file=sys.stderr)
+
+    async def drain(self):
+        """Emits everything still buffered; for shutdown and tests."""
+        for profile_id in list(self._pending):
+            self._flush(profile_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
@@ -0,0 +1,194 @@
+"""
+Load test for the cloud sync API.
+
+Simulates desktop clients polling for settings changes while a manager edits
+a profile. Each client polls /deltas with its last version and ETag, fetching
+the changes whenever there are any, and now and then reloads the full profile
+list. Reports throughput and latency percentiles per endpoint as JSON.
+
+Usage:
+    python loadtest.py --sqlite --clients 50 --duration 20
+    python loadtest.py --url http://localhost:8000 --token <manager JWT> --clients 200
+
+--sqlite runs the API in-process against a temporary SQLite database (needs
+aiosqlite); --url targets a running server, e.g. the docker-compose stack.
+Needs httpx (pip install httpx).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = 0
+
+    async def request(self, client, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception as e:
+            self.errors += 1
+            print(f"{name} failed: {e}", file=sys.stderr)
+            return None
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, values in self.latencies.items():
+            values = sorted(values)
+            endpoints[name] = {
+                "requests": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        everything = sorted(v for values in self.latencies.values() for v in values)
+        return {
+            "seconds": round(elapsed, 1),
+            "requests": len(everything),
+            "requests_per_second": round(len(everything) / elapsed, 1) if elapsed else None,
+            "p50_ms": round(percentile(everything, 50) * 1000, 1),
+            "p99_ms": round(percentile(everything, 99) * 1000, 1),
+            "errors": self.errors,
+            "statuses": {str(code): n for code, n in sorted(self.statuses.items())},
+            "endpoints": endpoints,
+        }
+
+async def desktop_client(client, stats: Stats, deadline: float, poll_interval: float, reload_every: int):
+    """Polls /deltas like the desktop app does, reloading all profiles every `reload_every` polls."""
+    since, etag = 0, None
+    polls = 0
+    # Stagger the clients so they do not poll in lockstep.
+    await asyncio.sleep(random.uniform(0, poll_interval))
+    while time.perf_counter() < deadline:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await stats.request(client, "deltas", "GET", f"/deltas?since={since}", headers=headers)
+        if response is not None and response.status_code == 200:
+            since = response.json()["version"]
+            etag = response.headers.get("etag")
+        polls += 1
+        if reload_every and polls % reload_every == 0:
+            await stats.request(client, "profiles", "GET", "/profiles/")
+        await asyncio.sleep(min(poll_interval, max(0.0, deadline - time.perf_counter())))
+
+async def manager(client, stats: Stats, deadline: float, profile: dict, rules: list, writes_per_second: float):
+    """Edits the profile and its rules at a steady rate."""
+    version = profile["version"]
+    while time.perf_counter() < deadline:
+        version += 1
+        if rules and random.random() < 0.7:
+            rule = random.choice(rules)
+            await stats.request(client, "update_rule", "PUT", f"/rules/{rule['id']}",
+                                json={"yaml_rule": rule["yaml_rule"], "version": version})
+        else:
+            await stats.request(client, "update_profile", "PUT", f"/profiles/{profile['id']}",
+                                json={"name": profile["name"], "json_data": profile["json_data"], "version": version})
+        await asyncio.sleep(min(1 / writes_per_second, max(0.0, deadline - time.perf_counter())))
+
+async def seed(client, rules: int) -> tuple:
+    """Returns (profile, rules) to edit: the first existing profile, or a new one."""
+    profiles = (await client.get("/profiles/?limit=1")).json()
+    if profiles:
+        return profiles[0], profiles[0]["rules"]
+    profile = (await client.post("/profiles/", json={
+        "name": "Load Test", "json_data": json.dumps({"airflow_tolerance": 10}), "version": 1,
+    })).json()
+    created = []
+    for i in range(rules):
+        created.append((await client.post(f"/profiles/{profile['id']}/rules/", json={
+            "yaml_rule": f"name: rule-{i}\ncheck: actual / design\nmax: 1.1\n", "version": 1,
+        })).json())
+    return profile, created
+
+async def run(args, client) -> dict:
+    profile, rules = await seed(client, args.rules)
+    stats = Stats()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    tasks = [
+        desktop_client(client, stats, deadline, args.poll_interval, args.reload_every)
+        for _ in range(args.clients)
+    ]
+    if args.writes_per_second > 0:
+        tasks.append(manager(client, stats, deadline, profile, rules, args.writes_per_second))
+    await asyncio.gather(*tasks)
+    result = stats.report(time.perf_counter() - started)
+    result["clients"] = args.clients
+    return result
+
+async def run_in_process(args) -> dict:
+    import httpx
+
+    # The app reads DATABASE_URL on import, so set it first.
+    temp_dir = tempfile.mkdtemp(prefix="tab_crusher_loadtest_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(temp_dir) / 'loadtest.db'}"
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from cloud import app as cloud_app
+    from cloud.sql_app.database import engine, init_models
+
+    await init_models()
+    # Writes need a manager; skip authentication in-process.
+    cloud_app.app.dependency_overrides[cloud_app.get_current_manager] = lambda: {"role": "manager"}
+    limits = httpx.Limits(max_connections=None)
+    transport = httpx.ASGITransport(app=cloud_app.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", limits=limits) as client:
+            return await run(args, client)
+    finally:
+        await engine.dispose()
+
+async def run_against_server(args) -> dict:
+    import httpx
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    if not args.token:
+        print("No --token given; running read-only.", file=sys.stderr)
+        args.writes_per_second = 0
+    limits = httpx.Limits(max_connections=args.clients + 1)
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=30) as client:
+        return await run(args, client)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base URL of a running API")
+    target.add_argument("--sqlite", action="store_true", help="Run the API in-process on a temporary SQLite database")
+    parser.add_argument("--token", help="Manager JWT for the write load (with --url)")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent desktop clients")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between a client's polls")
+    parser.add_argument("--reload-every", type=int, default=20, help="Polls between full profile reloads (0: never)")
+    parser.add_argument("--writes-per-second", type=float, default=0.5, help="Manager edits per second")
+    parser.add_argument("--rules", type=int, default=50, help="Rules to create when seeding a new profile")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    try:
+        result = asyncio.run(run_in_process(args) if args.sqlite else run_against_server(args))
+    except ImportError as e:
+        sys.exit(f"Missing dependency for the load test: {e}")
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
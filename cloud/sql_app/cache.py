@@ -0,0 +1,40 @@
+from collections import OrderedDict
+import os
+
+# Serialized responses kept per process. A listing page is a few KB to a few hundred KB.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses, tagged with the change log version they were built at.
+
+    Entries are dropped explicitly by the write endpoints of this process, and a
+    lookup also misses when the version has moved on, which covers writes made
+    through another worker process.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version: int):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, version: int, value):
+        self._entries[key] = (version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self._entries.clear()
+
+profile_listing = ResponseCache()
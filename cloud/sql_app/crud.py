@@ -1,53 +1,336 @@
-from sqlalchemy.orm import Session
-from . import models, schemas, auth
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, selectinload
+from starlette.concurrency import run_in_threadpool
+from . import cache, models, schemas, auth
+import json
 import uuid
 
 # --- User CRUD ---
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    # bcrypt is deliberately slow; hash off the event loop.
+    hashed_password = await run_in_threadpool(auth.get_password_hash, user.password)
     db_user = models.User(id=str(uuid.uuid4()), username=user.username, hashed_password=hashed_password, role="viewer")
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return db_user
 
+# --- Change Log ---
+
+# Postgres advisory lock held by every transaction that appends to the change log.
+# Without it two writers could commit out of id order, and a client that synced
+# up to the later id would never see the earlier one.
+CHANGE_LOG_LOCK_ID = 0x7AB5C0DE
+
+def _profile_fields(profile: models.Profile) -> dict:
+    return {"name": profile.name, "json_data": profile.json_data, "version": profile.version}
+
+def _rule_fields(rule: models.Rule) -> dict:
+    return {"yaml_rule": rule.yaml_rule, "version": rule.version}
+
+async def _log_change(db: AsyncSession, entity_type: str, entity_id: str, op: str, profile_id: str,
+                      fields: dict = None):
+    """
+    Appends to the change log in the caller's transaction, so a write and its
+    log entry commit together. The change, with the entity's new `fields`, is
+    also kept in db.info["changes"] for get_db() to broadcast after commit.
+    """
+    transaction = db.sync_session.get_transaction()
+    if db.get_bind().dialect.name == "postgresql" and db.info.get("change_log_locked") is not transaction:
+        await db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": CHANGE_LOG_LOCK_ID})
+        db.info["change_log_locked"] = transaction
+    entry = models.ChangeLog(entity_type=entity_type, entity_id=entity_id, op=op)
+    db.add(entry)
+    db.info.setdefault("changes", []).append((entry, profile_id, fields))
+    cache.profile_listing.invalidate()
+
+def pop_committed_changes(db: AsyncSession) -> list:
+    """Returns (profile_id, version, entity_type, entity_id, op, fields) for every change committed in this session."""
+    changes = db.info.pop("changes", [])
+    # An entry without an id was never written.
+    return [
+        (profile_id, entry.id, entry.entity_type, entry.entity_id, entry.op, fields)
+        for entry, profile_id, fields in changes if entry.id is not None
+    ]
+
+async def get_latest_version(db: AsyncSession) -> int:
+    # max() over the primary key is answered from the index.
+    return await db.scalar(select(func.max(models.ChangeLog.id))) or 0
+
+async def get_versions(db: AsyncSession, version: int = None) -> dict:
+    """The latest change log version and the version of every profile (see schemas.Versions)."""
+    profiles = (await db.execute(select(models.Profile.id, models.Profile.version))).all()
+    return {
+        "version": await get_latest_version(db) if version is None else version,
+        "profiles": {profile_id: profile_version for profile_id, profile_version in profiles},
+    }
+
+async def get_deltas(db: AsyncSession, since: int, version: int = None) -> dict:
+    """
+    Returns the current state of every profile and rule written after change
+    `since` up to change `version` (default: the latest), and what was deleted
+    (see schemas.Deltas).
+    """
+    if version is None:
+        version = await get_latest_version(db)
+    reset = since < 0 or since > version
+    if reset:
+        # The client's version does not come from this log; send everything.
+        since = 0
+
+    # Only the last change per entity matters: a rule created and then deleted is just a delete.
+    latest = (
+        select(func.max(models.ChangeLog.id))
+        .where(models.ChangeLog.id > since, models.ChangeLog.id <= version)
+        .group_by(models.ChangeLog.entity_type, models.ChangeLog.entity_id)
+    )
+    changes = (await db.execute(
+        select(models.ChangeLog.entity_type, models.ChangeLog.entity_id, models.ChangeLog.op)
+        .where(models.ChangeLog.id.in_(latest))
+    )).all()
+    upserted = {"profile": [], "rule": []}
+    deleted = {"profile": [], "rule": []}
+    for entity_type, entity_id, op in changes:
+        (deleted if op == "delete" else upserted)[entity_type].append(entity_id)
+
+    profiles = []
+    if upserted["profile"]:
+        profiles = (await db.execute(
+            select(models.Profile).where(models.Profile.id.in_(upserted["profile"]))
+        )).scalars().all()
+    rules = []
+    if upserted["rule"]:
+        rules = (await db.execute(
+            select(models.Rule).where(models.Rule.id.in_(upserted["rule"]))
+        )).scalars().all()
+    return {
+        "since": since,
+        "version": version,
+        "reset": reset,
+        "profiles": profiles,
+        "rules": rules,
+        "deleted": {"profiles": deleted["profile"], "rules": deleted["rule"]},
+    }
+
 # --- Profile CRUD ---
+# Profiles are returned with their rules. Lazy loading cannot run under an
+# AsyncSession, so the rules are always loaded eagerly.
 
-def get_profile(db: Session, profile_id: str):
-    return db.query(models.Profile).filter(models.Profile.id == profile_id).first()
+async def get_profile(db: AsyncSession, profile_id: str):
+    result = await db.execute(
+        select(models.Profile).options(selectinload(models.Profile.rules)).where(models.Profile.id == profile_id)
+    )
+    return result.scalars().first()
 
-def get_profiles(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Profile).offset(skip).limit(limit).all()
+async def get_profiles(db: AsyncSession, after: str = None, limit: int = 100, summary: bool = False):
+    """
+    One page of profiles ordered by id, starting after profile id `after`.
 
-def update_profile(db: Session, profile_id: str, profile_data: schemas.ProfileCreate):
-    db_profile = db.query(models.Profile).filter(models.Profile.id == profile_id).first()
+    Keyset pagination: every page is an index range scan, however deep.
+    All rules of the page are loaded in one extra query. With `summary` only
+    the ids, names and versions are loaded, not profile data or rule bodies.
+    """
+    rules = selectinload(models.Profile.rules)
+    query = select(models.Profile)
+    if summary:
+        rules = rules.load_only(models.Rule.id, models.Rule.profile_id, models.Rule.version)
+        query = query.options(load_only(models.Profile.id, models.Profile.name, models.Profile.version))
+    query = query.options(rules).order_by(models.Profile.id).limit(limit)
+    if after is not None:
+        query = query.where(models.Profile.id > after)
+    return (await db.execute(query)).scalars().all()
+
+async def update_profile(db: AsyncSession, profile_id: str, profile_data: schemas.ProfileCreate):
+    db_profile = await get_profile(db, profile_id)
     if db_profile:
         db_profile.name = profile_data.name
         db_profile.json_data = profile_data.json_data
         db_profile.version = profile_data.version
-        db.commit()
-        db.refresh(db_profile)
+        await _log_change(db, "profile", profile_id, "upsert", profile_id, _profile_fields(db_profile))
+        await db.commit()
     return db_profile
 
-def create_profile(db: Session, profile: schemas.ProfileCreate):
-    db_profile = models.Profile(**profile.dict(), id=str(uuid.uuid4()))
+async def create_profile(db: AsyncSession, profile: schemas.ProfileCreate):
+    db_profile = models.Profile(**profile.dict(), id=str(uuid.uuid4()), rules=[])
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await _log_change(db, "profile", db_profile.id, "upsert", db_profile.id, _profile_fields(db_profile))
+    await db.commit()
     return db_profile
 
+async def delete_profile(db: AsyncSession, profile_id: str) -> bool:
+    """Deletes a profile and its rules. Returns False if there is no such profile."""
+    db_profile = await get_profile(db, profile_id)
+    if db_profile is None:
+        return False
+    for db_rule in db_profile.rules:
+        await db.delete(db_rule)
+        await _log_change(db, "rule", db_rule.id, "delete", profile_id)
+    await db.delete(db_profile)
+    await _log_change(db, "profile", profile_id, "delete", profile_id)
+    await db.commit()
+    return True
+
 # --- Rule CRUD ---
 
-def get_rules_by_profile(db: Session, profile_id: str, skip: int = 0, limit: int = 100):
-    return db.query(models.Rule).filter(models.Rule.profile_id == profile_id).offset(skip).limit(limit).all()
+async def get_rule(db: AsyncSession, rule_id: str):
+    return await db.get(models.Rule, rule_id)
+
+async def get_rules_by_profile(db: AsyncSession, profile_id: str, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(models.Rule).where(models.Rule.profile_id == profile_id)
+        .order_by(models.Rule.id).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
 
-def create_rule_for_profile(db: Session, rule: schemas.RuleCreate, profile_id: str):
+async def create_rule_for_profile(db: AsyncSession, rule: schemas.RuleCreate, profile_id: str):
     db_rule = models.Rule(**rule.dict(), profile_id=profile_id, id=str(uuid.uuid4()))
     db.add(db_rule)
-    db.commit()
-    db.refresh(db_rule)
-    return db_rule 
\ No newline at end of file
+    await _log_change(db, "rule", db_rule.id, "upsert", profile_id, _rule_fields(db_rule))
+    await db.commit()
+    return db_rule
+
+async def update_rule(db: AsyncSession, rule_id: str, rule_data: schemas.RuleCreate):
+    db_rule = await get_rule(db, rule_id)
+    if db_rule:
+        db_rule.yaml_rule = rule_data.yaml_rule
+        db_rule.version = rule_data.version
+        await _log_change(db, "rule", rule_id, "upsert", db_rule.profile_id, _rule_fields(db_rule))
+        await db.commit()
+    return db_rule
+
+async def delete_rule(db: AsyncSession, rule_id: str) -> bool:
+    db_rule = await get_rule(db, rule_id)
+    if db_rule is None:
+        return False
+    await db.delete(db_rule)
+    await _log_change(db, "rule", rule_id, "delete", db_rule.profile_id)
+    await db.commit()
+    return True
+
+# --- Batch Sync ---
+
+# Rows per multi-row INSERT, well under the bind parameter limits of Postgres and SQLite.
+UPSERT_CHUNK_ROWS = 1000
+
+def _insert_for(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+async def _upsert_newer(db: AsyncSession, model, rows: list, columns: tuple) -> set:
+    """
+    Inserts `rows`, or updates the existing row with the same id unless it has
+    a higher version. Returns the ids that were written.
+    """
+    insert = _insert_for(db)
+    table = model.__table__
+    written = set()
+    for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        statement = insert(table).values(rows[start:start + UPSERT_CHUNK_ROWS])
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={column: statement.excluded[column] for column in columns},
+            where=table.c.version <= statement.excluded.version,
+        ).returning(table.c.id)
+        written.update((await db.execute(statement)).scalars())
+    return written
+
+async def apply_sync_batch(db: AsyncSession, batch: schemas.SyncBatchIn) -> dict:
+    """
+    Applies a batch of offline profile and rule writes in one transaction and
+    returns a schemas.SyncBatchResult dict.
+
+    Every table is written with a few set-based statements, so the number of
+    round trips does not grow with the batch. An upsert older than the server's
+    copy is skipped as stale; an invalid op is rejected without failing the
+    rest. A batch id that was already applied returns the stored result.
+    """
+    applied_before = await db.get(models.SyncBatch, batch.batch_id)
+    if applied_before is not None:
+        return {**json.loads(applied_before.result_json), "duplicate": True}
+
+    # Later ops on the same entity supersede earlier ones.
+    latest = {}
+    for op in batch.ops:
+        latest[(op.entity, op.id)] = op
+    rejected = []
+    profile_rows, rule_rows, profile_deletes, rule_deletes = {}, {}, [], []
+    for (entity, entity_id), op in latest.items():
+        try:
+            if op.op == "delete" and entity in ("profile", "rule"):
+                (profile_deletes if entity == "profile" else rule_deletes).append(entity_id)
+            elif op.op == "upsert" and entity == "profile":
+                profile_rows[entity_id] = {"id": entity_id, **schemas.ProfileCreate(**(op.data or {})).dict()}
+            elif op.op == "upsert" and entity == "rule":
+                data = op.data or {}
+                if not isinstance(data.get("profile_id"), str):
+                    raise ValueError("profile_id is required")
+                rule_rows[entity_id] = {
+                    "id": entity_id, "profile_id": data["profile_id"], **schemas.RuleCreate(**data).dict(),
+                }
+            else:
+                raise ValueError(f"unknown operation {op.op!r} on {entity!r}")
+        except ValueError as e:
+            rejected.append({"entity": entity, "id": entity_id, "reason": str(e)})
+
+    # Rules must belong to a profile that exists or arrives in this batch.
+    referenced = {row["profile_id"] for row in rule_rows.values()} - set(profile_rows)
+    if referenced:
+        existing = set((await db.execute(
+            select(models.Profile.id).where(models.Profile.id.in_(referenced))
+        )).scalars())
+        for rule_id, row in list(rule_rows.items()):
+            if row["profile_id"] not in existing and row["profile_id"] not in profile_rows:
+                rejected.append({"entity": "rule", "id": rule_id, "reason": "profile does not exist"})
+                del rule_rows[rule_id]
+
+    written_profiles = await _upsert_newer(db, models.Profile, list(profile_rows.values()),
+                                           ("name", "json_data", "version"))
+    written_rules = await _upsert_newer(db, models.Rule, list(rule_rows.values()),
+                                        ("profile_id", "yaml_rule", "version"))
+    deleted_rules = []
+    if rule_deletes or profile_deletes:
+        deleted_rules = (await db.execute(
+            delete(models.Rule)
+            .where(models.Rule.id.in_(rule_deletes) | models.Rule.profile_id.in_(profile_deletes))
+            .returning(models.Rule.id, models.Rule.profile_id)
+        )).all()
+    deleted_profiles = []
+    if profile_deletes:
+        deleted_profiles = (await db.execute(
+            delete(models.Profile).where(models.Profile.id.in_(profile_deletes)).returning(models.Profile.id)
+        )).scalars().all()
+
+    for profile_id in written_profiles:
+        row = profile_rows[profile_id]
+        await _log_change(db, "profile", profile_id, "upsert", profile_id,
+                          {"name": row["name"], "json_data": row["json_data"], "version": row["version"]})
+    for rule_id in written_rules:
+        row = rule_rows[rule_id]
+        await _log_change(db, "rule", rule_id, "upsert", row["profile_id"],
+                          {"yaml_rule": row["yaml_rule"], "version": row["version"]})
+    for rule_id, profile_id in deleted_rules:
+        await _log_change(db, "rule", rule_id, "delete", profile_id)
+    for profile_id in deleted_profiles:
+        await _log_change(db, "profile", profile_id, "delete", profile_id)
+    await db.flush()
+
+    result = {
+        "batch_id": batch.batch_id,
+        "version": await get_latest_version(db),
+        # Deletes of ids the server does not have change nothing; rules deleted with their profile do.
+        "applied": len(written_profiles) + len(written_rules) + len(deleted_rules) + len(deleted_profiles),
+        "stale": sorted((set(profile_rows) - written_profiles) | (set(rule_rows) - written_rules)),
+        "rejected": rejected,
+        "duplicate": False,
+    }
+    db.add(models.SyncBatch(id=batch.batch_id, result_json=json.dumps(result)))
+    await db.commit()
+    return result
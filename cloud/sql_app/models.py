@@ -1,27 +1,59 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
-from sqlalchemy.orm import relationship
-
-from .database import Base
-
-class Profile(Base):
-    __tablename__ = "profiles"
-
-    id = Column(String, primary_key=True, index=True)
-    name = Column(String, index=True)
-    json_data = Column(Text)
-    version = Column(Integer)
-
-    rules = relationship("Rule", back_populates="profile")
-
-
-class Rule(Base):
-    __tablename__ = "rules"
-
-    id = Column(String, primary_key=True, index=True)
-    profile_id = Column(String, ForeignKey("profiles.id"))
-    yaml_rule = Column(Text)
-    version = Column(Integer)
-
-    profile = relationship("Profile", back_populates="rules")
-
-# TODO: Add models for Users, Runs, Deltas, etc. as needed. 
\ No newline at end of file
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text, ForeignKey, func
+from sqlalchemy.orm import relationship
+
+from .database import Base
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(String, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True)
+    hashed_password = Column(String)
+    role = Column(String, default="viewer") # 'viewer' or 'manager'
+
+class Profile(Base):
+    __tablename__ = "profiles"
+
+    id = Column(String, primary_key=True, index=True)
+    name = Column(String, index=True)
+    json_data = Column(Text)
+    version = Column(Integer)
+
+    rules = relationship("Rule", back_populates="profile")
+
+
+class Rule(Base):
+    __tablename__ = "rules"
+
+    id = Column(String, primary_key=True, index=True)
+    profile_id = Column(String, ForeignKey("profiles.id"))
+    yaml_rule = Column(Text)
+    version = Column(Integer)
+
+    profile = relationship("Profile", back_populates="rules")
+
+class ChangeLog(Base):
+    """
+    Append-only log of every profile and rule write.
+
+    The autoincrementing id is the sync version: a client that has applied
+    everything up to version N asks /deltas?since=N for the rest.
+    """
+    __tablename__ = "change_log"
+
+    # SQLite only autoincrements INTEGER primary keys.
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity_type = Column(String, nullable=False) # 'profile' or 'rule'
+    entity_id = Column(String, nullable=False)
+    op = Column(String, nullable=False) # 'upsert' or 'delete'
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SyncBatch(Base):
+    """A /sync/batch upload that has been applied, so a retried upload is not applied twice."""
+    __tablename__ = "sync_batches"
+
+    id = Column(String, primary_key=True) # Client-generated batch id
+    result_json = Column(Text, nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# TODO: Add models for Runs, etc. as needed. 
\ No newline at end of file
@@ -1,51 +1,110 @@
-from pydantic import BaseModel
-from typing import List, Optional
-
-# --- Rule Schemas ---
-class RuleBase(BaseModel):
-    yaml_rule: str
-    version: int
-
-class RuleCreate(RuleBase):
-    pass
-
-class Rule(RuleBase):
-    id: str
-    profile_id: str
-
-    class Config:
-        orm_mode = True
-
-# --- Profile Schemas ---
-class ProfileBase(BaseModel):
-    name: str
-    json_data: str
-    version: int
-
-class ProfileCreate(ProfileBase):
-    pass
-
-class Profile(ProfileBase):
-    id: str
-    rules: List[Rule] = []
-
-    class Config:
-        orm_mode = True
-
-# --- User Schemas ---
-class UserBase(BaseModel):
-    username: str
-
-class UserCreate(UserBase):
-    password: str
-
-class UserInDB(UserBase):
-    role: str
-
-    class Config:
-        orm_mode = True
-
-# --- Token Schema ---
-class Token(BaseModel):
-    access_token: str
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+# --- Rule Schemas ---
+class RuleBase(BaseModel):
+    yaml_rule: str
+    version: int
+
+class RuleCreate(RuleBase):
+    pass
+
+class Rule(RuleBase):
+    id: str
+    profile_id: str
+
+    class Config:
+        orm_mode = True
+
+# --- Profile Schemas ---
+class ProfileBase(BaseModel):
+    name: str
+    json_data: str
+    version: int
+
+class ProfileCreate(ProfileBase):
+    pass
+
+class Profile(ProfileBase):
+    id: str
+    rules: List[Rule] = []
+
+    class Config:
+        orm_mode = True
+
+# --- Sync Schemas ---
+class ProfileSummary(ProfileBase):
+    """A profile without its rules; rules are synced separately."""
+    id: str
+
+    class Config:
+        orm_mode = True
+
+class RuleVersion(BaseModel):
+    id: str
+    version: int
+
+class ProfileListing(BaseModel):
+    """Summary view of GET /profiles/: profile and rule versions without their bodies."""
+    id: str
+    name: str
+    version: int
+    rules: List[RuleVersion] = []
+
+class Versions(BaseModel):
+    version: int # Latest change log id
+    profiles: Dict[str, int] # Profile id -> profile version
+
+class DeletedIds(BaseModel):
+    profiles: List[str] = []
+    rules: List[str] = []
+
+class Deltas(BaseModel):
+    since: int
+    version: int
+    reset: bool = False # True when `since` was unknown and this is a full snapshot
+    profiles: List[ProfileSummary] = []
+    rules: List[Rule] = []
+    deleted: DeletedIds = DeletedIds()
+
+class SyncOp(BaseModel):
+    entity: str # 'profile' or 'rule'
+    id: str
+    op: str # 'upsert' or 'delete'
+    # Upserts: the full record (ProfileCreate fields, or RuleCreate fields plus profile_id).
+    data: Optional[Dict[str, Any]] = None
+
+class SyncBatchIn(BaseModel):
+    batch_id: str
+    ops: List[SyncOp]
+
+class RejectedOp(BaseModel):
+    entity: str
+    id: str
+    reason: str
+
+class SyncBatchResult(BaseModel):
+    batch_id: str
+    version: int # Latest change log id after the batch
+    applied: int
+    stale: List[str] = [] # Ids not applied because the server has a newer version
+    rejected: List[RejectedOp] = []
+    duplicate: bool = False # The batch had already been applied; this is the original result
+
+# --- User Schemas ---
+class UserBase(BaseModel):
+    username: str
+
+class UserCreate(UserBase):
+    password: str
+
+class UserInDB(UserBase):
+    role: str
+
+    class Config:
+        orm_mode = True
+
+# --- Token Schema ---
+class Token(BaseModel):
+    access_token: str
     token_type: str 
\ No newline at end of file
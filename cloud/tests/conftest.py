@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The API is imported as the `cloud` package, as uvicorn runs it (cloud.app:sio_app).
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+# The engine is created on import, so the test database has to be chosen first.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/cloud_test.sqlite")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from cloud import app as cloud_app  # noqa: E402
+from cloud.sql_app import cache  # noqa: E402
+from cloud.sql_app.database import Base, engine  # noqa: E402
+
+async def _reset_database():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+@pytest.fixture
+def client():
+    """A TestClient on an empty database, signed in as a manager."""
+    cloud_app.app.dependency_overrides[cloud_app.get_current_manager] = lambda: {"role": "manager"}
+    cache.profile_listing.invalidate()
+    with TestClient(cloud_app.app) as test_client:
+        test_client.portal.call(_reset_database)
+        yield test_client
+        # Pooled connections belong to this client's event loop.
+        test_client.portal.call(engine.dispose)
+    cloud_app.app.dependency_overrides.clear()
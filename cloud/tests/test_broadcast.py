@@ -0,0 +1,55 @@
+import asyncio
+
+from cloud import app as cloud_app
+from cloud.broadcast import ChangeBroadcaster, profile_room
+
+class RecordingServer:
+    """Stands in for the Socket.IO server; keeps every emit as (event, data, room)."""
+
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data, room=None):
+        self.emitted.append((event, data, room))
+
+def test_changes_to_one_profile_reach_its_room_as_one_event(client, monkeypatch):
+    server = RecordingServer()
+    monkeypatch.setattr(cloud_app.broadcaster, "sio", server)
+    profile = client.post("/profiles/", json={"name": "Default", "json_data": "{}", "version": 1}).json()
+    client.portal.call(cloud_app.broadcaster.drain)
+    server.emitted.clear()
+
+    client.put(f"/profiles/{profile['id']}", json={"name": "Renamed", "json_data": "{}", "version": 2})
+    client.put(f"/profiles/{profile['id']}",
+               json={"name": "Renamed again", "json_data": '{"airflow": 5}', "version": 3})
+    client.portal.call(cloud_app.broadcaster.drain)
+
+    assert len(server.emitted) == 1
+    event, message, room = server.emitted[0]
+    assert (event, room) == ("profile_changes", profile_room(profile["id"]))
+    assert message == {
+        "profile_id": profile["id"],
+        "version": client.get("/versions").json()["version"],
+        "profile": {"name": "Renamed again", "json_data": '{"airflow": 5}', "version": 3},
+        "deleted": False,
+        "rules": {"upserted": [], "deleted": []},
+    }
+
+def test_changes_are_emitted_once_the_window_has_passed():
+    async def scenario():
+        server = RecordingServer()
+        broadcaster = ChangeBroadcaster(server, window_ms=20)
+        broadcaster.publish("p1", 1, "rule", "r1", "upsert", {"yaml_rule": "a", "version": 1})
+        broadcaster.publish("p1", 2, "rule", "r1", "delete")
+        broadcaster.publish("p2", 3, "profile", "p2", "delete")
+        assert server.emitted == []
+        await asyncio.sleep(0.1)
+        return server.emitted
+
+    emitted = asyncio.run(scenario())
+
+    assert sorted(room for _, _, room in emitted) == [profile_room("p1"), profile_room("p2")]
+    by_room = {room: message for _, message, room in emitted}
+    assert by_room[profile_room("p1")]["version"] == 2
+    assert by_room[profile_room("p1")]["rules"] == {"upserted": [], "deleted": ["r1"]}
+    assert by_room[profile_room("p2")]["deleted"]
@@ -0,0 +1,165 @@
+import gzip
+import json
+
+def _create_profile(client, name: str, version: int = 1) -> dict:
+    response = client.post("/profiles/", json={"name": name, "json_data": "{}", "version": version})
+    assert response.status_code == 200
+    return response.json()
+
+def _create_rule(client, profile_id: str, version: int = 1) -> dict:
+    response = client.post(f"/profiles/{profile_id}/rules/", json={"yaml_rule": "check: airflow", "version": version})
+    assert response.status_code == 200
+    return response.json()
+
+def _sync(client, batch: dict, compress: bool = False):
+    body = json.dumps(batch).encode()
+    headers = {"Content-Type": "application/json"}
+    if compress:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return client.post("/sync/batch", content=body, headers=headers)
+
+# --- /versions ---
+
+def test_versions_etag_and_not_modified(client):
+    profile = _create_profile(client, "Default")
+
+    response = client.get("/versions")
+    assert response.status_code == 200
+    assert response.json() == {"version": 1, "profiles": {profile["id"]: 1}}
+    etag = response.headers["ETag"]
+    assert etag == '"v1"'
+
+    not_modified = client.get("/versions", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+    client.put(f"/profiles/{profile['id']}", json={"name": "Default", "json_data": "{}", "version": 2})
+    changed = client.get("/versions", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] == '"v2"'
+    assert changed.json()["profiles"] == {profile["id"]: 2}
+
+# --- /deltas ---
+
+def test_deltas_since_version(client):
+    profile = _create_profile(client, "Default")
+    kept = _create_rule(client, profile["id"])
+    dropped = _create_rule(client, profile["id"])
+    since = client.get("/versions").json()["version"]
+
+    client.put(f"/profiles/{profile['id']}", json={"name": "Renamed", "json_data": "{}", "version": 2})
+    client.delete(f"/rules/{dropped['id']}")
+
+    response = client.get("/deltas", params={"since": since})
+    assert response.status_code == 200
+    deltas = response.json()
+    assert deltas["since"] == since
+    assert deltas["version"] == since + 2
+    assert not deltas["reset"]
+    assert [(p["id"], p["name"], p["version"]) for p in deltas["profiles"]] == [(profile["id"], "Renamed", 2)]
+    assert deltas["rules"] == []
+    assert deltas["deleted"] == {"profiles": [], "rules": [dropped["id"]]}
+
+    everything = client.get("/deltas", params={"since": 0}).json()
+    assert [rule["id"] for rule in everything["rules"]] == [kept["id"]]
+
+    not_modified = client.get("/deltas", params={"since": since}, headers={"If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304
+
+def test_deltas_from_unknown_version_is_a_full_snapshot(client):
+    profile = _create_profile(client, "Default")
+
+    deltas = client.get("/deltas", params={"since": 1000}).json()
+
+    assert deltas["reset"]
+    assert deltas["since"] == 0
+    assert [p["id"] for p in deltas["profiles"]] == [profile["id"]]
+
+# --- /profiles/ pagination ---
+
+def test_profiles_keyset_pagination(client):
+    ids = sorted(_create_profile(client, f"Profile {i}")["id"] for i in range(5))
+
+    seen, after, pages = [], None, 0
+    while True:
+        params = {"limit": 2} if after is None else {"limit": 2, "after": after}
+        response = client.get("/profiles/", params=params)
+        assert response.status_code == 200
+        seen += [profile["id"] for profile in response.json()]
+        pages += 1
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+
+    assert seen == ids
+    assert pages == 3
+
+def test_profiles_summary_view_has_no_bodies(client):
+    profile = _create_profile(client, "Default")
+    rule = _create_rule(client, profile["id"], version=3)
+
+    listing = client.get("/profiles/", params={"view": "summary"}).json()
+
+    assert listing == [{"id": profile["id"], "name": "Default", "version": 1,
+                        "rules": [{"id": rule["id"], "version": 3}]}]
+
+def test_profiles_response_is_documented_for_both_views(client):
+    response = client.get("/openapi.json").json()["paths"]["/profiles/"]["get"]["responses"]["200"]
+
+    items = [option["items"]["$ref"] for option in response["content"]["application/json"]["schema"]["anyOf"]]
+    assert items == ["#/components/schemas/Profile", "#/components/schemas/ProfileListing"]
+    assert "X-Next-Cursor" in response["headers"]
+
+# --- /sync/batch ---
+
+def test_sync_batch_is_idempotent(client):
+    batch = {"batch_id": "batch-1", "ops": [
+        {"entity": "profile", "id": "p1", "op": "upsert", "data": {"name": "Offline", "json_data": "{}", "version": 1}},
+        {"entity": "rule", "id": "r1", "op": "upsert",
+         "data": {"profile_id": "p1", "yaml_rule": "check: airflow", "version": 1}},
+    ]}
+
+    first = _sync(client, batch, compress=True)
+    assert first.status_code == 200
+    result = first.json()
+    assert result["applied"] == 2
+    assert not result["duplicate"]
+    version = client.get("/versions").json()["version"]
+    assert version == result["version"]
+
+    retry = _sync(client, batch)
+    assert retry.status_code == 200
+    assert retry.json() == {**result, "duplicate": True}
+    # Nothing was written the second time.
+    assert client.get("/versions").json()["version"] == version
+
+def test_sync_batch_skips_stale_and_rejects_invalid_ops(client):
+    profile = _create_profile(client, "Server", version=5)
+
+    result = _sync(client, {"batch_id": "batch-2", "ops": [
+        {"entity": "profile", "id": profile["id"], "op": "upsert",
+         "data": {"name": "Old copy", "json_data": "{}", "version": 4}},
+        {"entity": "rule", "id": "r1", "op": "upsert",
+         "data": {"profile_id": "missing", "yaml_rule": "check: airflow", "version": 1}},
+        {"entity": "report", "id": "x", "op": "upsert"},
+    ]}).json()
+
+    assert result["applied"] == 0
+    assert result["stale"] == [profile["id"]]
+    assert {(op["entity"], op["id"]) for op in result["rejected"]} == {("rule", "r1"), ("report", "x")}
+    assert client.get(f"/profiles/{profile['id']}").json()["name"] == "Server"
+
+def test_sync_batch_counts_only_rows_deleted(client):
+    profile = _create_profile(client, "Default")
+    _create_rule(client, profile["id"])
+
+    result = _sync(client, {"batch_id": "batch-3", "ops": [
+        {"entity": "profile", "id": profile["id"], "op": "delete"},
+        {"entity": "rule", "id": "never-synced", "op": "delete"},
+    ]}).json()
+
+    # The profile and its rule; the unknown rule id changes nothing.
+    assert result["applied"] == 2
+    assert client.get("/versions").json()["profiles"] == {}
@@ -1,6 +1,6 @@
-// This is the build script for the Tauri application.
-// It is required for the application to compile correctly.
-
-fn main() {
-    tauri_build::build()
+// This is the build script for the Tauri application.
+// It is required for the application to compile correctly.
+
+fn main() {
+    tauri_build::build()
 } 
\ No newline at end of file
@@ -1,55 +1,170 @@
-#![cfg_attr(
-  all(not(debug_assertions), target_os = "windows"),
-  windows_subsystem = "windows"
-)]
-
-use std::process::{Command, Stdio};
-use std::io::{BufReader, BufRead};
-
-#[derive(Clone, serde::Serialize)]
-struct Payload {
-  message: String,
-}
-
-#[tauri::command]
-fn run_review(file_path: String, api_key: String, model_name: String) -> Result<String, String> {
-    // TODO: For production, this path needs to be resolved to the bundled PyInstaller executable.
-    let python_executable = "python"; // Assuming python is in the PATH within the dev environment
-    let script_path = "../worker/review.py"; // Path relative to src-tauri
-
-    let mut cmd = Command::new(python_executable)
-        .arg(script_path)
-        .arg(file_path)
-        .arg(api_key)
-        .arg(model_name)
-        .stdout(Stdio::piped())
-        .stderr(Stdio::piped())
-        .spawn()
-        .map_err(|e| e.to_string())?;
-
-    // Capture stderr for debugging purposes in the main app logs
-    if let Some(stderr) = cmd.stderr.take() {
-        let reader = BufReader::new(stderr);
-        for line in reader.lines() {
-            eprintln!("Worker stderr: {}", line.unwrap_or_default());
-        }
-    }
-
-    let output = cmd.wait_with_output().map_err(|e| e.to_string())?;
-    
-    if output.status.success() {
-        let result_json = String::from_utf8(output.stdout).map_err(|e| e.to_string())?;
-        Ok(result_json)
-    } else {
-        let error_message = String::from_utf8(output.stderr).unwrap_or_else(|_| "Unknown worker error".to_string());
-        Err(format!("Worker script failed: {}", error_message))
-    }
-}
-
-fn main() {
-    tauri::Builder::default()
-        .plugin(tauri_plugin_store::Builder::default().build())
-        .invoke_handler(tauri::generate_handler![run_review])
-        .run(tauri::generate_context!())
-        .expect("error while running tauri application");
-} 
\ No newline at end of file
+#![cfg_attr(
+  all(not(debug_assertions), target_os = "windows"),
+  windows_subsystem = "windows"
+)]
+
+use std::process::{Child, ChildStdin, ChildStdout, Command, Stdio};
+use std::io::{BufReader, BufRead, Write};
+use std::sync::{Arc, Mutex, TryLockError};
+use std::thread;
+
+#[derive(Clone, serde::Serialize)]
+struct Payload {
+  message: String,
+}
+
+/// A long-lived `review.py --serve` process speaking line-framed JSON-RPC on stdin/stdout.
+struct WorkerDaemon {
+    child: Child,
+    stdin: ChildStdin,
+    stdout: BufReader<ChildStdout>,
+    next_id: u64,
+}
+
+/// The worker is started on first use and kept warm for every later review.
+/// Shared with the blocking thread that talks to it, hence the Arc.
+struct WorkerState(Arc<Mutex<Option<WorkerDaemon>>>);
+
+impl WorkerDaemon {
+    fn spawn() -> Result<WorkerDaemon, String> {
+        // TODO: For production, this path needs to be resolved to the bundled PyInstaller executable.
+        let python_executable = "python"; // Assuming python is in the PATH within the dev environment
+        let script_path = "../worker/review.py"; // Path relative to src-tauri
+
+        let mut child = Command::new(python_executable)
+            .arg(script_path)
+            .arg("--serve")
+            .stdin(Stdio::piped())
+            .stdout(Stdio::piped())
+            .stderr(Stdio::piped())
+            .spawn()
+            .map_err(|e| e.to_string())?;
+
+        // Forward stderr to the app logs on its own thread so the pipe never fills up.
+        if let Some(stderr) = child.stderr.take() {
+            thread::spawn(move || {
+                let reader = BufReader::new(stderr);
+                for line in reader.lines() {
+                    eprintln!("Worker stderr: {}", line.unwrap_or_default());
+                }
+            });
+        }
+
+        let stdin = child.stdin.take().ok_or("Worker stdin unavailable")?;
+        let stdout = BufReader::new(child.stdout.take().ok_or("Worker stdout unavailable")?);
+        let mut daemon = WorkerDaemon { child, stdin, stdout, next_id: 1 };
+        // Pay for imports and schema setup now rather than on the first review.
+        daemon.call("warmup", serde_json::json!({}), &mut |_| {})?;
+        Ok(daemon)
+    }
+
+    fn is_alive(&mut self) -> bool {
+        matches!(self.child.try_wait(), Ok(None))
+    }
+
+    /// Sends one request and blocks until the response with the same id arrives.
+    /// Progress notifications for the request are passed to `on_event` as they are read.
+    fn call(
+        &mut self,
+        method: &str,
+        params: serde_json::Value,
+        on_event: &mut dyn FnMut(serde_json::Value),
+    ) -> Result<serde_json::Value, String> {
+        let id = self.next_id;
+        self.next_id += 1;
+        let request = serde_json::json!({"jsonrpc": "2.0", "id": id, "method": method, "params": params});
+        writeln!(self.stdin, "{}", request).map_err(|e| e.to_string())?;
+        self.stdin.flush().map_err(|e| e.to_string())?;
+
+        let mut line = String::new();
+        loop {
+            line.clear();
+            let read = self.stdout.read_line(&mut line).map_err(|e| e.to_string())?;
+            if read == 0 {
+                return Err("Worker exited unexpectedly".to_string());
+            }
+            let message: serde_json::Value = match serde_json::from_str(&line) {
+                Ok(message) => message,
+                Err(_) => continue,
+            };
+            if message["method"] == "event" && message["params"]["request_id"] == serde_json::json!(id) {
+                on_event(message["params"].clone());
+                continue;
+            }
+            if message["id"] != serde_json::json!(id) {
+                continue;
+            }
+            if let Some(error) = message.get("error") {
+                let text = error["message"].as_str().unwrap_or("Unknown worker error");
+                return Err(format!("Worker script failed: {}", text));
+            }
+            return Ok(message["result"].clone());
+        }
+    }
+}
+
+/// Reviews a report on the warm worker, forwarding its progress to the UI as
+/// `review-event` events while the review runs. The worker is read with
+/// blocking I/O for as long as the review takes, so that runs on a blocking
+/// thread rather than tying up a worker thread of the async runtime.
+#[tauri::command]
+async fn run_review(
+    window: tauri::Window,
+    state: tauri::State<'_, WorkerState>,
+    file_path: String,
+    api_key: String,
+    model_name: String,
+) -> Result<String, String> {
+    let worker_state = Arc::clone(&state.0);
+    let params = serde_json::json!({"file_path": file_path, "api_key": api_key, "model_name": model_name});
+    tauri::async_runtime::spawn_blocking(move || review_on_worker(&worker_state, &window, params))
+        .await
+        .map_err(|e| e.to_string())?
+}
+
+fn review_on_worker(
+    state: &Mutex<Option<WorkerDaemon>>,
+    window: &tauri::Window,
+    params: serde_json::Value,
+) -> Result<String, String> {
+    // The worker reviews one report at a time; a second request is turned away
+    // rather than left waiting on the lock for the whole of the first review.
+    let mut guard = match state.try_lock() {
+        Ok(guard) => guard,
+        Err(TryLockError::WouldBlock) => return Err("A review is already running".to_string()),
+        Err(TryLockError::Poisoned(e)) => return Err(e.to_string()),
+    };
+    let needs_spawn = match guard.as_mut() {
+        Some(worker) => !worker.is_alive(),
+        None => true,
+    };
+    if needs_spawn {
+        *guard = Some(WorkerDaemon::spawn()?);
+    }
+
+    let worker = guard.as_mut().unwrap();
+    let mut forward = |event: serde_json::Value| {
+        if let Err(e) = window.emit("review-event", event) {
+            eprintln!("Failed to forward worker event: {}", e);
+        }
+    };
+    match worker.call("review", params, &mut forward) {
+        Ok(result) => Ok(result.to_string()),
+        Err(e) => {
+            // A worker that died mid-review is replaced on the next call.
+            if !worker.is_alive() {
+                *guard = None;
+            }
+            Err(e)
+        }
+    }
+}
+
+fn main() {
+    tauri::Builder::default()
+        .plugin(tauri_plugin_store::Builder::default().build())
+        .manage(WorkerState(Arc::new(Mutex::new(None))))
+        .invoke_handler(tauri::generate_handler![run_review])
+        .run(tauri::generate_context!())
+        .expect("error while running tauri application");
+}
@@ -1,57 +1,107 @@
-import React, { createContext, useContext, useEffect, useState } from 'react';
-import io, { Socket } from 'socket.io-client';
-
-// TODO: Make the API URL configurable
-const SOCKET_URL = 'http://localhost:8000';
-
-interface WebSocketContextType {
-  socket: Socket | null;
-  isConnected: boolean;
-}
-
-const WebSocketContext = createContext<WebSocketContextType>({
-  socket: null,
-  isConnected: false,
-});
-
-export const useWebSocket = () => {
-  return useContext(WebSocketContext);
-};
-
-export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ children }) => {
-  const [socket, setSocket] = useState<Socket | null>(null);
-  const [isConnected, setIsConnected] = useState(false);
-
-  useEffect(() => {
-    const newSocket = io(SOCKET_URL);
-
-    newSocket.on('connect', () => {
-      console.log('WebSocket connected!');
-      setIsConnected(true);
-    });
-
-    newSocket.on('disconnect', () => {
-      console.log('WebSocket disconnected!');
-      setIsConnected(false);
-    });
-    
-    // Listen for profile updates from the server
-    newSocket.on('profile_updated', (data) => {
-      console.log('Profile updated event received:', data);
-      // TODO: Trigger a re-fetch of the profiles or update the state directly
-      alert(`Profile updated: ${data.name}`);
-    });
-
-    setSocket(newSocket);
-
-    return () => {
-      newSocket.close();
-    };
-  }, []);
-
-  return (
-    <WebSocketContext.Provider value={{ socket, isConnected }}>
-      {children}
-    </WebSocketContext.Provider>
-  );
-}; 
\ No newline at end of file
+import React, { createContext, useCallback, useContext, useEffect, useRef, useState } from 'react';
+import io, { Socket } from 'socket.io-client';
+import { ProfileChange } from '../types';
+
+// TODO: Make the API URL configurable
+export const API_URL = 'http://localhost:8000';
+const SOCKET_URL = API_URL;
+
+interface WebSocketContextType {
+  socket: Socket | null;
+  isConnected: boolean;
+  // The server only sends changes for profiles this client subscribed to.
+  subscribe: (profileIds: string[]) => void;
+  unsubscribe: (profileIds: string[]) => void;
+  lastChange: ProfileChange | null;
+}
+
+const WebSocketContext = createContext<WebSocketContextType>({
+  socket: null,
+  isConnected: false,
+  subscribe: () => {},
+  unsubscribe: () => {},
+  lastChange: null,
+});
+
+export const useWebSocket = () => {
+  return useContext(WebSocketContext);
+};
+
+// Keeps the room of `profileId` joined while it is set, and passes each change
+// the server pushes for that profile to `onChange`.
+export const useProfileChanges = (profileId: string | undefined, onChange: (change: ProfileChange) => void) => {
+  const { subscribe, unsubscribe, lastChange } = useWebSocket();
+  const handler = useRef(onChange);
+  handler.current = onChange;
+
+  useEffect(() => {
+    if (!profileId) {
+      return;
+    }
+    subscribe([profileId]);
+    return () => unsubscribe([profileId]);
+  }, [profileId, subscribe, unsubscribe]);
+
+  useEffect(() => {
+    if (lastChange && lastChange.profile_id === profileId) {
+      handler.current(lastChange);
+    }
+  }, [lastChange, profileId]);
+};
+
+export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ children }) => {
+  const [socket, setSocket] = useState<Socket | null>(null);
+  const [isConnected, setIsConnected] = useState(false);
+  const [lastChange, setLastChange] = useState<ProfileChange | null>(null);
+  // Kept across reconnects; rooms are per connection on the server.
+  const subscriptions = useRef<Set<string>>(new Set());
+
+  useEffect(() => {
+    const newSocket = io(SOCKET_URL);
+
+    newSocket.on('connect', () => {
+      console.log('WebSocket connected!');
+      setIsConnected(true);
+      if (subscriptions.current.size > 0) {
+        newSocket.emit('subscribe', { profile_ids: Array.from(subscriptions.current) });
+      }
+    });
+
+    newSocket.on('disconnect', () => {
+      console.log('WebSocket disconnected!');
+      setIsConnected(false);
+    });
+
+    // Each message carries the new values and version, so it can be applied without a refetch.
+    newSocket.on('profile_changes', (change: ProfileChange) => {
+      setLastChange(change);
+    });
+
+    setSocket(newSocket);
+
+    return () => {
+      newSocket.close();
+    };
+  }, []);
+
+  const subscribe = useCallback((profileIds: string[]) => {
+    const added = profileIds.filter((id) => !subscriptions.current.has(id));
+    added.forEach((id) => subscriptions.current.add(id));
+    if (socket?.connected && added.length > 0) {
+      socket.emit('subscribe', { profile_ids: added });
+    }
+  }, [socket]);
+
+  const unsubscribe = useCallback((profileIds: string[]) => {
+    profileIds.forEach((id) => subscriptions.current.delete(id));
+    if (socket?.connected) {
+      socket.emit('unsubscribe', { profile_ids: profileIds });
+    }
+  }, [socket]);
+
+  return (
+    <WebSocketContext.Provider value={{ socket, isConnected, subscribe, unsubscribe, lastChange }}>
+      {children}
+    </WebSocketContext.Provider>
+  );
+};
@@ -1,13 +1,13 @@
-import React from 'react';
-import ReactDOM from 'react-dom/client';
-import App from './App';
-import { WebSocketProvider } from './components/WebSocketProvider';
-import './styles.css'; // Tailwind CSS styles
-
-ReactDOM.createRoot(document.getElementById('root') as HTMLElement).render(
-  <React.StrictMode>
-    <WebSocketProvider>
-      <App />
-    </WebSocketProvider>
-  </React.StrictMode>,
+import React from 'react';
+import ReactDOM from 'react-dom/client';
+import App from './App';
+import { WebSocketProvider } from './components/WebSocketProvider';
+import './styles.css'; // Tailwind CSS styles
+
+ReactDOM.createRoot(document.getElementById('root') as HTMLElement).render(
+  <React.StrictMode>
+    <WebSocketProvider>
+      <App />
+    </WebSocketProvider>
+  </React.StrictMode>,
 ); 
\ No newline at end of file
@@ -0,0 +1,53 @@
+import { API_URL } from './components/WebSocketProvider';
+import { ProfileChange, ToleranceProfile } from './types';
+
+// A profile as the cloud API returns it; json_data holds the tolerances as JSON.
+interface CloudProfile {
+    id: string;
+    name: string;
+    json_data: string;
+    version: number;
+}
+
+const fromCloud = (profile: CloudProfile): ToleranceProfile => ({
+    id: profile.id,
+    version: profile.version,
+    name: profile.name,
+    tolerances: JSON.parse(profile.json_data),
+});
+
+// Fetches the profile named `name` from the cloud API, or the first profile if
+// none has that name. Returns null when the API has no profiles or cannot be reached.
+export async function fetchProfile(name: string): Promise<ToleranceProfile | null> {
+    try {
+        const response = await fetch(`${API_URL}/profiles/`);
+        if (!response.ok) {
+            return null;
+        }
+        const profiles: CloudProfile[] = await response.json();
+        const match = profiles.find((profile) => profile.name === name) ?? profiles[0];
+        return match ? fromCloud(match) : null;
+    } catch (e) {
+        console.log('Could not load profiles from the cloud:', e);
+        return null;
+    }
+}
+
+// Applies a pushed change to the profile it is about. Returns null if the
+// profile was deleted, and the profile unchanged if the change is older than it.
+// Rule changes are not shown in the UI, so only the profile fields are applied.
+export function applyProfileChange(profile: ToleranceProfile, change: ProfileChange): ToleranceProfile | null {
+    if (change.deleted) {
+        return null;
+    }
+    const fields = change.profile;
+    if (!fields || (fields.version !== undefined && profile.version !== undefined && fields.version <= profile.version)) {
+        return profile;
+    }
+    return {
+        ...profile,
+        name: fields.name ?? profile.name,
+        version: fields.version ?? profile.version,
+        tolerances: fields.json_data !== undefined ? JSON.parse(fields.json_data) : profile.tolerances,
+    };
+}
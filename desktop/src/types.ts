@@ -1,30 +1,70 @@
-export interface Model {
-    id: string;
-    name: string;
-    // other properties like context window size could be added here
-}
-
-export const supportedModels: Model[] = [
-    { id: "gpt-4o", name: "GPT-4o" },
-    { id: "gpt-4", name: "GPT-4" },
-    { id: "gpt-3.5-turbo", name: "GPT-3.5 Turbo" },
-    { id: "claude-3-opus-20240229", name: "Claude 3 Opus" },
-    { id: "claude-3-sonnet-20240229", name: "Claude 3 Sonnet" },
-    { id: "gemini-1.5-pro-latest", name: "Gemini 1.5 Pro" },
-    { id: "grok-1", name: "Grok" },
-];
-
-export interface Tolerance {
-    type: "percent" | "absolute";
-    value: number;
-    unit?: string;
-}
-
-export interface ToleranceProfile {
-    name: string;
-    tolerances: Record<string, Tolerance>;
-}
-
-export interface DroppedFile extends File {
-    path: string;
-} 
\ No newline at end of file
+export interface Model {
+    id: string;
+    name: string;
+    // other properties like context window size could be added here
+}
+
+export const supportedModels: Model[] = [
+    { id: "gpt-4o", name: "GPT-4o" },
+    { id: "gpt-4", name: "GPT-4" },
+    { id: "gpt-3.5-turbo", name: "GPT-3.5 Turbo" },
+    { id: "claude-3-opus-20240229", name: "Claude 3 Opus" },
+    { id: "claude-3-sonnet-20240229", name: "Claude 3 Sonnet" },
+    { id: "gemini-1.5-pro-latest", name: "Gemini 1.5 Pro" },
+    { id: "grok-1", name: "Grok" },
+];
+
+export interface Tolerance {
+    type: "percent" | "absolute";
+    value: number;
+    unit?: string;
+}
+
+export interface ToleranceProfile {
+    // Set for profiles loaded from the cloud API; the built-in default has none.
+    id?: string;
+    version?: number;
+    name: string;
+    tolerances: Record<string, Tolerance>;
+}
+
+export interface DroppedFile extends File {
+    path: string;
+} 
+
+export interface Finding {
+    page: number | null;
+    issue: string;
+    source?: string;
+    sheet?: string;
+    // Row number of the sheet, or of PDF table `table` (numbered from 1 on its page).
+    row?: number;
+    table?: number;
+    column?: string | null;
+    quote?: string;
+    // Where the annotator placed the finding: [x0, top, x1, bottom] in PDF points.
+    rects?: number[][];
+}
+
+// Coalesced changes to one subscribed profile, pushed by the cloud API (see cloud/broadcast.py).
+// `profile` holds the new field values, or null if only rules changed.
+export interface ProfileChange {
+    profile_id: string;
+    version: number;
+    profile: { name?: string; json_data?: string; version?: number } | null;
+    deleted: boolean;
+    rules: {
+        upserted: { id: string; yaml_rule: string; version: number }[];
+        deleted: string[];
+    };
+}
+
+// Progress events streamed from the worker while a review runs (see desktop/worker/events.py).
+export type ReviewEvent =
+    | { event: "stage_started" | "stage_finished"; request_id: number; stage: string }
+    | { event: "pages_extracted"; request_id: number; pages_done: number; page_count: number }
+    | { event: "chunk_scanned"; request_id: number; chunk: number; score: number; flagged: boolean; cache_hit: boolean }
+    | { event: "chunk_reviewed"; request_id: number; chunk: number; findings: number; cache_hit: boolean }
+    | { event: "chunk_failed"; request_id: number; chunk: number; pages: number[]; error: string }
+    | { event: "finding"; request_id: number; finding: Finding }
+    | { event: "done"; request_id: number; result: { status: string; findings: Finding[] } };
\ No newline at end of file
@@ -1,144 +1,643 @@
-import tiktoken  # for OpenAI models
-import sys # for printing to stderr
-import json # for JSON parsing
-
-# --- Model Configuration ---
-# TODO: Keep this updated with the latest model context windows.
-MODEL_CONTEXT_WINDOWS = {
-    "gpt-4o": 128000,
-    "gpt-4": 8192,
-    "gpt-3.5-turbo": 16385,
-    "claude-3-opus-20240229": 200000,
-    "claude-3-sonnet-20240229": 200000,
-    "gemini-1.5-pro-latest": 1048576,
-    "grok-1": 8192, # Placeholder, check official Grok-4 context size
-}
-
-# --- Token-Smart Chunker ---
-
-def get_tokenizer(model_name: str):
-    """Returns the appropriate tokenizer for a given model."""
-    # TODO: Add tokenizers for other model families (Claude, Gemini, Grok).
-    # For now, we default to the GPT-4o tokenizer as a reasonable approximation.
-    return tiktoken.encoding_for_model("gpt-4o")
-
-def chunk_data(data: list, model_name: str, chunk_size_ratio: float = 0.85) -> list:
-    """
-    Splits extracted data into chunks that fit within the model's context window.
-    """
-    max_tokens = MODEL_CONTEXT_WINDOWS.get(model_name, 8192)
-    chunk_max_size = int(max_tokens * chunk_size_ratio)
-    tokenizer = get_tokenizer(model_name)
-    
-    chunks = []
-    current_chunk = []
-    current_chunk_tokens = 0
-    
-    # TODO: Improve this logic to be more sophisticated.
-    # This is a very basic implementation that just groups data items.
-    # A better approach would be to split items themselves if they are too large.
-    for item in data:
-        # Simple serialization for token counting.
-        item_str = str(item)
-        item_tokens = len(tokenizer.encode(item_str))
-        
-        if current_chunk_tokens + item_tokens > chunk_max_size:
-            chunks.append(current_chunk)
-            current_chunk = [item]
-            current_chunk_tokens = item_tokens
-        else:
-            current_chunk.append(item)
-            current_chunk_tokens += item_tokens
-            
-    if current_chunk:
-        chunks.append(current_chunk)
-        
-    print(f"Split data into {len(chunks)} chunks for model {model_name}.", file=sys.stderr)
-    return chunks
-
-# --- AI Gateway ---
-from openai import OpenAI
-
-def get_ai_client(api_key: str):
-    return OpenAI(api_key=api_key)
-
-def create_review_prompt(chunk: list, profile: dict) -> str:
-    """Creates a detailed prompt for the AI review."""
-    # TODO: Make this prompt more sophisticated based on the dual-pass strategy.
-    
-    profile_str = str(profile) # Simple serialization for now
-    chunk_str = str(chunk)
-    
-    return f"""
-    You are an expert TAB (Testing, Adjusting, and Balancing) report analyst.
-    Review the following data extracted from a TAB report and identify any issues
-    based on the provided tolerance profile.
-
-    Tolerance Profile:
-    {profile_str}
-
-    Report Data Chunk:
-    {chunk_str}
-
-    Identify any readings that are outside the specified tolerances.
-    For each issue, provide the page number and a clear description of the problem.
-    Respond with a JSON object containing a list of findings, where each finding
-    is an object with "page" and "issue" keys.
-    If there are no issues, return an empty list.
-    """
-
-def call_gpt(client: OpenAI, model_name: str, prompt: str):
-    """Calls a GPT model and returns the JSON response."""
-    try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that responds in JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            # TODO: Send enterprise/no-log headers where applicable
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"Error calling GPT model {model_name}: {e}", file=sys.stderr)
-        return None
-
-def call_claude(api_key: str, model_name: str, prompt: str):
-    print(f"Calling Claude model {model_name}...")
-    return {"response": "This is a placeholder response from Claude."}
-
-def call_gemini(api_key: str, model_name: str, prompt: str):
-    print(f"Calling Gemini model {model_name}...")
-    return {"response": "This is a placeholder response from Gemini."}
-
-def call_grok(api_key: str, model_name: str, prompt: str):
-    print(f"Calling Grok model {model_name}...")
-    return {"response": "This is a placeholder response from Grok."}
-
-def run_ai_review(api_key: str, model_name: str, chunks: list, profile: dict) -> list:
-    """
-    Runs the dual-pass AI review on the provided data chunks.
-    """
-    # TODO: Add logic to select the correct client based on model_name
-    client = get_ai_client(api_key)
-    
-    all_findings = []
-    
-    # This is a simplified single-pass implementation for now.
-    print(f"Starting AI review with {model_name}...")
-    for chunk in chunks:
-        prompt = create_review_prompt(chunk, profile)
-        
-        # TODO: Route to the correct model call
-        response_json_str = call_gpt(client, model_name, prompt)
-        
-        if response_json_str:
-            try:
-                response_data = json.loads(response_json_str)
-                findings = response_data.get("findings", [])
-                all_findings.extend(findings)
-            except json.JSONDecodeError:
-                print(f"Error: Could not decode JSON response: {response_json_str}", file=sys.stderr)
-
-    return all_findings 
\ No newline at end of file
+import os
+import sys # for printing to stderr
+import json # for JSON parsing
+import contextvars
+import functools
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+import profiling
+from events import emit
+from database import evict_llm_cache, get_cached_response, put_cached_response
+from pipeline import ordered_map
+from tables import Table
+
+# tiktoken, httpx and openai are imported on first use to keep worker start-up cheap.
+
+# --- Model Configuration ---
+# TODO: Keep this updated with the latest model context windows.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "claude-3-opus-20240229": 200000,
+    "claude-3-sonnet-20240229": 200000,
+    "gemini-1.5-pro-latest": 1048576,
+    "grok-1": 8192, # Placeholder, check official Grok-4 context size
+}
+
+# USD per million (prompt, completion) tokens, used to estimate the cost of a run.
+# TODO: Keep this updated with the providers' price lists.
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3-opus-20240229": (15.00, 75.00),
+    "claude-3-sonnet-20240229": (3.00, 15.00),
+    "gemini-1.5-pro-latest": (3.50, 10.50),
+}
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int):
+    """Returns the estimated USD cost of a call, or None for models without known pricing."""
+    pricing = MODEL_PRICING.get(model_name)
+    if pricing is None or prompt_tokens is None:
+        return None
+    prompt_price, completion_price = pricing
+    return (prompt_tokens * prompt_price + (completion_tokens or 0) * completion_price) / 1_000_000
+
+# --- Token-Smart Chunker ---
+
+# Partially filled chunks kept open while packing. More open chunks pack fuller,
+# at the cost of holding items back a little longer before a chunk is sent.
+OPEN_CHUNKS = 4
+# A chunk filled to this share of its budget is sent right away.
+CHUNK_FULL_RATIO = 0.95
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(model_name: str):
+    """Returns the appropriate tokenizer for a given model, loaded once per process."""
+    import tiktoken  # for OpenAI models
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        # TODO: Add tokenizers for other model families (Claude, Gemini, Grok).
+        # For now, we default to the GPT-4o tokenizer as a reasonable approximation.
+        return tiktoken.encoding_for_model("gpt-4o")
+
+def _item_location(item: dict) -> str:
+    if item.get("sheet"):
+        return f"sheet {item['sheet']!r}, {item.get('ref', '')}".rstrip(", ")
+    if item.get("table"):
+        return f"page {item.get('page')}, table {item['table']}"
+    return f"page {item.get('page')}"
+
+def _numbered_rows(item: dict) -> bool:
+    """Whether a table's CSV lines start with their row number: for sheets and numbered PDF tables."""
+    return bool(item.get("sheet") or item.get("table"))
+
+def serialize_item(item: dict) -> str:
+    """
+    Text an item contributes to a prompt, also used for token counting.
+
+    Tables are written as CSV under a one-line heading naming their page and
+    table number, or their sheet, with each row prefixed by its row number so
+    the model can cite it.
+    """
+    content = item.get("content")
+    part = f", part {item['part']}" if item.get("part") else ""
+    heading = f"[{item.get('type', 'item')}, {_item_location(item)}{part}]\n"
+    if isinstance(content, Table):
+        return heading + content.to_csv(row_numbers=_numbered_rows(item))
+    return heading + _compact_text(content or "")
+
+def _compact_text(text: str) -> str:
+    """Drops blank lines and the whitespace around each line of extracted text."""
+    return "".join(line.strip() + "\n" for line in text.splitlines() if line.strip())
+
+def count_tokens(tokenizer, texts: list) -> list:
+    """Counts the tokens of several texts in one batched (multi-threaded) encode call."""
+    return [len(tokens) for tokens in tokenizer.encode_batch(texts, disallowed_special=())]
+
+def split_item(item: dict, budget: int, tokenizer) -> list:
+    """
+    Splits an item that is larger than `budget` tokens into pieces that fit.
+
+    Tables are split by body row, with the header rows repeated on every
+    piece; text is split by line. Returns a list of (piece, token count).
+    """
+    content = item.get("content")
+    if isinstance(content, Table) and len(content) > 1:
+        units = content.csv_lines(_numbered_rows(item))
+        fixed_tokens = count_tokens(tokenizer, [serialize_item({**item, "content": content.slice(0, 0), "part": 1})])[0]
+    elif isinstance(content, str):
+        units = content.splitlines(keepends=True)
+        fixed_tokens = count_tokens(tokenizer, [serialize_item({**item, "content": "", "part": 1})])[0]
+    else:
+        # Nothing to split on; the model will have to take it whole.
+        return [(item, count_tokens(tokenizer, [serialize_item(item)])[0])]
+
+    unit_tokens = count_tokens(tokenizer, units)
+    # Each piece is (first unit, end unit, token count).
+    pieces = []
+    start, current_tokens = 0, fixed_tokens
+    for i, tokens in enumerate(unit_tokens):
+        if i > start and current_tokens + tokens > budget:
+            pieces.append((start, i, current_tokens))
+            start, current_tokens = i, fixed_tokens
+        current_tokens += tokens
+    if start < len(units):
+        pieces.append((start, len(units), current_tokens))
+
+    if isinstance(content, Table):
+        piece_content = lambda start, end: content.slice(start, end)
+    else:
+        piece_content = lambda start, end: "".join(units[start:end])
+    return [({**item, "content": piece_content(start, end), "part": n + 1}, tokens)
+            for n, (start, end, tokens) in enumerate(pieces)]
+
+def _page_key(item: dict) -> tuple:
+    """The page or sheet an item was extracted from."""
+    if item.get("sheet"):
+        return ("sheet", item["sheet"])
+    return ("page", item.get("page"))
+
+def iter_chunks(data, model_name: str, chunk_size_ratio: float = 0.85, open_chunks: int = OPEN_CHUNKS):
+    """
+    Packs a stream of extracted data items into chunks that fit within the model's context window.
+
+    Each item goes to an open chunk that already holds its page if one has
+    room, otherwise first-fit into one of up to `open_chunks` partially filled
+    chunks. A chunk is yielded as soon as it is full; when no open chunk has
+    room, the fullest is yielded and a new one is opened. Items larger than a
+    chunk are split first (see split_item).
+    """
+    max_tokens = MODEL_CONTEXT_WINDOWS.get(model_name, 8192)
+    chunk_max_size = int(max_tokens * chunk_size_ratio)
+    full_size = int(chunk_max_size * CHUNK_FULL_RATIO)
+    tokenizer = get_tokenizer(model_name)
+
+    # Each open chunk is [items, token count, page keys].
+    open_bins = []
+    for item in data:
+        # Counted one at a time, so a full chunk never waits on items after it.
+        item_tokens = count_tokens(tokenizer, [serialize_item(item)])[0]
+        if item_tokens > chunk_max_size:
+            pieces = split_item(item, chunk_max_size, tokenizer)
+        else:
+            pieces = [(item, item_tokens)]
+
+        page = _page_key(item)
+        for piece, piece_tokens in pieces:
+            fits = [i for i, b in enumerate(open_bins) if b[1] + piece_tokens <= chunk_max_size]
+            index = next((i for i in fits if page in open_bins[i][2]), fits[0] if fits else None)
+            if index is None:
+                if len(open_bins) >= open_chunks:
+                    fullest = max(range(len(open_bins)), key=lambda i: open_bins[i][1])
+                    yield open_bins.pop(fullest)[0]
+                open_bins.append([[], 0, set()])
+                index = len(open_bins) - 1
+            target = open_bins[index]
+            target[0].append(piece)
+            target[1] += piece_tokens
+            target[2].add(page)
+            if target[1] >= full_size:
+                yield open_bins.pop(index)[0]
+
+    for items, _, _ in open_bins:
+        yield items
+
+def chunk_data(data: list, model_name: str, chunk_size_ratio: float = 0.85) -> list:
+    """
+    Splits extracted data into chunks that fit within the model's context window.
+    """
+    chunks = list(iter_chunks(data, model_name, chunk_size_ratio))
+    print(f"Split data into {len(chunks)} chunks for model {model_name}.", file=sys.stderr)
+    return chunks
+
+# --- Rate Limiting ---
+
+# Per-provider request and token budgets, per minute.
+# TODO: Make these configurable per account tier from the Model Hub.
+PROVIDER_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 300000},
+    "anthropic": {"rpm": 50, "tpm": 40000},
+    "google": {"rpm": 60, "tpm": 1000000},
+    "xai": {"rpm": 60, "tpm": 100000},
+}
+
+# Chunks reviewed concurrently by run_ai_review.
+REVIEW_CONCURRENCY = int(os.environ.get("TAB_CRUSHER_REVIEW_CONCURRENCY", "8"))
+# Completion tokens assumed per call when reserving token budget up front.
+COMPLETION_TOKEN_ESTIMATE = 1000
+# Retries for 429 / 5xx / connection errors, with exponential backoff from RETRY_BASE_DELAY seconds.
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+def get_provider(model_name: str) -> str:
+    """Returns the provider that serves a given model."""
+    if model_name.startswith("claude"):
+        return "anthropic"
+    if model_name.startswith("gemini"):
+        return "google"
+    if model_name.startswith("grok"):
+        return "xai"
+    return "openai"
+
+class RateLimiter:
+    """
+    Thread-safe token bucket enforcing requests-per-minute and tokens-per-minute.
+
+    Both buckets start full and refill continuously, so short bursts are allowed
+    up to the per-minute budget.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Blocks until one request and `tokens` tokens are available, then takes them. Returns the seconds waited."""
+        # A single request larger than the whole budget still has to go through eventually.
+        tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return waited
+                wait = max(
+                    (1 - self._requests) * 60 / self.requests_per_minute,
+                    (tokens - self._tokens) * 60 / self.tokens_per_minute,
+                )
+            time.sleep(wait)
+            waited += wait
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """Returns the process-wide rate limiter for a provider, shared by all reviews."""
+    with _rate_limiters_lock:
+        if provider not in _rate_limiters:
+            limits = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["openai"])
+            _rate_limiters[provider] = RateLimiter(limits["rpm"], limits["tpm"])
+        return _rate_limiters[provider]
+
+# --- Dual-Pass Review ---
+
+# Cheap model that screens every chunk in a dual-pass review; only the chunks it
+# flags are sent to the (expensive) review model.
+SCAN_MODEL = os.environ.get("TAB_CRUSHER_SCAN_MODEL", "gpt-4o-mini")
+# Chunks scanned concurrently. Scan calls are small and fast, so more can be in flight.
+SCAN_CONCURRENCY = int(os.environ.get("TAB_CRUSHER_SCAN_CONCURRENCY", "16"))
+# Chunks with a suspicion score at or above this go to the precision pass.
+SCAN_THRESHOLD = float(os.environ.get("TAB_CRUSHER_SCAN_THRESHOLD", "0.3"))
+# The scan answer is one score and a short reason.
+SCAN_MAX_TOKENS = 100
+
+def chunking_model(model_name: str, scan_model: str = None) -> str:
+    """The model to size chunks for: in a dual-pass review, whichever of the two has the smaller context window."""
+    if not scan_model:
+        return model_name
+    windows = {model: MODEL_CONTEXT_WINDOWS.get(model, 8192) for model in (model_name, scan_model)}
+    return min(windows, key=windows.get)
+
+# --- Prompts ---
+# A prompt is (prefix, data). The prefix holds the instructions and the
+# tolerance profile and is sent as the system message; it is the same for
+# every chunk of a report (and every report under the same profile), so
+# providers that cache prompt prefixes can reuse it. The data is the chunk.
+
+REVIEW_INSTRUCTIONS = """You are an expert TAB (Testing, Adjusting, and Balancing) report analyst.
+Review data extracted from a TAB report and identify readings outside the tolerance profile below.
+Data comes as items headed [text, page N], [table, page N, table T] or [table, sheet 'S', range];
+tables are CSV and each CSV line starts with its row number.
+Respond in JSON: {"findings": [{"page": N, "table": T, "row": R, "column": "header", "issue": "clear description"}]}.
+"row" is the number at the start of the CSV line; give "column" (the column's header) when the issue is one cell.
+For an issue in text, give "quote" (the exact words it is about) instead of "table", "row" and "column".
+For spreadsheet data give "sheet" and "row" instead of "page" and "table".
+If there are no issues, return {"findings": []}."""
+
+SCAN_INSTRUCTIONS = """You are screening data extracted from a TAB (Testing, Adjusting, and Balancing) report before a detailed review.
+Rate how likely it is that the data contains a reading outside the tolerance profile below, or any other error a reviewer should check.
+Data comes as items headed [text, page N], [table, page N, table T] or [table, sheet 'S', range]; tables are CSV.
+Respond in JSON: {"score": 0.0 (certainly clean) to 1.0 (certainly has issues), "reason": "one short sentence"}.
+When unsure, give a high score."""
+
+def _format_tolerance(spec) -> str:
+    if isinstance(spec, dict) and spec.get("type") == "percent" and "value" in spec:
+        return f"within {spec['value']}% of design"
+    if isinstance(spec, dict) and spec.get("type") == "absolute" and "value" in spec:
+        return f"within {spec['value']}{' ' + spec['unit'] if spec.get('unit') else ''} of design"
+    return json.dumps(spec, sort_keys=True, separators=(",", ":"))
+
+@functools.lru_cache(maxsize=32)
+def _format_tolerances(tolerances_json: str) -> str:
+    # Measurements sharing a tolerance are listed on one line.
+    groups = {}
+    for name, spec in json.loads(tolerances_json).items():
+        groups.setdefault(_format_tolerance(spec), []).append(name)
+    return "".join(f"{', '.join(names)}: {text}\n" for text, names in groups.items())
+
+def format_profile(profile: dict) -> str:
+    """
+    The tolerance profile as the model sees it: one line per distinct
+    tolerance. Ids and version numbers are left out; they mean nothing to the
+    model and would make the prompt prefix differ between profile versions.
+    """
+    return _format_tolerances(json.dumps(profile.get("tolerances") or {}, sort_keys=True))
+
+def create_review_prompt(chunk: list, profile: dict) -> tuple:
+    """Returns the (prefix, data) of the review prompt for a chunk."""
+    prefix = f"{REVIEW_INSTRUCTIONS}\n\nTolerance profile:\n{format_profile(profile)}"
+    return prefix, "\n".join(serialize_item(item) for item in chunk)
+
+def create_scan_prompt(chunk: list, profile: dict) -> tuple:
+    """Returns the (prefix, data) of the screening prompt of the scan pass, which only asks for a suspicion score."""
+    prefix = f"{SCAN_INSTRUCTIONS}\n\nTolerance profile:\n{format_profile(profile)}"
+    return prefix, "\n".join(serialize_item(item) for item in chunk)
+
+# --- AI Gateway ---
+
+# Connections kept open in the pooled HTTP client; covers both passes of a dual-pass review.
+HTTP_POOL_SIZE = max(REVIEW_CONCURRENCY + SCAN_CONCURRENCY, 4)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_ai_client(api_key: str):
+    """
+    Returns a cached OpenAI client for `api_key`, backed by one pooled HTTP client.
+
+    Retries are disabled on the client because call_gpt retries itself, in step
+    with the rate limiter. The endpoint can be redirected (for example to a
+    local fake OpenAI-compatible server) with the OPENAI_BASE_URL variable.
+    """
+    import httpx
+    from openai import OpenAI
+
+    with _clients_lock:
+        if api_key not in _clients:
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+                timeout=httpx.Timeout(120.0, connect=10.0),
+            )
+            _clients[api_key] = OpenAI(api_key=api_key, max_retries=0, http_client=http_client)
+        return _clients[api_key]
+
+def _is_retryable(error: Exception) -> bool:
+    """True for rate limiting, server-side and transport errors."""
+    import openai
+
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Honors a Retry-After header if present, otherwise exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    delay = min(RETRY_BASE_DELAY * (2 ** attempt), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+@profiling.timed("llm_call")
+def call_gpt(client: "OpenAI", model_name: str, prompt, max_tokens: int = None):
+    """
+    Calls a GPT model and returns the JSON response. `prompt` is a (prefix,
+    data) pair from the prompt builders, or a plain string. Token usage and
+    cost are recorded in the run metrics.
+    """
+    prefix, data = prompt if isinstance(prompt, tuple) else ("You are a helpful assistant that responds in JSON.", prompt)
+    limiter = get_rate_limiter(get_provider(model_name))
+    tokenizer = get_tokenizer(model_name)
+    estimated_tokens = sum(count_tokens(tokenizer, [prefix, data])) + (max_tokens or COMPLETION_TOKEN_ESTIMATE)
+    options = {"max_tokens": max_tokens} if max_tokens else {}
+    started = time.perf_counter()
+    rate_limit_wait = 0.0
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limit_wait += limiter.acquire(estimated_tokens)
+        try:
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": prefix},
+                    {"role": "user", "content": data}
+                ],
+                response_format={"type": "json_object"},
+                **options,
+                # TODO: Send enterprise/no-log headers where applicable
+            )
+            usage = getattr(response, "usage", None)
+            prompt_tokens = getattr(usage, "prompt_tokens", None)
+            completion_tokens = getattr(usage, "completion_tokens", None)
+            # Prompt tokens the provider served from its prefix cache.
+            cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+            profiling.record_llm_call(
+                model_name, time.perf_counter() - started, prompt_tokens, completion_tokens,
+                estimate_cost(model_name, prompt_tokens, completion_tokens), attempt + 1, rate_limit_wait,
+                cached_tokens=cached_tokens,
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            if attempt < MAX_RETRIES and _is_retryable(e):
+                delay = _retry_delay(e, attempt)
+                print(f"Retrying GPT model {model_name} in {delay:.1f}s after error: {e}", file=sys.stderr)
+                time.sleep(delay)
+                continue
+            print(f"Error calling GPT model {model_name}: {e}", file=sys.stderr)
+            profiling.count("llm_errors")
+            return None
+
+def call_claude(api_key: str, model_name: str, prompt: str):
+    print(f"Calling Claude model {model_name}...")
+    return {"response": "This is a placeholder response from Claude."}
+
+def call_gemini(api_key: str, model_name: str, prompt: str):
+    print(f"Calling Gemini model {model_name}...")
+    return {"response": "This is a placeholder response from Gemini."}
+
+def call_grok(api_key: str, model_name: str, prompt: str):
+    print(f"Calling Grok model {model_name}...")
+    return {"response": "This is a placeholder response from Grok."}
+
+def make_cache_key(prompt: tuple, model_name: str, profile_version) -> str:
+    """Content address of a model call: identical prompt, model and profile version give identical keys."""
+    digest = hashlib.sha256()
+    for part in (model_name, str(profile_version), *prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+@profiling.timed("review_chunk")
+def review_chunk(client: "OpenAI", model_name: str, chunk: list, profile: dict, use_cache: bool = True) -> tuple:
+    """
+    Reviews a single chunk and returns (findings, cache_hit, error).
+
+    Responses are looked up in the local LLM cache before calling the model, and
+    successfully parsed responses are stored there afterwards. `error` is None,
+    or says why the chunk could not be reviewed.
+    """
+    prompt = create_review_prompt(chunk, profile)
+    cache_key = make_cache_key(prompt, model_name, profile.get("version", 0))
+
+    if use_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return json.loads(cached).get("findings", []), True, None
+
+    # TODO: Route to the correct model call
+    response_json_str = call_gpt(client, model_name, prompt)
+
+    if not response_json_str:
+        return [], False, "model call failed"
+    try:
+        response_data = json.loads(response_json_str)
+    except json.JSONDecodeError:
+        print(f"Error: Could not decode JSON response: {response_json_str}", file=sys.stderr)
+        return [], False, "could not decode the model's response"
+    if use_cache:
+        put_cached_response(cache_key, model_name, response_json_str)
+    return response_data.get("findings", []), False, None
+
+def _review_chunk_in_context(context: contextvars.Context, client: "OpenAI", model_name: str, chunk: list,
+                             *args) -> tuple:
+    """
+    Runs review_chunk in the submitting thread's context, so its metrics reach
+    the run's collector. Returns the chunk along with review_chunk's result.
+    """
+    return (chunk, *context.run(review_chunk, client, model_name, chunk, *args))
+
+def chunk_pages(chunk: list) -> list:
+    """The sorted PDF page numbers the items of a chunk come from."""
+    return sorted({item["page"] for item in chunk if isinstance(item.get("page"), int) and not item.get("sheet")})
+
+@profiling.timed("scan_chunk")
+def scan_chunk(client: "OpenAI", scan_model: str, chunk: list, profile: dict, use_cache: bool = True) -> tuple:
+    """
+    Screens a chunk with the scan model and returns (chunk, score, cache_hit).
+
+    A failed call or an unreadable answer scores 1.0, so the chunk still gets
+    the precision pass.
+    """
+    prompt = create_scan_prompt(chunk, profile)
+    cache_key = make_cache_key(prompt, scan_model, profile.get("version", 0))
+
+    response_json_str = get_cached_response(cache_key) if use_cache else None
+    cache_hit = response_json_str is not None
+    if not cache_hit:
+        response_json_str = call_gpt(client, scan_model, prompt, max_tokens=SCAN_MAX_TOKENS)
+    try:
+        score = float(json.loads(response_json_str)["score"])
+    except (TypeError, ValueError, KeyError) as e:
+        if response_json_str is not None:
+            print(f"Error: Could not read scan score from {response_json_str!r}: {e}", file=sys.stderr)
+        return chunk, 1.0, cache_hit
+    if use_cache and not cache_hit:
+        put_cached_response(cache_key, scan_model, response_json_str)
+    return chunk, min(max(score, 0.0), 1.0), cache_hit
+
+def _scan_chunk_in_context(context: contextvars.Context, *args) -> tuple:
+    return context.run(scan_chunk, *args)
+
+def _scan_pass(client: "OpenAI", scan_model: str, chunks, profile: dict, concurrency: int, threshold: float,
+               use_cache: bool, flagged_numbers: list, executor: ThreadPoolExecutor = None):
+    """
+    Scans every chunk and yields only those scored at or above `threshold`,
+    appending the number of each one to `flagged_numbers`.
+    """
+    scanned = flagged = cache_hits = 0
+    print(f"Scanning chunks with {scan_model} ({concurrency} concurrent requests)...", file=sys.stderr)
+    calls = ((contextvars.copy_context(), client, scan_model, chunk, profile, use_cache) for chunk in chunks)
+    try:
+        with ExitStack() as stack:
+            if executor is None:
+                executor = stack.enter_context(ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ai-scan"))
+            for chunk, score, cache_hit in ordered_map(executor, _scan_chunk_in_context, calls,
+                                                       max_pending=concurrency):
+                is_flagged = score >= threshold
+                emit("chunk_scanned", chunk=scanned, score=round(score, 3), flagged=is_flagged, cache_hit=cache_hit)
+                if is_flagged:
+                    flagged_numbers.append(scanned)
+                scanned += 1
+                flagged += is_flagged
+                cache_hits += cache_hit
+                if is_flagged:
+                    yield chunk
+    finally:
+        profiling.count("scan_chunks", scanned)
+        profiling.count("scan_flagged", flagged)
+        profiling.count("scan_cache_hits", cache_hits)
+        print(f"Scan pass: {flagged} of {scanned} chunks flagged for {threshold} or above.", file=sys.stderr)
+
+def run_ai_review(api_key: str, model_name: str, chunks, profile: dict, concurrency: int = None,
+                  use_cache: bool = True, scan_model: str = None, scan_concurrency: int = None,
+                  scan_threshold: float = None, executor: ThreadPoolExecutor = None, errors: list = None) -> list:
+    """
+    Runs the AI review on the provided data chunks.
+
+    `chunks` may be any iterable, including a generator that is still being
+    filled by the extractor. Up to `concurrency` chunks are reviewed at once,
+    within the provider's rate limits; findings are still returned in chunk order.
+    Chunks already reviewed with the same prompt, model and profile version are
+    served from the LLM cache unless `use_cache` is False.
+
+    With a `scan_model` the review is dual-pass: the scan model rates every
+    chunk (up to `scan_concurrency` at once) and only chunks scoring at least
+    `scan_threshold` are reviewed by `model_name`. Both passes stream, so the
+    precision pass starts on the first flagged chunk.
+
+    A shared `executor` (see batch.py) runs the model calls of both passes in
+    place of the review's own thread pools; `concurrency` then only caps how
+    many calls this review has in flight.
+
+    Chunks that could not be reviewed are appended to `errors`, if given, as
+    {"chunk", "pages", "error"} dicts.
+    """
+    # TODO: Add logic to select the correct client based on model_name
+    client = get_ai_client(api_key)
+    concurrency = concurrency or REVIEW_CONCURRENCY
+    
+    all_findings = []
+    chunk_count = 0
+    cache_hits = 0
+
+    # Chunk numbers as seen by the scan pass, so events refer to the same chunk in both passes.
+    chunk_numbers = []
+    if scan_model:
+        threshold = SCAN_THRESHOLD if scan_threshold is None else scan_threshold
+        chunks = _scan_pass(client, scan_model, chunks, profile, scan_concurrency or SCAN_CONCURRENCY, threshold,
+                            use_cache, chunk_numbers, executor)
+
+    print(f"Starting AI review with {model_name} ({concurrency} concurrent requests)...", file=sys.stderr)
+    calls = ((contextvars.copy_context(), client, model_name, chunk, profile, use_cache) for chunk in chunks)
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ai-review"))
+        for chunk, findings, cache_hit, error in ordered_map(executor, _review_chunk_in_context, calls,
+                                                             max_pending=concurrency):
+            for finding in findings:
+                emit("finding", finding=finding)
+            number = chunk_numbers[chunk_count] if scan_model else chunk_count
+            if error is not None:
+                chunk_error = {"chunk": number, "pages": chunk_pages(chunk), "error": error}
+                emit("chunk_failed", **chunk_error)
+                if errors is not None:
+                    errors.append(chunk_error)
+            emit("chunk_reviewed", chunk=number, findings=len(findings), cache_hit=cache_hit)
+            all_findings.extend(findings)
+            chunk_count += 1
+            cache_hits += cache_hit
+
+    profiling.count("chunks_reviewed", chunk_count)
+    profiling.count("llm_cache_hits", cache_hits)
+    print(f"Reviewed {chunk_count} chunks with {model_name}.", file=sys.stderr)
+    if use_cache:
+        print(f"LLM cache: {cache_hits} hits, {chunk_count - cache_hits} misses.", file=sys.stderr)
+        evict_llm_cache()
+    return all_findings
\ No newline at end of file
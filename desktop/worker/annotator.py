@@ -1,54 +1,150 @@
-import fitz  # PyMuPDF
-import sys
-
-def add_annotations_to_pdf(file_path: str, findings: list, output_path: str):
-    """
-    Adds highlights and comments to a PDF based on AI findings.
-    """
-    try:
-        doc = fitz.open(file_path)
-    except Exception as e:
-        print(f"Error opening PDF for annotation: {e}", file=sys.stderr)
-        return
-
-    for finding in findings:
-        page_num = finding.get("page", 1) - 1 # PyMuPDF is 0-indexed
-        if 0 <= page_num < len(doc):
-            page = doc[page_num]
-            
-            # TODO: Implement robust logic to find the precise location of the issue.
-            # This is a placeholder that just searches for the text of the issue.
-            issue_text = finding.get("issue", "")
-            text_instances = page.search_for(issue_text)
-
-            for inst in text_instances:
-                # Add a yellow highlight
-                highlight = page.add_highlight_annot(inst)
-                highlight.set_colors(stroke=(1, 1, 0)) # Yellow
-                highlight.update()
-                
-                # Add a red sticky note comment
-                comment_title = "AI Finding"
-                comment_text = f"Issue Found: {issue_text}"
-                # Position the note near the highlight
-                note_pos = fitz.Point(inst.x0, inst.y0 - 20)
-                
-                annot = page.add_text_annot(note_pos, comment_text, icon="Comment")
-                annot.set_info(content=comment_text, title=comment_title)
-                annot.set_colors(stroke=(1, 0, 0)) # Red
-                annot.update()
-
-    try:
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
-        print(f"Successfully saved annotated PDF to {output_path}", file=sys.stderr)
-    except Exception as e:
-        print(f"Error saving annotated PDF: {e}", file=sys.stderr)
-    finally:
-        doc.close()
-
-# Example Usage (for testing)
-if __name__ == '__main__':
-    # This is a placeholder for a test.
-    # You would need a sample PDF and a sample finding.
-    # e.g., add_annotations_to_pdf("sample.pdf", [{"page": 1, "issue": "Design CFM is too low"}], "annotated_sample.pdf")
-    pass 
\ No newline at end of file
+import fitz  # PyMuPDF
+import os
+import shutil
+import sys
+from collections import defaultdict
+
+import profiling
+
+# Save modes for add_annotations_to_pdf.
+# "fast" appends the annotations as an incremental update to a copy of the original file.
+# "compact" rewrites the whole file with garbage collection and compression (slow on large PDFs).
+SAVE_MODES = ("fast", "compact")
+
+def _group_by_page(findings: list, page_count: int) -> dict:
+    """Groups findings by 0-based page index, dropping those outside the document."""
+    by_page = defaultdict(list)
+    for finding in findings:
+        page_num = (finding.get("page") or 1) - 1 # PyMuPDF is 0-indexed
+        if 0 <= page_num < page_count:
+            by_page[page_num].append(finding)
+    return by_page
+
+# Findings that cannot be placed get their note in the top-left margin, stacked this far apart.
+UNPLACED_NOTE_SPACING = 24
+
+def _add_note(page, point, issue_text: str):
+    # Add a red sticky note comment
+    comment_title = "AI Finding"
+    comment_text = f"Issue Found: {issue_text}"
+    annot = page.add_text_annot(point, comment_text, icon="Comment")
+    annot.set_info(content=comment_text, title=comment_title)
+    annot.set_colors(stroke=(1, 0, 0)) # Red
+    annot.update()
+
+def _search_page(page, finding: dict, search_cache: dict) -> list:
+    """Boxes where the page's text matches the finding's quote, or else its issue text."""
+    for text in (finding.get("quote"), finding.get("issue")):
+        if not text:
+            continue
+        if text not in search_cache:
+            search_cache[text] = [tuple(rect) for rect in page.search_for(text)]
+        if search_cache[text]:
+            return search_cache[text]
+    return []
+
+def _annotate_page(page, findings: list, index=None) -> int:
+    """
+    Adds highlights and comments for one page's findings. Returns the number of highlights added.
+
+    Each finding is placed at its "rects" if it has them (findings carried
+    over from an earlier run), else at the boxes `index` resolves it to, else
+    wherever the page's text search finds its quote or issue text. The boxes
+    found are stored in the finding as "rects".
+    """
+    added = 0
+    unplaced = 0
+    # Search results for this page, keyed by search text; repeated texts are searched once.
+    search_cache = {}
+    for finding in findings:
+        issue_text = finding.get("issue", "")
+        if not issue_text:
+            continue
+        rects = finding.get("rects")
+        if rects is None:
+            rects = index.locate(finding) if index is not None else []
+            if not rects:
+                rects = _search_page(page, finding, search_cache)
+            finding["rects"] = [list(rect) for rect in rects]
+
+        if not rects:
+            _add_note(page, fitz.Point(4, 4 + unplaced * UNPLACED_NOTE_SPACING), issue_text)
+            unplaced += 1
+            continue
+        for rect in rects:
+            # Add a yellow highlight
+            highlight = page.add_highlight_annot(fitz.Rect(rect))
+            highlight.set_colors(stroke=(1, 1, 0)) # Yellow
+            highlight.update()
+            added += 1
+        # Position the note near the first highlight
+        _add_note(page, fitz.Point(rects[0][0], max(rects[0][1] - 20, 0)), issue_text)
+    return added
+
+def _open_for_output(file_path: str, output_path: str, mode: str):
+    """Opens the document that annotations are written into for the given save mode."""
+    if mode == "fast":
+        # Incremental saves append to the file itself, so work on a copy at the output path.
+        if os.path.abspath(file_path) != os.path.abspath(output_path):
+            shutil.copyfile(file_path, output_path)
+        return fitz.open(output_path)
+    return fitz.open(file_path)
+
+def _save(doc, output_path: str, mode: str):
+    if mode == "compact":
+        doc.save(output_path, garbage=4, deflate=True, clean=True)
+    elif doc.can_save_incrementally():
+        doc.saveIncr()
+    else:
+        # Repaired or encrypted files cannot take an incremental update: do a plain
+        # full save to a temporary file and swap it in once the document is closed.
+        temp_path = f"{output_path}.tmp"
+        doc.save(temp_path)
+        return temp_path
+    return None
+
+@profiling.timed("annotation")
+def add_annotations_to_pdf(file_path: str, findings: list, output_path: str, mode: str = "fast", index=None):
+    """
+    Adds highlights and comments to a PDF based on AI findings.
+
+    Findings are grouped by page so each page is loaded once. `index` is the
+    layout.ReportIndex built during extraction; findings naming a table row
+    or cell, or quoting text, are placed by looking them up in it, and the
+    page's text is searched only for those it cannot place.
+    `mode` is "fast" (incremental update, the default) or "compact" (full
+    rewrite with garbage collection and compression).
+    """
+    if mode not in SAVE_MODES:
+        raise ValueError(f"Unknown save mode: {mode}")
+
+    try:
+        doc = _open_for_output(file_path, output_path, mode)
+    except Exception as e:
+        print(f"Error opening PDF for annotation: {e}", file=sys.stderr)
+        return
+
+    temp_path = None
+    try:
+        by_page = _group_by_page(findings, len(doc))
+        added = 0
+        for page_num in sorted(by_page):
+            added += _annotate_page(doc[page_num], by_page[page_num], index)
+
+        temp_path = _save(doc, output_path, mode)
+        print(f"Successfully saved annotated PDF to {output_path} ({added} highlights on {len(by_page)} pages)",
+              file=sys.stderr)
+    except Exception as e:
+        print(f"Error saving annotated PDF: {e}", file=sys.stderr)
+    finally:
+        doc.close()
+    if temp_path:
+        os.replace(temp_path, output_path)
+
+# Example Usage (for testing)
+if __name__ == '__main__':
+    # This is a placeholder for a test.
+    # You would need a sample PDF and a sample finding.
+    # e.g., add_annotations_to_pdf("sample.pdf", [{"page": 1, "table": 1, "row": 3, "issue": "Design CFM is too low"}],
+    #                              "annotated_sample.pdf", index=report_index)
+    pass
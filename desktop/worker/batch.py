@@ -0,0 +1,206 @@
+"""
+Reviews a whole project folder, or a list of reports, as one batch.
+
+Up to BATCH_FILES reports are reviewed at once. They share one extraction
+process pool and one thread pool for model calls, and model calls are also
+bounded by the process-wide rate limiter of each provider, so one report is
+being parsed while another waits on the model instead of each report leaving
+the CPU or the API idle in turn.
+
+The state of each report is kept in the batch_files table under a batch id
+derived from the report paths and the model. Running the same command again
+after a batch was killed skips the reports already done and retries the
+rest; reviews are incremental and use the extraction and LLM caches, so a
+report interrupted halfway is cheaper the second time too.
+
+Progress events (see events.py) go to stdout as newline-delimited JSON, each
+tagged with the report's path. The last one is "batch_done" with the
+throughput report.
+
+Usage:
+    python batch.py <api_key> <model_name> path/to/project_folder
+    python batch.py <api_key> <model_name> a.pdf b.xlsx --files 6
+"""
+
+import argparse
+import contextvars
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from ai_gateway import HTTP_POOL_SIZE, SCAN_MODEL
+from database import create_schema, get_batch_files, set_batch_file_status, start_batch
+from events import emit, event_sink, ndjson_writer, tagged
+from review import DUAL_PASS_DEFAULT, EXTRACT_WORKERS, review_file
+
+REPORT_EXTENSIONS = (".pdf", ".xlsx", ".xls")
+# Reports reviewed at the same time.
+BATCH_FILES = int(os.environ.get("TAB_CRUSHER_BATCH_FILES", "4"))
+# Model calls in flight across the whole batch. Calls beyond the AI client's
+# HTTP pool would only queue for a connection.
+BATCH_AI_CONCURRENCY = int(os.environ.get("TAB_CRUSHER_BATCH_AI_CONCURRENCY", str(HTTP_POOL_SIZE)))
+
+def find_reports(paths: list) -> list:
+    """
+    Expands folders into the reports directly inside them and returns the
+    sorted, resolved paths. Annotated copies written by earlier reviews
+    (*_review.pdf) and Office lock files (~$*) are left out.
+    """
+    files = set()
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.update(
+                child.resolve() for child in path.iterdir()
+                if child.is_file() and child.suffix.lower() in REPORT_EXTENSIONS
+                and not child.stem.endswith("_review") and not child.name.startswith("~$")
+            )
+        else:
+            files.add(path.resolve())
+    return sorted(str(path) for path in files)
+
+def make_batch_id(file_paths: list, model_name: str, scan_model: str = None) -> str:
+    """The same reports reviewed with the same models get the same id, which is what makes a rerun resume."""
+    key = "\n".join([model_name, scan_model or ""] + sorted(file_paths))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def _review_one(batch_id: str, file_path: str, api_key: str, model_name: str, options: dict):
+    """
+    Reviews one report of the batch and records its state. Returns the result,
+    or None if it failed. A report with chunks the model could not review is
+    failed too, so the next run of the batch retries it.
+    """
+    set_batch_file_status(batch_id, file_path, "running")
+    started = time.perf_counter()
+    with tagged(file=file_path):
+        emit("batch_file_started")
+        try:
+            result = review_file(file_path, api_key, model_name, **options)
+        except Exception as e:
+            wall_ms = round((time.perf_counter() - started) * 1000, 1)
+            print(f"Failed to review {file_path}: {e}", file=sys.stderr)
+            set_batch_file_status(batch_id, file_path, "failed", error=str(e), wall_ms=wall_ms)
+            emit("batch_file_finished", status="failed", error=str(e))
+            return None
+        wall_ms = round((time.perf_counter() - started) * 1000, 1)
+        llm_errors = result.get("llm_errors")
+        if llm_errors:
+            error = f"{len(llm_errors)} chunks could not be reviewed: {llm_errors[0]['error']}"
+            print(f"Failed to review {file_path}: {error}", file=sys.stderr)
+            set_batch_file_status(batch_id, file_path, "failed", run_id=result["run_id"], error=error, wall_ms=wall_ms)
+            emit("batch_file_finished", status="failed", run_id=result["run_id"], error=error)
+            return None
+        set_batch_file_status(batch_id, file_path, "done", run_id=result["run_id"], wall_ms=wall_ms)
+        emit("batch_file_finished", status="done", run_id=result["run_id"], findings=len(result["findings"]))
+    return result
+
+def _report(batch_id: str, results: list, skipped: int, wall: float) -> dict:
+    """Aggregate throughput of the reports reviewed in this run of the batch."""
+    files = get_batch_files(batch_id)
+    done = [result for result in results if result is not None]
+    report_ms = sum(result["metrics"]["wall_ms"] or 0 for result in done)
+    llm = [result["metrics"]["llm"] for result in done]
+    return {
+        "batch_id": batch_id,
+        "files": len(files),
+        "done": sum(1 for f in files if f["status"] == "done"),
+        "failed": [{"file": f["file_path"], "error": f["error"]} for f in files if f["status"] == "failed"],
+        "skipped": skipped,
+        "reviewed": len(done),
+        "wall_seconds": round(wall, 1),
+        "files_per_minute": round(len(done) / wall * 60, 2) if wall else None,
+        # Reports take longer each when sharing the machine; the batch wins by overlapping them.
+        "mean_report_seconds": round(report_ms / 1000 / len(done), 1) if done else None,
+        "reports_in_flight": round(report_ms / 1000 / wall, 2) if wall else None,
+        "findings": sum(len(result["findings"]) for result in done),
+        "llm_calls": sum(m["calls"] for m in llm),
+        "prompt_tokens": sum(m["prompt_tokens"] for m in llm),
+        "completion_tokens": sum(m["completion_tokens"] for m in llm),
+        "cost_usd": round(sum(m["cost_usd"] for m in llm), 6),
+        "tokens_per_minute": round(sum(m["prompt_tokens"] + m["completion_tokens"] for m in llm) / wall * 60)
+        if wall else None,
+    }
+
+def run_batch(paths: list, api_key: str, model_name: str, files_at_once: int = BATCH_FILES,
+              ai_concurrency: int = BATCH_AI_CONCURRENCY, restart: bool = False, incremental: bool = True,
+              annotation_mode: str = "fast", scan_model: str = None,
+              executor: ProcessPoolExecutor = None) -> dict:
+    """
+    Reviews every report in `paths` (files or folders) and returns the throughput report.
+
+    Reports already done in an earlier run of the same batch are skipped
+    unless `restart` is set. `executor` is an optional long-lived extraction
+    pool; without one the batch starts its own.
+    """
+    file_paths = find_reports(paths)
+    batch_id = make_batch_id(file_paths, model_name, scan_model)
+    states = start_batch(batch_id, file_paths, restart=restart)
+    todo = [path for path, status in states if status != "done"]
+    skipped = len(states) - len(todo)
+    print(f"Batch {batch_id}: {len(todo)} of {len(states)} reports to review.", file=sys.stderr)
+
+    options = {"incremental": incremental, "annotation_mode": annotation_mode, "scan_model": scan_model}
+    started = time.perf_counter()
+    results = []
+    own_executor = executor is None and bool(todo)
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS or os.cpu_count() or 1)
+    try:
+        options["executor"] = executor
+        with ThreadPoolExecutor(max_workers=ai_concurrency, thread_name_prefix="ai-batch") as ai_executor, \
+                ThreadPoolExecutor(max_workers=max(1, files_at_once), thread_name_prefix="batch") as files:
+            options["ai_executor"] = ai_executor
+            # Each report runs in a copy of this context, so its events reach the caller's sink.
+            futures = [
+                files.submit(contextvars.copy_context().run, _review_one, batch_id, path, api_key, model_name, options)
+                for path in todo
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    report = _report(batch_id, results, skipped, time.perf_counter() - started)
+    print(f"Batch {batch_id}: {report['reviewed']} reports reviewed in {report['wall_seconds']}s "
+          f"({report['files_per_minute']} per minute), {len(report['failed'])} failed.", file=sys.stderr)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("api_key", help="API key for the selected model provider")
+    parser.add_argument("model_name", help="Model to review with, e.g. gpt-4o")
+    parser.add_argument("paths", nargs="+", help="Project folders and/or report files")
+    parser.add_argument("--files", type=int, default=BATCH_FILES, help="Reports reviewed at the same time")
+    parser.add_argument("--ai-concurrency", type=int, default=BATCH_AI_CONCURRENCY,
+                        help="Model calls in flight across the batch")
+    parser.add_argument("--restart", action="store_true", help="Review every report again, even those done")
+    parser.add_argument("--full", action="store_true",
+                        help="Review every page even if an earlier run of the project matches")
+    parser.add_argument("--compact", action="store_true", help="Rewrite and compress the annotated PDFs")
+    parser.add_argument("--dual-pass", action="store_true", default=DUAL_PASS_DEFAULT,
+                        help="Scan every chunk with a cheap model and review only the flagged ones")
+    parser.add_argument("--scan-model", default=SCAN_MODEL, help="Model for the dual-pass scan")
+    parser.add_argument("--output", help="Also write the throughput report to this JSON file")
+    args = parser.parse_args()
+
+    create_schema()
+    with event_sink(ndjson_writer(sys.stdout)):
+        report = run_batch(args.paths, args.api_key, args.model_name, files_at_once=args.files,
+                           ai_concurrency=args.ai_concurrency, restart=args.restart, incremental=not args.full,
+                           annotation_mode="compact" if args.compact else "fast",
+                           scan_model=args.scan_model if args.dual_pass else None)
+        emit("batch_done", report=report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if report["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    # Required for the extraction process pool in the PyInstaller-frozen executable.
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,211 @@
+"""
+Times each stage of the review pipeline on synthetic TAB reports.
+
+Reports are generated with benchmarks/synthetic.py. The AI is stubbed with a
+fake OpenAI client that returns no findings after an optional simulated
+latency, so the numbers cover everything the worker itself does. The
+database and extraction cache live in a throwaway temporary directory.
+
+Usage:
+    python benchmarks/review_pipeline.py [--pages 200] [--sheets 10] [--repeat 3] [--llm-latency 0] [--check]
+
+Prints a JSON object with the median milliseconds of each benchmark and the
+prompt tokens of the report against the old repr-based prompt. With
+--check, exits with status 1 if the full 200-page review misses the MVP target
+of two minutes (Plan.md, MVP exit criteria).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ai_gateway  # noqa: E402
+import database  # noqa: E402
+import extract_cache  # noqa: E402
+import review  # noqa: E402
+from layout import ReportIndex, index_items  # noqa: E402
+from annotator import add_annotations_to_pdf  # noqa: E402
+from synthetic import make_tab_pdf, make_tab_workbook  # noqa: E402
+from tables import Table  # noqa: E402
+
+# MVP exit criterion: an annotated 200-page report in under two minutes.
+MVP_PAGES = 200
+MVP_SECONDS = 120.0
+
+class _ApproxTokenizer:
+    """Stand-in for tiktoken when its encodings cannot be downloaded: about four characters per token."""
+
+    def encode(self, text, **kwargs):
+        return range((len(text) + 3) // 4)
+
+    def encode_batch(self, texts, **kwargs):
+        return [self.encode(text) for text in texts]
+
+def _fake_client(latency: float):
+    """An object shaped like the OpenAI client whose completions return no findings."""
+    def create(model, messages, **kwargs):
+        if latency:
+            time.sleep(latency)
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return types.SimpleNamespace(
+            usage=types.SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=20),
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content='{"findings": []}'))],
+        )
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+def _prepare_tokenizer(model_name: str) -> str:
+    """Uses the real tokenizer when it loads, otherwise the approximation. Returns which one is in use."""
+    try:
+        ai_gateway.get_tokenizer(model_name)
+        return "tiktoken"
+    except Exception as e:
+        print(f"Tokenizer unavailable ({e}); using a 4-characters-per-token approximation.", file=sys.stderr)
+        ai_gateway.get_tokenizer = lambda name: _ApproxTokenizer()
+        return "approximate"
+
+def _sample_findings(data: list, every: int = 10) -> list:
+    """Findings pointing at every `every`-th table row, as the model and the rule engine name them."""
+    findings = []
+    for item in data:
+        if item["type"] != "table":
+            continue
+        table = item["content"]
+        for i in range(0, len(table), every):
+            terminal = table.columns[0].text(i) if table.width else ""
+            findings.append({"page": item["page"], "table": item["table"], "row": int(table.row_numbers[i]),
+                             "issue": f"Reading at {terminal} out of tolerance"})
+    return findings
+
+# The review prompt before the compact encoding: Python reprs of the profile and of the chunk's items.
+LEGACY_PROMPT = """
+    You are an expert TAB (Testing, Adjusting, and Balancing) report analyst.
+    Review the following data extracted from a TAB report and identify any issues
+    based on the provided tolerance profile.
+
+    Tolerance Profile:
+    {profile}
+
+    Report Data Chunk:
+    {chunk}
+
+    Identify any readings that are outside the specified tolerances.
+    For each issue, provide the page number and a clear description of the problem.
+    Respond with a JSON object containing a list of findings, where each finding
+    is an object with "page" and "issue" keys.
+    If there are no issues, return an empty list.
+    """
+
+def _prompt_tokens(chunks: list, model_name: str) -> dict:
+    """Prompt tokens for all chunks of a report, with the compact encoding and with the legacy one."""
+    profile = database.get_active_profile()
+    tokenizer = ai_gateway.get_tokenizer(model_name)
+    compact, legacy = [], []
+    for chunk in chunks:
+        compact.extend(ai_gateway.create_review_prompt(chunk, profile))
+        items = [{**item, "content": item["content"].rows()} if isinstance(item.get("content"), Table) else item
+                 for item in chunk]
+        legacy.append(LEGACY_PROMPT.format(profile=profile, chunk=items))
+    compact_tokens = sum(ai_gateway.count_tokens(tokenizer, compact))
+    legacy_tokens = sum(ai_gateway.count_tokens(tokenizer, legacy))
+    prefix = ai_gateway.create_review_prompt([], profile)[0]
+    return {
+        "legacy": legacy_tokens,
+        "compact": compact_tokens,
+        "saved_pct": round(100 * (1 - compact_tokens / legacy_tokens), 1) if legacy_tokens else None,
+        # Sent with every chunk, and cacheable by the provider.
+        "shared_prefix": ai_gateway.count_tokens(tokenizer, [prefix])[0],
+    }
+
+def _time(fn, repeat: int) -> tuple:
+    """Runs `fn` `repeat` times. Returns (median milliseconds, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 1), result
+
+def run(pages: int, sheets: int, repeat: int, model_name: str, llm_latency: float, workdir: str) -> dict:
+    pdf_path = os.path.join(workdir, "synthetic_report.pdf")
+    xlsx_path = os.path.join(workdir, "synthetic_report.xlsx")
+    results = {"pages": pages, "sheets": sheets, "repeat": repeat, "model": model_name}
+
+    results["generate_pdf_ms"], _ = _time(lambda: make_tab_pdf(pdf_path, pages), 1)
+    results["generate_xlsx_ms"], _ = _time(lambda: make_tab_workbook(xlsx_path, sheets), 1)
+    results["tokenizer"] = _prepare_tokenizer(model_name)
+
+    # Everything below parses from scratch, except extract_pdf_cached_ms which reads the extraction cache.
+    review.EXTRACT_CACHE_ENABLED = False
+    results["extract_pdf_ms"], pdf_data = _time(lambda: review.extract_data_from_pdf(pdf_path), repeat)
+    # As in review_file: the layout index takes the word boxes off the items before chunking.
+    index = ReportIndex()
+    pdf_data = list(index_items(pdf_data, index))
+    results["extract_excel_ms"], excel_data = _time(lambda: review.extract_data_from_excel(xlsx_path), repeat)
+    results["chunk_ms"], chunks = _time(lambda: ai_gateway.chunk_data(pdf_data + excel_data, model_name), repeat)
+    results["chunks"] = len(chunks)
+    results["prompt_tokens"] = _prompt_tokens(chunks, model_name)
+
+    findings = _sample_findings(pdf_data)
+    annotated_path = os.path.join(workdir, "synthetic_report_review.pdf")
+
+    def annotate():
+        placed = [{key: value for key, value in finding.items() if key != "rects"} for finding in findings]
+        add_annotations_to_pdf(pdf_path, placed, annotated_path, index=index)
+        return placed
+
+    results["annotate_ms"], placed = _time(annotate, repeat)
+    results["annotated_findings"] = len(findings)
+    results["placed_findings"] = sum(1 for finding in placed if finding["rects"])
+
+    # Full pipeline: extraction, rule engine, chunking, stubbed AI review, annotation and run bookkeeping.
+    client = _fake_client(llm_latency)
+    ai_gateway.get_ai_client = lambda api_key: client
+    results["full_pipeline_ms"], result = _time(
+        lambda: review.review_file(pdf_path, "benchmark", model_name, project="benchmark", incremental=False),
+        repeat,
+    )
+    results["full_pipeline_stages"] = result["metrics"]["stages"]
+    results["rule_engine_findings"] = len(result["findings"])
+
+    review.EXTRACT_CACHE_ENABLED = True
+    list(review.iter_pdf_data(pdf_path))
+    results["extract_pdf_cached_ms"], _ = _time(lambda: review.extract_data_from_pdf(pdf_path), repeat)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=MVP_PAGES, help="Pages in the synthetic PDF")
+    parser.add_argument("--sheets", type=int, default=10, help="Sheets in the synthetic workbook")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the median is reported")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per model call")
+    parser.add_argument("--check", action="store_true",
+                        help=f"Fail unless the full pipeline finishes {MVP_PAGES} pages in under {MVP_SECONDS:g}s")
+    args = parser.parse_args()
+    if args.check and args.pages < MVP_PAGES:
+        parser.error(f"--check needs at least {MVP_PAGES} pages")
+
+    with tempfile.TemporaryDirectory(prefix="tab-crusher-bench-") as workdir:
+        database.DB_PATH = Path(workdir) / "benchmark.sqlite"
+        extract_cache.EXTRACT_CACHE_DIR = Path(workdir) / "extract_cache"
+        database.create_schema()
+        results = run(args.pages, args.sheets, args.repeat, args.model, args.llm_latency, workdir)
+
+    if args.check:
+        results["mvp_target_ms"] = MVP_SECONDS * 1000
+        results["mvp_target_met"] = results["full_pipeline_ms"] < MVP_SECONDS * 1000
+    print(json.dumps(results, indent=2))
+    if args.check and not results["mvp_target_met"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Measures the fixed cost the worker adds to every review.
+
+Both models are timed on the same request: a full `review` of a small
+synthetic report. "per_process" is the old model: a fresh worker process per
+review, paying for interpreter start-up, imports, schema creation and the
+extraction pool on top of the review itself. "daemon" is the `--serve` model:
+one long-lived process that has already reviewed once, so each review only
+pays for the work on the report.
+
+The model is a local stub of the OpenAI API (reached through OPENAI_BASE_URL)
+that answers at once with no findings, and the workers use a throwaway
+database, so the numbers cover the worker alone. Extraction caching is off,
+so every review parses the report.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--pages 4] [--model gpt-4o]
+
+Prints a JSON object with per-review milliseconds for both models.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from synthetic import make_tab_pdf
+
+WORKER_DIR = Path(__file__).resolve().parent.parent
+
+# Runs `review.py --serve` with the database at $TAB_CRUSHER_BENCH_DB and, when
+# tiktoken cannot download its encodings, an approximate tokenizer.
+_WORKER_BOOTSTRAP = """
+import os, sys
+sys.path.insert(0, {worker_dir!r})
+import ai_gateway, database
+database.DB_PATH = os.environ["TAB_CRUSHER_BENCH_DB"]
+try:
+    ai_gateway.get_tokenizer({model!r})
+except Exception:
+    class ApproxTokenizer:
+        def encode_batch(self, texts, **kwargs):
+            return [range((len(text) + 3) // 4) for text in texts]
+    ai_gateway.get_tokenizer = lambda model_name: ApproxTokenizer()
+import review
+sys.argv = ["review.py", "--serve"]
+review.main()
+"""
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Answers every chat completion with no findings."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        payload = json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": '{"findings": []}'}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def _start_worker(env: dict, model_name: str):
+    code = _WORKER_BOOTSTRAP.format(worker_dir=str(WORKER_DIR), model=model_name)
+    return subprocess.Popen(
+        [sys.executable, "-c", code], env=env, cwd=str(WORKER_DIR),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+    )
+
+def _call(worker, request_id: int, method: str, params: dict = None) -> dict:
+    request = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+    worker.stdin.write(json.dumps(request) + "\n")
+    worker.stdin.flush()
+    while True:
+        line = worker.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Worker exited during {method}")
+        response = json.loads(line)
+        # Progress events of the request arrive as notifications ahead of its response.
+        if response.get("id") == request_id:
+            break
+    if "error" in response:
+        raise RuntimeError(response["error"]["message"])
+    return response["result"]
+
+def _stop(worker):
+    _call(worker, 0, "shutdown")
+    worker.wait(timeout=30)
+
+def _review(worker, request_id: int, report: str, model_name: str) -> dict:
+    return _call(worker, request_id, "review",
+                 {"file_path": report, "api_key": "benchmark", "model_name": model_name, "full": True})
+
+def per_process(runs: int, report: str, model_name: str, env: dict) -> list:
+    """Milliseconds from spawning a fresh worker to it returning the review, per run."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        worker = _start_worker(env, model_name)
+        _review(worker, 1, report, model_name)
+        timings.append((time.perf_counter() - started) * 1000)
+        _stop(worker)
+    return timings
+
+def daemon(runs: int, report: str, model_name: str, env: dict) -> list:
+    """Milliseconds per review request against a worker that has already reviewed once."""
+    worker = _start_worker(env, model_name)
+    _review(worker, 1, report, model_name)
+    timings = []
+    for n in range(runs):
+        started = time.perf_counter()
+        _review(worker, n + 2, report, model_name)
+        timings.append((time.perf_counter() - started) * 1000)
+    _stop(worker)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=4, help="Pages in the synthetic report")
+    parser.add_argument("--model", default="gpt-4o")
+    args = parser.parse_args()
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory(prefix="tab-crusher-startup-") as workdir:
+        report = os.path.join(workdir, "report.pdf")
+        make_tab_pdf(report, args.pages)
+        env = {
+            **os.environ,
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{stub.server_address[1]}/v1",
+            "TAB_CRUSHER_EXTRACT_CACHE": "0",
+            "TAB_CRUSHER_BENCH_DB": os.path.join(workdir, "tab_crusher.sqlite"),
+        }
+        # The daemon goes first; its untimed first review also fills the LLM cache both models then read.
+        warm = daemon(args.runs, report, args.model, env)
+        cold = per_process(args.runs, report, args.model, env)
+    stub.shutdown()
+    print(json.dumps({
+        "runs": args.runs,
+        "pages": args.pages,
+        "per_process_ms": round(statistics.median(cold), 1),
+        "daemon_ms": round(statistics.median(warm), 1),
+        "saved_per_review_ms": round(statistics.median(cold) - statistics.median(warm), 1),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Generates synthetic TAB reports for benchmarking.
+
+The reports imitate the layout of a real air-balance report: a title and
+notes on every page, followed by ruled design/actual tables of terminal
+readings (supply, return, exhaust, outside air and coil ΔT). A fraction of
+the readings are pushed out of tolerance so the rule engine and annotator
+have real work to do. Output is deterministic for a given seed.
+
+Usage:
+    python benchmarks/synthetic.py report.pdf --pages 200 --tables 2 --rows 12
+    python benchmarks/synthetic.py report.xlsx --sheets 10 --tables 3 --rows 40
+"""
+
+import argparse
+import random
+
+# (category label, terminal tag prefix, design range, unit)
+READING_TYPES = [
+    ("Supply", "SA", (150, 2500), "CFM"),
+    ("Return", "RA", (150, 2500), "CFM"),
+    ("Exhaust", "EF", (75, 1200), "CFM"),
+    ("Outside Air", "OA", (100, 1500), "CFM"),
+    ("Coil dT", "CHW", (8, 20), "F"),
+]
+HEADER = ["Terminal", "Type", "Size", "Design", "Actual", "% of Design", "Remarks"]
+# Share of readings generated outside the default profile's tolerances.
+OUT_OF_TOLERANCE_RATE = 0.08
+
+def make_rows(rng: random.Random, rows: int, table_number: int) -> list:
+    """Returns the header and `rows` readings of one air-balance table."""
+    label, tag, (low, high), unit = READING_TYPES[table_number % len(READING_TYPES)]
+    data = [HEADER]
+    for i in range(rows):
+        design = rng.randint(low, high)
+        if rng.random() < OUT_OF_TOLERANCE_RATE:
+            actual = design * rng.choice([0.7, 0.8, 1.2, 1.3])
+        else:
+            actual = design * rng.uniform(0.95, 1.05)
+        actual = round(actual) if unit == "CFM" else round(actual, 1)
+        data.append([
+            f"{tag}-{table_number + 1}.{i + 1}",
+            label,
+            f"{rng.choice([6, 8, 10, 12, 14])}\"" if unit == "CFM" else "",
+            f"{design}",
+            f"{actual}",
+            f"{actual / design * 100:.0f}%",
+            rng.choice(["", "", "", "Balanced", "Damper at max", "See note"]),
+        ])
+    return data
+
+def make_tab_pdf(path: str, pages: int = 200, tables_per_page: int = 2, rows_per_table: int = 12,
+                 seed: int = 0) -> str:
+    """Writes a synthetic TAB report PDF with ruled tables that pdfplumber detects as tables."""
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    page_width, page_height = 612, 792
+    margin = 40
+    row_height = 16
+    column_widths = [80, 70, 50, 60, 60, 70, 142]
+
+    doc = fitz.open()
+    font = fitz.Font("helv")
+    table_number = 0
+    for page_number in range(pages):
+        page = doc.new_page(width=page_width, height=page_height)
+        # Cell text is batched into one TextWriter per page; a call per cell is far slower.
+        writer = fitz.TextWriter(page.rect)
+        page.insert_text((margin, margin + 10), f"Air Balance Report - System AHU-{page_number // 10 + 1}",
+                         fontsize=13)
+        page.insert_text((margin, margin + 28), f"Project 2024-{seed:03d}  |  Page {page_number + 1} of {pages}",
+                         fontsize=8)
+        y = margin + 44
+        for _ in range(tables_per_page):
+            rows = make_rows(rng, rows_per_table, table_number)
+            table_height = row_height * len(rows)
+            if y + table_height > page_height - margin - 30:
+                break
+            shape = page.new_shape()
+            for r, row in enumerate(rows):
+                x = margin
+                for c, cell in enumerate(row):
+                    shape.draw_rect(fitz.Rect(x, y + r * row_height, x + column_widths[c], y + (r + 1) * row_height))
+                    writer.append((x + 3, y + r * row_height + 11), str(cell), font=font, fontsize=7)
+                    x += column_widths[c]
+            shape.finish(color=(0, 0, 0), width=0.5)
+            shape.commit()
+            y += table_height + 20
+            table_number += 1
+        writer.write_text(page)
+        page.insert_text((margin, page_height - margin),
+                         "Notes: Readings taken with calibrated flow hood. Tolerances per project specification.",
+                         fontsize=7)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+def make_tab_workbook(path: str, sheets: int = 10, tables_per_sheet: int = 3, rows_per_table: int = 40,
+                      seed: int = 0) -> str:
+    """Writes a synthetic TAB report workbook, one system per sheet, tables stacked with a blank row between."""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    # Write-only mode streams rows straight to disk, so large workbooks stay cheap to generate.
+    workbook = Workbook(write_only=True)
+    table_number = 0
+    for sheet_number in range(sheets):
+        sheet = workbook.create_sheet(f"AHU-{sheet_number + 1}")
+        sheet.append([f"Air Balance Report - System AHU-{sheet_number + 1}"])
+        sheet.append([])
+        for _ in range(tables_per_sheet):
+            for row in make_rows(rng, rows_per_table, table_number):
+                sheet.append(row)
+            sheet.append([])
+            table_number += 1
+    workbook.save(path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="Path of the report to write (.pdf or .xlsx)")
+    parser.add_argument("--pages", type=int, default=200, help="PDF pages")
+    parser.add_argument("--sheets", type=int, default=10, help="Workbook sheets")
+    parser.add_argument("--tables", type=int, default=None, help="Tables per page or sheet")
+    parser.add_argument("--rows", type=int, default=None, help="Rows per table")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.output.lower().endswith(".pdf"):
+        make_tab_pdf(args.output, args.pages, args.tables or 2, args.rows or 12, args.seed)
+    elif args.output.lower().endswith(".xlsx"):
+        make_tab_workbook(args.output, args.sheets, args.tables or 3, args.rows or 40, args.seed)
+    else:
+        parser.error("Output must end in .pdf or .xlsx")
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
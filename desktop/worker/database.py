@@ -1,106 +1,513 @@
-import sqlite3
-from pathlib import Path
-
-# The database will be created in the user's app data directory, managed by Tauri.
-# For local development, we'll place it in the worker directory for simplicity.
-# TODO: Integrate with Tauri's path resolver API to get the proper app data directory.
-DB_PATH = Path(__file__).parent / "tab_crusher.sqlite"
-
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def create_schema():
-    """Creates the database schema if it doesn't already exist."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Profile table: Stores different sets of tolerances and settings.
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS profiles (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        json_data TEXT NOT NULL, -- Storing tolerances as a JSON string
-        version INTEGER NOT NULL
-    );
-    """)
-    
-    # Rules table: Stores user-defined YAML rules for the review process.
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS rules (
-        id TEXT PRIMARY KEY,
-        profile_id TEXT NOT NULL,
-        yaml_rule TEXT NOT NULL,
-        version INTEGER NOT NULL,
-        FOREIGN KEY (profile_id) REFERENCES profiles (id)
-    );
-    """)
-
-    # Runs table: Logs each time a report is reviewed.
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS runs (
-        id TEXT PRIMARY KEY,
-        profile_id TEXT NOT NULL,
-        file_hash TEXT NOT NULL, -- To detect re-runs of the same file
-        result_json TEXT NOT NULL, -- The JSON output from the AI review
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (profile_id) REFERENCES profiles (id)
-    );
-    """)
-
-    # Pending Updates table: Offline queue for syncing with the cloud API.
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS pending_updates (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        payload_json TEXT NOT NULL, -- The JSON payload to send to the API
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    
-    conn.commit()
-    conn.close()
-    print("Database schema initialized successfully.", file=sys.stderr)
-    
-    # Populate default data if the database was just created
-    populate_default_profile()
-
-def populate_default_profile():
-    """Inserts the default tolerance profile if no profiles exist."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id FROM profiles")
-    if cursor.fetchone() is None:
-        import json
-        import uuid
-
-        default_tolerances = {
-            "Supply": {"type": "percent", "value": 10},
-            "Return": {"type": "percent", "value": 10},
-            "Exhaust": {"type": "percent", "value": 15},
-            "OA": {"type": "percent", "value": 5},
-            "Coil_dT": {"type": "absolute", "value": 2, "unit": "F"}
-        }
-        
-        profile_id = str(uuid.uuid4())
-        
-        cursor.execute(
-            "INSERT INTO profiles (id, name, json_data, version) VALUES (?, ?, ?, ?)",
-            (
-                profile_id,
-                "Manager Default",
-                json.dumps(default_tolerances),
-                1
-            )
-        )
-        conn.commit()
-        print("Inserted default tolerance profile.", file=sys.stderr)
-        
-    conn.close()
-
-if __name__ == '__main__':
-    # Allows running this script directly to initialize the database.
-    import sys
-    create_schema() 
\ No newline at end of file
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# The database will be created in the user's app data directory, managed by Tauri.
+# For local development, we'll place it in the worker directory for simplicity.
+# TODO: Integrate with Tauri's path resolver API to get the proper app data directory.
+DB_PATH = Path(__file__).parent / "tab_crusher.sqlite"
+
+# LLM response cache limits. Least recently used entries are evicted past the size limit.
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LLM_CACHE_MAX_AGE_DAYS = 30
+
+# Applied to every new connection. WAL lets readers (the UI, the sync client) run
+# alongside a review's writes, and with WAL, synchronous=NORMAL only syncs at checkpoints.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",  # 16 MB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+    "PRAGMA busy_timeout = 5000",
+)
+
+# One connection per process, shared by every thread of the worker. Access is
+# serialized by _lock; use transaction() rather than the connection directly.
+_connection = None
+_connection_key = None
+_lock = threading.RLock()
+
+def get_db_connection():
+    """Returns the process-wide connection, opening it on first use."""
+    global _connection, _connection_key
+    # A forked process, or a different DB_PATH (benchmarks), gets a connection of its own.
+    key = (os.getpid(), str(DB_PATH))
+    with _lock:
+        if _connection is None or _connection_key != key:
+            conn = sqlite3.connect(DB_PATH, timeout=5.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            _connection, _connection_key = conn, key
+        return _connection
+
+def close_db_connection():
+    """Closes the shared connection, letting SQLite refresh its query planner statistics first."""
+    global _connection, _connection_key
+    with _lock:
+        if _connection is not None and _connection_key == (os.getpid(), str(DB_PATH)):
+            try:
+                _connection.execute("PRAGMA optimize")
+            finally:
+                _connection.close()
+        _connection = _connection_key = None
+
+atexit.register(close_db_connection)
+
+@contextmanager
+def transaction():
+    """Holds the connection for one unit of work, committing on success and rolling back on error."""
+    with _lock:
+        conn = get_db_connection()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+def _add_column_if_missing(cursor, table: str, column: str, declaration: str):
+    """Adds a column to an existing table; CREATE TABLE IF NOT EXISTS does not."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+# --- Migrations ---
+
+def _migration_1(cursor):
+    """Baseline schema. Idempotent, because databases created before versioning already have some of it."""
+    # Profile table: Stores different sets of tolerances and settings.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profiles (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        json_data TEXT NOT NULL, -- Storing tolerances as a JSON string
+        version INTEGER NOT NULL
+    );
+    """)
+    
+    # Rules table: Stores user-defined YAML rules for the review process.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rules (
+        id TEXT PRIMARY KEY,
+        profile_id TEXT NOT NULL,
+        yaml_rule TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        FOREIGN KEY (profile_id) REFERENCES profiles (id)
+    );
+    """)
+
+    # Runs table: Logs each time a report is reviewed.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS runs (
+        id TEXT PRIMARY KEY,
+        profile_id TEXT NOT NULL,
+        file_hash TEXT NOT NULL, -- To detect re-runs of the same file
+        result_json TEXT NOT NULL, -- The JSON output from the AI review
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (profile_id) REFERENCES profiles (id)
+    );
+    """)
+
+    # Older databases predate incremental re-review.
+    _add_column_if_missing(cursor, "runs", "project", "TEXT")
+    _add_column_if_missing(cursor, "runs", "profile_version", "INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_runs_project ON runs (project, profile_id);")
+
+    # Run Pages table: Per-page content fingerprints, used to re-review only changed pages.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS run_pages (
+        run_id TEXT NOT NULL,
+        page INTEGER NOT NULL, -- 1-based page number
+        page_hash TEXT NOT NULL,
+        PRIMARY KEY (run_id, page),
+        FOREIGN KEY (run_id) REFERENCES runs (id)
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_run_pages_hash ON run_pages (page_hash);")
+
+    # Run Metrics table: Per-stage timings, memory and model usage of a run (see profiling.py).
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS run_metrics (
+        run_id TEXT PRIMARY KEY,
+        wall_ms REAL,
+        cpu_ms REAL,
+        peak_rss_mb REAL,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        cost_usd REAL,
+        metrics_json TEXT NOT NULL, -- The full metrics, including each stage and model call
+        FOREIGN KEY (run_id) REFERENCES runs (id)
+    );
+    """)
+
+    # LLM Cache table: Model responses keyed by a hash of prompt, model and profile version.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        model_name TEXT NOT NULL,
+        response_json TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at);")
+
+    # Pending Updates table: Offline queue for syncing with the cloud API.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pending_updates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        payload_json TEXT NOT NULL, -- The JSON payload to send to the API
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+def _migration_2(cursor):
+    """Lookup indexes for a long run history, and one row per finding."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_runs_file_hash ON runs (file_hash, profile_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rules_profile ON rules (profile_id);")
+
+    # Findings table: The findings of each run, queryable without parsing result_json.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS findings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        page INTEGER, -- 1-based page number; NULL for workbook findings
+        sheet TEXT,
+        row INTEGER,
+        source TEXT, -- "rule_engine" or NULL for model findings
+        issue TEXT NOT NULL,
+        FOREIGN KEY (run_id) REFERENCES runs (id)
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_findings_run ON findings (run_id);")
+
+def _migration_3(cursor):
+    """Key-value state of the cloud sync client, e.g. the batch being uploaded."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value_json TEXT NOT NULL
+    );
+    """)
+
+def _migration_4(cursor):
+    """Batch jobs (see batch.py): one row per report, so an interrupted batch can resume."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS batch_files (
+        batch_id TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending', -- pending, running, done or failed
+        run_id TEXT, -- Set once the report has been reviewed
+        error TEXT,
+        wall_ms REAL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (batch_id, file_path),
+        FOREIGN KEY (run_id) REFERENCES runs (id)
+    );
+    """)
+
+def _migration_5(cursor):
+    """The models a run was reviewed with, so incremental reviews only build on runs of the same models."""
+    _add_column_if_missing(cursor, "runs", "model_name", "TEXT")
+    _add_column_if_missing(cursor, "runs", "scan_model", "TEXT") # Set for dual-pass reviews
+
+# MIGRATIONS[n] upgrades a database from schema version n to n + 1 (PRAGMA user_version).
+# Append new migrations; never edit one that has shipped.
+MIGRATIONS = [_migration_1, _migration_2, _migration_3, _migration_4, _migration_5]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def create_schema():
+    """Brings the database schema up to SCHEMA_VERSION. Costs one PRAGMA read when it already is."""
+    with _lock:
+        conn = get_db_connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            # Each migration and its version bump commit together, or not at all.
+            conn.execute("BEGIN")
+            try:
+                migration(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {target}")
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        print(f"Database schema migrated from version {version} to {SCHEMA_VERSION}.", file=sys.stderr)
+
+    # Populate default data if the database was just created
+    populate_default_profile()
+
+def populate_default_profile():
+    """Inserts the default tolerance profile if no profiles exist."""
+    with transaction() as conn:
+        if conn.execute("SELECT 1 FROM profiles LIMIT 1").fetchone() is not None:
+            return
+        import uuid
+
+        default_tolerances = {
+            "Supply": {"type": "percent", "value": 10},
+            "Return": {"type": "percent", "value": 10},
+            "Exhaust": {"type": "percent", "value": 15},
+            "OA": {"type": "percent", "value": 5},
+            "Coil_dT": {"type": "absolute", "value": 2, "unit": "F"}
+        }
+        
+        profile_id = str(uuid.uuid4())
+        
+        conn.execute(
+            "INSERT INTO profiles (id, name, json_data, version) VALUES (?, ?, ?, ?)",
+            (
+                profile_id,
+                "Manager Default",
+                json.dumps(default_tolerances),
+                1
+            )
+        )
+    print("Inserted default tolerance profile.", file=sys.stderr)
+
+# --- Profiles ---
+
+def get_active_profile() -> dict:
+    """Returns the active tolerance profile as a dict with id, name, version and tolerances."""
+    # TODO: Let the user pick the active profile instead of using the first one.
+    with transaction() as conn:
+        row = conn.execute("SELECT id, name, json_data, version FROM profiles ORDER BY rowid LIMIT 1").fetchone()
+    if row is None:
+        return {"id": None, "name": "Manager Default", "version": 0, "tolerances": {}}
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "version": row["version"],
+        "tolerances": json.loads(row["json_data"]),
+    }
+
+# --- Runs ---
+
+def record_run(run_id: str, profile: dict, project: str, file_hash: str, result: dict, page_hashes: list,
+               metrics: dict = None, model_name: str = None, scan_model: str = None):
+    """
+    Logs a review run together with the fingerprint of each of its pages, its
+    findings and its performance metrics, in one transaction.
+
+    A None in `page_hashes` marks a page that was not fully reviewed; it is
+    left out, so a later incremental review of the project reviews it again.
+    """
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO runs (id, profile_id, profile_version, project, file_hash, result_json, model_name, "
+            "scan_model) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, profile["id"], profile["version"], project, file_hash, json.dumps(result), model_name,
+             scan_model)
+        )
+        conn.executemany(
+            "INSERT INTO run_pages (run_id, page, page_hash) VALUES (?, ?, ?)",
+            [(run_id, i + 1, page_hash) for i, page_hash in enumerate(page_hashes) if page_hash is not None]
+        )
+        _insert_findings(conn, run_id, result.get("findings", []))
+        if metrics is not None:
+            llm = metrics.get("llm", {})
+            conn.execute(
+                "INSERT INTO run_metrics (run_id, wall_ms, cpu_ms, peak_rss_mb, prompt_tokens, completion_tokens, "
+                "cost_usd, metrics_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, metrics.get("wall_ms"), metrics.get("cpu_ms"), metrics.get("peak_rss_mb"),
+                 llm.get("prompt_tokens"), llm.get("completion_tokens"), llm.get("cost_usd"), json.dumps(metrics))
+            )
+
+def _insert_findings(conn, run_id: str, findings: list):
+    """Inserts the findings of a run with one executemany call."""
+    rows = []
+    for finding in findings:
+        page = finding.get("page")
+        row = finding.get("row")
+        rows.append((
+            run_id,
+            page if isinstance(page, int) else None,
+            finding.get("sheet"),
+            row if isinstance(row, int) else None,
+            finding.get("source"),
+            str(finding.get("issue", "")),
+        ))
+    conn.executemany(
+        "INSERT INTO findings (run_id, page, sheet, row, source, issue) VALUES (?, ?, ?, ?, ?, ?)", rows
+    )
+
+def find_closest_run(project: str, profile: dict, page_hashes: list, model_name: str = None,
+                     scan_model: str = None):
+    """
+    Returns the id of the earlier run of `project`, reviewed with the same profile
+    version and models, that shares the most page fingerprints with `page_hashes`,
+    or None.
+    """
+    if not page_hashes:
+        return None
+    with transaction() as conn:
+        row = conn.execute("""
+        SELECT r.id, COUNT(*) AS shared_pages
+        FROM runs r JOIN run_pages p ON p.run_id = r.id
+        WHERE r.project = ? AND r.profile_id = ? AND r.profile_version = ?
+          AND r.model_name IS ? AND r.scan_model IS ?
+          AND p.page_hash IN (SELECT value FROM json_each(?))
+        GROUP BY r.id
+        ORDER BY shared_pages DESC, r.created_at DESC
+        LIMIT 1;
+        """, (project, profile["id"], profile["version"], model_name, scan_model,
+              json.dumps(page_hashes))).fetchone()
+    return row["id"] if row else None
+
+def find_runs_by_hash(file_hash: str, profile_id: str) -> list:
+    """Returns the ids of earlier runs of the exact same file under a profile, newest first."""
+    with transaction() as conn:
+        rows = conn.execute(
+            "SELECT id FROM runs WHERE file_hash = ? AND profile_id = ? ORDER BY created_at DESC",
+            (file_hash, profile_id)
+        ).fetchall()
+    return [row["id"] for row in rows]
+
+def get_run(run_id: str):
+    """
+    Returns (result dict, list of page hashes in page order) for a recorded run.
+    Pages recorded without a hash are None in the list.
+    """
+    with transaction() as conn:
+        run = conn.execute("SELECT result_json FROM runs WHERE id = ?", (run_id,)).fetchone()
+        pages = conn.execute("SELECT page, page_hash FROM run_pages WHERE run_id = ? ORDER BY page",
+                             (run_id,)).fetchall()
+    page_hashes = [None] * (pages[-1]["page"] if pages else 0)
+    for row in pages:
+        page_hashes[row["page"] - 1] = row["page_hash"]
+    return json.loads(run["result_json"]), page_hashes
+
+def get_run_metrics(run_id: str):
+    """Returns the performance metrics recorded for a run, or None."""
+    with transaction() as conn:
+        row = conn.execute("SELECT metrics_json FROM run_metrics WHERE run_id = ?", (run_id,)).fetchone()
+    return json.loads(row["metrics_json"]) if row else None
+
+# --- Pending Updates ---
+
+def queue_pending_updates(payloads: list):
+    """Adds payloads to the offline sync queue with one executemany call."""
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO pending_updates (payload_json) VALUES (?)",
+            [(json.dumps(payload),) for payload in payloads]
+        )
+
+def get_pending_updates() -> list:
+    """Returns the queued (id, payload) pairs, oldest first."""
+    with transaction() as conn:
+        rows = conn.execute("SELECT id, payload_json FROM pending_updates ORDER BY id").fetchall()
+    return [(row["id"], json.loads(row["payload_json"])) for row in rows]
+
+def get_sync_state(key: str):
+    with transaction() as conn:
+        row = conn.execute("SELECT value_json FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return json.loads(row["value_json"]) if row else None
+
+def set_sync_state(key: str, value):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value_json) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+def complete_sync_batch(state_key: str, row_ids: list):
+    """Removes an uploaded batch's rows from the queue and clears its sync state, together."""
+    with transaction() as conn:
+        conn.execute(
+            "DELETE FROM pending_updates WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(row_ids),)
+        )
+        conn.execute("DELETE FROM sync_state WHERE key = ?", (state_key,))
+
+# --- Batch Jobs ---
+
+def start_batch(batch_id: str, file_paths: list, restart: bool = False) -> list:
+    """
+    Registers the files of a batch, keeping the state of any already known.
+    Files left running by an interrupted batch go back to pending, as do all
+    files with `restart`. Returns the (file_path, status) of every file.
+    """
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO batch_files (batch_id, file_path) VALUES (?, ?)",
+            [(batch_id, path) for path in file_paths]
+        )
+        reset = "" if restart else " AND status = 'running'"
+        conn.execute(
+            "UPDATE batch_files SET status = 'pending', run_id = NULL, error = NULL, wall_ms = NULL "
+            f"WHERE batch_id = ?{reset}", (batch_id,)
+        )
+        rows = conn.execute(
+            "SELECT file_path, status FROM batch_files WHERE batch_id = ? ORDER BY file_path", (batch_id,)
+        ).fetchall()
+    return [(row["file_path"], row["status"]) for row in rows]
+
+def set_batch_file_status(batch_id: str, file_path: str, status: str, run_id: str = None, error: str = None,
+                          wall_ms: float = None):
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE batch_files SET status = ?, run_id = ?, error = ?, wall_ms = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE batch_id = ? AND file_path = ?",
+            (status, run_id, error, wall_ms, batch_id, file_path)
+        )
+
+def get_batch_files(batch_id: str) -> list:
+    """Returns the files of a batch as dicts with file_path, status, run_id, error and wall_ms."""
+    with transaction() as conn:
+        rows = conn.execute(
+            "SELECT file_path, status, run_id, error, wall_ms FROM batch_files WHERE batch_id = ? ORDER BY file_path",
+            (batch_id,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+# --- LLM Response Cache ---
+
+def get_cached_response(cache_key: str):
+    """Returns the cached response for `cache_key`, or None, and marks it as recently used."""
+    with transaction() as conn:
+        row = conn.execute("SELECT response_json FROM llm_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE llm_cache SET last_used_at = CURRENT_TIMESTAMP WHERE cache_key = ?", (cache_key,))
+        return row["response_json"]
+
+def put_cached_response(cache_key: str, model_name: str, response_json: str):
+    """Stores a model response in the cache, replacing any previous entry for the key."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (cache_key, model_name, response_json, size_bytes) VALUES (?, ?, ?, ?)",
+            (cache_key, model_name, response_json, len(response_json.encode("utf-8")))
+        )
+
+def evict_llm_cache(max_bytes: int = LLM_CACHE_MAX_BYTES, max_age_days: int = LLM_CACHE_MAX_AGE_DAYS) -> int:
+    """
+    Deletes cache entries older than `max_age_days`, then the least recently used
+    entries until the cache fits in `max_bytes`. Returns the number of entries removed.
+    """
+    with transaction() as conn:
+        removed = conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < datetime('now', ?)", (f"-{max_age_days} days",)
+        ).rowcount
+        # Keep the most recently used entries whose running total fits in the budget.
+        removed += conn.execute("""
+        DELETE FROM llm_cache WHERE cache_key IN (
+            SELECT cache_key FROM (
+                SELECT cache_key,
+                       SUM(size_bytes) OVER (ORDER BY last_used_at DESC, cache_key) AS running_bytes
+                FROM llm_cache
+            ) WHERE running_bytes > ?
+        );
+        """, (max_bytes,)).rowcount
+        return removed
+
+if __name__ == '__main__':
+    # Allows running this script directly to initialize the database.
+    create_schema()
@@ -0,0 +1,80 @@
+"""
+Progress events streamed from the worker while a review runs.
+
+Pipeline code calls emit(); whoever is driving the review decides where the
+events go by installing a sink with event_sink(). The one-shot CLI writes them
+to stdout as newline-delimited JSON, the --serve daemon wraps them in JSON-RPC
+notifications. With no sink installed, emit() does nothing.
+
+Event types:
+    stage_started / stage_finished  {"stage": "fingerprint" | "extraction" | "review" | "annotation"}
+    pages_extracted                 {"pages_done": int, "page_count": int}
+    chunk_scanned                   {"chunk": int, "score": float, "flagged": bool, "cache_hit": bool}
+                                    (dual-pass reviews only)
+    chunk_reviewed                  {"chunk": int, "findings": int, "cache_hit": bool}
+    chunk_failed                    {"chunk": int, "pages": [int], "error": str}
+                                    (sent before the chunk's chunk_reviewed)
+    finding                         {"finding": {...}}
+    done                            {"result": {...}}
+
+batch.py adds batch_file_started / batch_file_finished and a final batch_done
+event, and tags every event of a report with its "file" path.
+"""
+
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
+
+# The active sink is a context variable so concurrent reviews (and the threads
+# they start via pipeline.prefetch) each report to their own consumer.
+_sink = contextvars.ContextVar("event_sink", default=None)
+
+def emit(event: str, **data):
+    """Sends an event to the active sink, if any."""
+    sink = _sink.get()
+    if sink is not None:
+        sink({"event": event, **data})
+
+@contextmanager
+def event_sink(callback):
+    """Routes events emitted in this context to `callback(event_dict)`."""
+    token = _sink.set(callback)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+@contextmanager
+def tagged(**fields):
+    """Adds `fields` to every event emitted in this context, e.g. the report a batch is working on."""
+    sink = _sink.get()
+    if sink is None:
+        yield
+        return
+    with event_sink(lambda event: sink({**event, **fields})):
+        yield
+
+@contextmanager
+def stage(name: str):
+    """Emits stage_started and stage_finished around a block."""
+    emit("stage_started", stage=name)
+    yield
+    emit("stage_finished", stage=name)
+
+def staged(name: str, iterable):
+    """Wraps a pipeline stage generator so it emits stage_started/stage_finished as it runs."""
+    emit("stage_started", stage=name)
+    yield from iterable
+    emit("stage_finished", stage=name)
+
+def ndjson_writer(stream):
+    """Returns a thread-safe sink writing one JSON event per line to `stream`."""
+    lock = threading.Lock()
+
+    def write(event: dict):
+        line = json.dumps(event)
+        with lock:
+            stream.write(line + "\n")
+            stream.flush()
+    return write
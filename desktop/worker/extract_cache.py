@@ -0,0 +1,202 @@
+"""
+On-disk cache of extracted PDF pages.
+
+Extraction with pdfplumber is the expensive part of a review, and it does not
+depend on the model or the tolerance profile. Each report gets one cache file
+named after its content hash and the extractor version, holding the extracted
+items of every page that has been parsed so far.
+
+File layout (all integers little-endian):
+    header   magic "TCXC", format version (u16), Python major, minor (u8, u8)
+    records  one zlib-compressed marshal blob per page, back to back
+    index    (page index u32, offset u64, length u32) per record
+    footer   index offset (u64), record count (u32), magic "TCXC"
+
+The footer and index are read first, so single pages can be loaded without
+reading the rest of the file. marshal is used rather than pickle because it is
+faster and cannot run code on load; its format is tied to the Python version,
+which is why that is recorded in the header. Least recently used files are
+evicted once the cache grows past EXTRACT_CACHE_MAX_BYTES.
+"""
+
+import marshal
+import os
+import struct
+import sys
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+def default_cache_dir() -> Path:
+    """The per-user cache directory of the platform: %LOCALAPPDATA%, ~/Library/Caches or $XDG_CACHE_HOME."""
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "tab-report-crusher" / "extract_cache"
+
+EXTRACT_CACHE_DIR = Path(os.environ.get("TAB_CRUSHER_EXTRACT_CACHE_DIR") or default_cache_dir())
+EXTRACT_CACHE_MAX_BYTES = int(os.environ.get("TAB_CRUSHER_EXTRACT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+MAGIC = b"TCXC"
+FORMAT_VERSION = 1
+# Level 6 is within a few percent of the best ratio at a fraction of the cost of level 9.
+COMPRESSION_LEVEL = 6
+
+_HEADER = struct.Struct("<4sHBB")
+_INDEX_ENTRY = struct.Struct("<IQI")
+_FOOTER = struct.Struct("<QI4s")
+
+# Temporary files older than this were left behind by a worker that died mid-write.
+STALE_TEMP_SECONDS = 24 * 60 * 60
+
+def encode(items: list) -> bytes:
+    """Returns the stored record for a page's extracted items."""
+    return zlib.compress(marshal.dumps(items), COMPRESSION_LEVEL)
+
+def decode(record: bytes) -> list:
+    return marshal.loads(zlib.decompress(record))
+
+def cache_path(file_hash: str, extractor_version: int) -> Path:
+    return EXTRACT_CACHE_DIR / f"{file_hash}-v{extractor_version}.tcx"
+
+class CacheReader:
+    """Random access to the pages of one cache file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.offsets = self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_index(self) -> dict:
+        magic, format_version, major, minor = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != MAGIC or format_version != FORMAT_VERSION or (major, minor) != sys.version_info[:2]:
+            raise ValueError(f"Incompatible extraction cache file: {self.path}")
+        self._file.seek(-_FOOTER.size, os.SEEK_END)
+        index_offset, count, magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Truncated extraction cache file: {self.path}")
+        self._file.seek(index_offset)
+        index = self._file.read(count * _INDEX_ENTRY.size)
+        return {page: (offset, length) for page, offset, length in _INDEX_ENTRY.iter_unpack(index)}
+
+    def __contains__(self, page: int) -> bool:
+        return page in self.offsets
+
+    def read_raw(self, page: int) -> bytes:
+        """Returns the compressed record of a page, as stored."""
+        offset, length = self.offsets[page]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def load(self, page: int) -> list:
+        """Returns the extracted items of a 0-based page index."""
+        return decode(self.read_raw(page))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CacheWriter:
+    """Writes a new cache file page by page; it only replaces the old one on commit()."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        self._file = open(self._temp_path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, *sys.version_info[:2]))
+        self._index = []
+
+    def add_raw(self, page: int, record: bytes):
+        """Adds a record copied from a CacheReader, without recompressing it."""
+        self._index.append((page, self._file.tell(), len(record)))
+        self._file.write(record)
+
+    def add_page(self, page: int, items: list):
+        self.add_raw(page, encode(items))
+
+    def commit(self):
+        index_offset = self._file.tell()
+        for entry in self._index:
+            self._file.write(_INDEX_ENTRY.pack(*entry))
+        self._file.write(_FOOTER.pack(index_offset, len(self._index), MAGIC))
+        self._file.close()
+        try:
+            os.replace(self._temp_path, self.path)
+        except OSError as e:
+            # On Windows a file another review still has open cannot be replaced; keep that one.
+            print(f"Could not update extraction cache {self.path.name}: {e}", file=sys.stderr)
+            self.abort()
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+def open_reader(file_hash: str, extractor_version: int):
+    """Returns a CacheReader for a report, or None if it has no usable cache file."""
+    path = cache_path(file_hash, extractor_version)
+    try:
+        reader = CacheReader(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Discarding unreadable extraction cache {path.name}: {e}", file=sys.stderr)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    # The modification time doubles as the last-used time for eviction.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return reader
+
+def evict(max_bytes: int = EXTRACT_CACHE_MAX_BYTES) -> int:
+    """Deletes the least recently used cache files until the cache fits in `max_bytes`. Returns files removed."""
+    try:
+        scan = list(os.scandir(EXTRACT_CACHE_DIR))
+    except FileNotFoundError:
+        return 0
+    entries = []
+    for entry in scan:
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if entry.name.endswith(".tcx"):
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        elif entry.name.endswith(".tmp") and time.time() - stat.st_mtime > STALE_TEMP_SECONDS:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,179 @@
+"""
+Where things are on the pages of a PDF report, for placing annotations.
+
+Extraction keeps the bounding box of every word on a page (in the page's text
+item) and of every table and table cell (in its Table). index_items() gathers
+them into a ReportIndex as the items stream past, keeping only what placing a
+finding needs, in a few flat arrays per page: the boxes and row numbers of
+each table with its column headers, and the page's words as one normalized
+string with the offset and box of each word. Cell values and the Table
+objects themselves are not kept, so the index stays small next to the report
+however long the review runs. A finding that names a table and row, or quotes
+text from the page, then resolves to rectangles with a dict lookup and a
+binary search instead of a text search of the page.
+
+Boxes are (x0, top, x1, bottom) in PDF points from the top-left corner of
+the page, as pdfplumber reports them and PyMuPDF draws them.
+"""
+import re
+
+import numpy as np
+
+# Words whose tops are this close (in points) are on the same line.
+LINE_TOLERANCE = 2.0
+
+def pack_words(words: list) -> tuple:
+    """Packs pdfplumber words into (texts, float32 box bytes), which the extraction cache can store as is."""
+    boxes = np.array([(w["x0"], w["top"], w["x1"], w["bottom"]) for w in words], dtype=np.float32)
+    return tuple(w["text"] for w in words), boxes.tobytes()
+
+def _normalize(text) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().casefold()
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _box(values) -> tuple:
+    return tuple(round(float(v), 1) for v in values)
+
+def _line_boxes(boxes: np.ndarray) -> list:
+    """Merges consecutive word boxes on the same line, so a quote spanning lines gives one box per line."""
+    lines = []
+    start = 0
+    for i in range(1, len(boxes) + 1):
+        if i == len(boxes) or abs(boxes[i, 1] - boxes[start, 1]) > LINE_TOLERANCE:
+            line = boxes[start:i]
+            lines.append(_box((line[:, 0].min(), line[:, 1].min(), line[:, 2].max(), line[:, 3].max())))
+            start = i
+    return lines
+
+class TableBoxes:
+    """The boxes of a table and its body cells, its row numbers and which column each header names."""
+
+    __slots__ = ("bbox", "row_numbers", "cell_bboxes", "columns")
+
+    def __init__(self, table):
+        self.bbox = table.bbox
+        self.row_numbers = table.row_numbers
+        self.cell_bboxes = table.cell_bboxes
+        # Normalized header -> column index; the first column wins.
+        self.columns = {}
+        for c in range(table.width):
+            self.columns.setdefault(_normalize(table.header_text(c)), c)
+
+class PageIndex:
+    """The tables and words of one page."""
+
+    __slots__ = ("tables", "text", "word_starts", "word_boxes")
+
+    def __init__(self):
+        self.tables = {}
+        # The page's normalized words joined by single spaces, and where each word starts in it.
+        self.text = ""
+        self.word_starts = np.zeros(0, dtype=np.int32)
+        self.word_boxes = np.zeros((0, 4), dtype=np.float32)
+
+    def add_table(self, number: int, table):
+        self.tables[number] = TableBoxes(table)
+
+    def add_words(self, texts: tuple, boxes: bytes):
+        words = [_normalize(text) for text in texts]
+        self.text = " ".join(words)
+        lengths = np.fromiter((len(word) + 1 for word in words), dtype=np.int32, count=len(words))
+        self.word_starts = np.concatenate(([0], np.cumsum(lengths[:-1]))).astype(np.int32) if words \
+            else np.zeros(0, dtype=np.int32)
+        self.word_boxes = np.frombuffer(boxes, dtype=np.float32).reshape(-1, 4)
+
+    def table_boxes(self, number: int, row: int = None, column=None) -> list:
+        """
+        The box of a table cell, of a whole table row (the union of its cells)
+        or of the table. `row` is a value of the table's row_numbers and
+        `column` a column header. Returns [] for an unknown table.
+        """
+        table = self.tables.get(number)
+        if table is None:
+            return []
+        whole_table = [_box(table.bbox)] if table.bbox else []
+        if row is None or table.cell_bboxes is None:
+            return whole_table
+        # row_numbers ascend, so the body row is found by binary search.
+        i = int(np.searchsorted(table.row_numbers, row))
+        if i >= len(table.row_numbers) or table.row_numbers[i] != row:
+            return whole_table
+        cells = table.cell_bboxes[i]
+        c = table.columns.get(_normalize(column)) if column else None
+        if c is not None and not np.isnan(cells[c]).any():
+            return [_box(cells[c])]
+        cells = cells[~np.isnan(cells).any(axis=1)]
+        if not len(cells):
+            return whole_table
+        return [_box((cells[:, 0].min(), cells[:, 1].min(), cells[:, 2].max(), cells[:, 3].max()))]
+
+    def quote_boxes(self, quote: str) -> list:
+        """Boxes of every occurrence of the words of `quote`, one per line of each occurrence."""
+        wanted = _normalize(quote)
+        if not wanted:
+            return []
+        boxes = []
+        start = self.text.find(wanted)
+        while start != -1:
+            end = start + len(wanted)
+            # Whole words only: the match has to start and end at word boundaries.
+            if (start == 0 or self.text[start - 1] == " ") and (end == len(self.text) or self.text[end] == " "):
+                first = int(np.searchsorted(self.word_starts, start))
+                last = int(np.searchsorted(self.word_starts, end))
+                boxes.extend(_line_boxes(self.word_boxes[first:last]))
+            start = self.text.find(wanted, start + 1)
+        return boxes
+
+class ReportIndex:
+    """PageIndex per 1-based page number."""
+
+    def __init__(self):
+        self.pages = {}
+
+    def page(self, number: int) -> PageIndex:
+        index = self.pages.get(number)
+        if index is None:
+            index = self.pages[number] = PageIndex()
+        return index
+
+    def locate(self, finding: dict) -> list:
+        """
+        Resolves a finding to boxes on its page: the cell or row it names, else
+        the text it quotes, else the table it names. Returns [] if none of them
+        can be found.
+        """
+        page = self.pages.get(_as_int(finding.get("page")))
+        if page is None:
+            return []
+        table = _as_int(finding.get("table"))
+        row = _as_int(finding.get("row"))
+        if table is not None and row is not None:
+            boxes = page.table_boxes(table, row, finding.get("column"))
+            if boxes:
+                return boxes
+        if finding.get("quote"):
+            boxes = page.quote_boxes(finding["quote"])
+            if boxes:
+                return boxes
+        return page.table_boxes(table) if table is not None else []
+
+def index_items(items, index: ReportIndex):
+    """
+    Adds the boxes of the tables and words of PDF items to `index` as they
+    stream past. The word boxes are only needed here, so they are dropped from
+    the items.
+    """
+    for item in items:
+        page = item.get("page")
+        if page is not None and not item.get("sheet"):
+            if item.get("type") == "table" and item.get("table") is not None:
+                index.page(page).add_table(item["table"], item["content"])
+            elif "words" in item:
+                index.page(page).add_words(*item["words"])
+                item = {key: value for key, value in item.items() if key != "words"}
+        yield item
@@ -0,0 +1,83 @@
+"""
+Streaming helpers for the extract -> chunk -> review pipeline.
+
+Stages are plain generators. These helpers let a stage run ahead of its
+consumer without holding the whole report in memory.
+"""
+
+import contextvars
+import queue
+import threading
+from collections import deque
+
+# Sentinel placed on a prefetch queue once the producer is exhausted.
+_END = object()
+
+def ordered_map(executor, fn, iterable, max_pending: int):
+    """
+    Like executor.map, but lazy: at most `max_pending` calls are in flight at once.
+
+    Results are yielded in input order. Each element of `iterable` is a tuple
+    of positional arguments for `fn`.
+    """
+    pending = deque()
+    try:
+        for args in iterable:
+            pending.append(executor.submit(fn, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Consumer stopped early (or a call failed): drop work that has not started.
+        for future in pending:
+            future.cancel()
+
+def prefetch(iterable, depth: int):
+    """
+    Runs `iterable` in a background thread, buffering at most `depth` items ahead.
+
+    The bounded queue is what caps memory: the producer blocks once the
+    consumer falls `depth` items behind. Exceptions raised by the producer are
+    re-raised in the consumer. The producer runs in a copy of the caller's
+    context, so context variables (such as the event sink) carry over.
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((_END, None))
+        except BaseException as e:
+            put((_END, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    context = contextvars.copy_context()
+    producer = threading.Thread(target=context.run, args=(produce,), name="pipeline-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,284 @@
+"""
+Per-stage performance metrics for a review run.
+
+review_file() opens a collector with collect(); pipeline code reports into it
+with the timed() context manager/decorator, timed_iter() for generator stages
+and record_llm_call() for model calls. With no collector active (for example
+when a helper is called on its own) every call here is a no-op.
+
+Each stage records how often it ran, its wall time, its self time (wall time
+minus nested timed stages on the same thread), the CPU time of the thread it
+ran on and the process memory high-water mark when it finished. The metrics
+of a run are stored in the run_metrics table next to its runs row.
+"""
+
+import contextvars
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_collector = contextvars.ContextVar("metrics_collector", default=None)
+
+def peak_rss_mb():
+    """Returns the peak resident memory of this process in MB, or None if it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return _peak_working_set_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _peak_working_set_mb():
+    """Windows equivalent of peak_rss_mb, via GetProcessMemoryInfo."""
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    except (AttributeError, OSError):
+        return None
+
+class MetricsCollector:
+    """Thread-safe accumulator for the metrics of one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Per-thread stack of child-time accumulators, used to compute self time.
+        self._local = threading.local()
+        self.stages = {}
+        self.counters = {}
+        self.llm_calls = []
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+        self.wall_ms = None
+        self.cpu_ms = None
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _stage(self, name: str) -> dict:
+        if name not in self.stages:
+            self.stages[name] = {
+                "calls": 0, "wall_ms": 0.0, "self_ms": 0.0, "cpu_ms": 0.0, "peak_rss_mb": None, "rss_growth_mb": 0.0,
+            }
+        return self.stages[name]
+
+    def add_stage(self, name: str, wall: float, self_time: float, cpu: float, rss_before, rss_after):
+        with self._lock:
+            stage = self._stage(name)
+            stage["calls"] += 1
+            stage["wall_ms"] += wall * 1000
+            stage["self_ms"] += self_time * 1000
+            stage["cpu_ms"] += cpu * 1000
+            if rss_after is not None:
+                stage["peak_rss_mb"] = max(stage["peak_rss_mb"] or 0.0, rss_after)
+                stage["rss_growth_mb"] += rss_after - rss_before
+
+    def add_worker_cpu(self, name: str, seconds: float):
+        """Adds CPU time a stage spent in pool worker processes, which thread CPU time does not see."""
+        with self._lock:
+            stage = self._stage(name)
+            stage["worker_cpu_ms"] = stage.get("worker_cpu_ms", 0.0) + seconds * 1000
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_llm_call(self, call: dict):
+        with self._lock:
+            self.llm_calls.append(call)
+
+    def finish(self):
+        self.wall_ms = (time.perf_counter() - self.started) * 1000
+        self.cpu_ms = (time.process_time() - self.started_cpu) * 1000
+
+    def to_dict(self) -> dict:
+        """Returns the metrics as a JSON-serializable dict."""
+        with self._lock:
+            stages = {
+                name: {key: round(value, 1) if isinstance(value, float) else value for key, value in stage.items()}
+                for name, stage in self.stages.items()
+            }
+            calls = list(self.llm_calls)
+            counters = dict(self.counters)
+
+        by_model = {}
+        for call in calls:
+            model = by_model.setdefault(call["model"], {
+                "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            })
+            model["calls"] += 1
+            model["prompt_tokens"] += call["prompt_tokens"] or 0
+            model["cached_tokens"] += call.get("cached_tokens") or 0
+            model["completion_tokens"] += call["completion_tokens"] or 0
+            model["cost_usd"] += call["cost_usd"] or 0.0
+        for model in by_model.values():
+            model["cost_usd"] = round(model["cost_usd"], 6)
+
+        return {
+            "wall_ms": round(self.wall_ms, 1) if self.wall_ms is not None else None,
+            "cpu_ms": round(self.cpu_ms, 1) if self.cpu_ms is not None else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+            "counters": counters,
+            "llm": {
+                "calls": len(calls),
+                "prompt_tokens": sum(m["prompt_tokens"] for m in by_model.values()),
+                "cached_tokens": sum(m["cached_tokens"] for m in by_model.values()),
+                "completion_tokens": sum(m["completion_tokens"] for m in by_model.values()),
+                "cost_usd": round(sum(m["cost_usd"] for m in by_model.values()), 6),
+                "by_model": by_model,
+            },
+            "llm_calls": calls,
+        }
+
+def current():
+    """Returns the active collector, or None."""
+    return _collector.get()
+
+@contextmanager
+def collect():
+    """Collects metrics for everything run in this context (and threads started from a copy of it)."""
+    collector = MetricsCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        collector.finish()
+        _collector.reset(token)
+
+@contextmanager
+def timed(name: str):
+    """Times a block, or a function when used as a decorator, as stage `name`."""
+    collector = _collector.get()
+    if collector is None:
+        yield
+        return
+    stack = collector._stack()
+    children = [0.0]
+    stack.append(children)
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    started_cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - started
+        cpu = time.thread_time() - started_cpu
+        stack.pop()
+        if stack:
+            stack[-1][0] += wall
+        collector.add_stage(name, wall, wall - children[0], cpu, rss_before, peak_rss_mb())
+
+def timed_iter(name: str, iterable):
+    """Wraps a generator stage so the time spent producing each item is recorded as stage `name`."""
+    iterator = iter(iterable)
+    try:
+        while True:
+            with timed(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+def add_worker_cpu(name: str, seconds: float):
+    collector = _collector.get()
+    if collector is not None:
+        collector.add_worker_cpu(name, seconds)
+
+def count(name: str, n: int = 1):
+    collector = _collector.get()
+    if collector is not None:
+        collector.count(name, n)
+
+def record_llm_call(model: str, wall: float, prompt_tokens, completion_tokens, cost_usd, attempts: int,
+                    rate_limit_wait: float, cached_tokens: int = None):
+    """
+    Records one model call: timings, token usage as reported by the provider
+    (`cached_tokens` of the prompt tokens were served from its prompt cache)
+    and estimated cost.
+    """
+    collector = _collector.get()
+    if collector is None:
+        return
+    collector.add_llm_call({
+        "model": model,
+        "wall_ms": round(wall * 1000, 1),
+        "rate_limit_wait_ms": round(rate_limit_wait * 1000, 1),
+        "attempts": attempts,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "cost_usd": round(cost_usd, 6) if cost_usd is not None else None,
+    })
+
+def export_json(metrics: dict, path: str):
+    """Writes run metrics to a JSON file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+
+@contextmanager
+def cprofile(path: str):
+    """
+    Runs the block under cProfile and writes the combined stats to `path`.
+
+    The review runs on several threads. From Python 3.12 a single profiler sees
+    all of them; before that each thread started inside the block gets its own
+    profiler and the stats are merged. Extraction pool processes are not profiled.
+    """
+    profilers = [cProfile.Profile()]
+    lock = threading.Lock()
+
+    def start_thread_profiler(frame, event, arg):
+        profiler = cProfile.Profile()
+        with lock:
+            profilers.append(profiler)
+        profiler.enable()
+
+    per_thread = sys.version_info < (3, 12)
+    if per_thread:
+        threading.setprofile(start_thread_profiler)
+    profilers[0].enable()
+    try:
+        yield
+    finally:
+        profilers[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+        with lock:
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                try:
+                    stats.add(profiler)
+                except TypeError:
+                    # A thread that never ran any Python code has no stats.
+                    continue
+        stats.dump_stats(path)
+        print(f"Wrote cProfile stats to {path}", file=sys.stderr)
@@ -1,101 +1,533 @@
-"""
-Main Python worker for TAB Report Crusher.
-
-This script will be bundled into a PyInstaller executable and called by the Tauri shell.
-It handles file parsing, AI review, and PDF annotation.
-"""
-
-import sys
-import json
-import openpyxl
-import fitz  # PyMuPDF
-import pdfplumber
-import re
-from pathlib import Path
-
-from database import create_schema
-from ai_gateway import chunk_data, run_ai_review
-from annotator import add_annotations_to_pdf
-
-# TODO: Import AI libraries and other dependencies
-
-def extract_data_from_pdf(file_path: str) -> list:
-    """Extracts tables and text from a PDF file."""
-    data = []
-    with pdfplumber.open(file_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            # Extract tables
-            tables = page.extract_tables()
-            for table in tables:
-                data.append({"type": "table", "page": i + 1, "content": table})
-            
-            # Extract text, preserving some structure
-            text = page.extract_text()
-            data.append({"type": "text", "page": i + 1, "content": text})
-            
-    print(f"Extracted {len(data)} data chunks from PDF.", file=sys.stderr)
-    return data
-
-def extract_data_from_excel(file_path: str) -> list:
-    """Extracts data from all sheets in an Excel file."""
-    data = []
-    workbook = openpyxl.load_workbook(file_path, data_only=True)
-    for sheet_name in workbook.sheetnames:
-        sheet = workbook[sheet_name]
-        sheet_data = []
-        for row in sheet.iter_rows():
-            sheet_data.append([cell.value for cell in row])
-        data.append({"type": "sheet", "name": sheet_name, "content": sheet_data})
-    
-    print(f"Extracted {len(data)} sheets from Excel file.", file=sys.stderr)
-    return data
-
-def main():
-    """
-    Main function to process the report.
-    Takes a file path as a command-line argument.
-    """
-    # Initialize the local database schema
-    create_schema()
-    
-    # Get arguments from command line
-    if len(sys.argv) > 3:
-        file_path = sys.argv[1]
-        api_key = sys.argv[2]
-        selected_model = sys.argv[3]
-    else:
-        print("Error: Missing arguments (file_path, api_key, model_name).", file=sys.stderr)
-        sys.exit(1)
-    
-    print(f"Processing file: {file_path}", file=sys.stderr)
-    
-    file_extension = Path(file_path).suffix.lower()
-    
-    extracted_data = []
-    if file_extension == '.pdf':
-        extracted_data = extract_data_from_pdf(file_path)
-    elif file_extension in ['.xlsx', '.xls']:
-        extracted_data = extract_data_from_excel(file_path)
-    else:
-        print(f"Unsupported file type: {file_extension}", file=sys.stderr)
-        return
-
-    # Chunk the data and run the AI review
-    data_chunks = chunk_data(extracted_data, selected_model)
-    # TODO: Load profile from DB instead of using placeholder
-    active_profile = {"name": "Manager Default"}
-    findings = run_ai_review(api_key, selected_model, data_chunks, active_profile)
-
-    # TODO: Implement rule engine logic
-    
-    # Annotate the PDF with the findings
-    if file_extension == '.pdf':
-        output_path = Path(file_path).with_name(f"{Path(file_path).stem}_review.pdf")
-        add_annotations_to_pdf(file_path, findings, str(output_path))
-    
-    # TODO: Return results as JSON to stdout
-    result = {"status": "success", "findings": findings}
-    print(json.dumps(result))
-
-if __name__ == "__main__":
+"""
+Main Python worker for TAB Report Crusher.
+
+This script will be bundled into a PyInstaller executable and called by the Tauri shell.
+It handles file parsing, AI review, and PDF annotation.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import json
+import multiprocessing
+import uuid
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from pathlib import Path
+
+# Heavy parsing libraries (PyMuPDF, pdfplumber, openpyxl) and the annotator are
+# imported inside the functions that use them. This keeps worker start-up cheap
+# and only loads what a given report needs.
+import extract_cache
+import profiling
+from database import create_schema, find_closest_run, get_active_profile, get_run, get_run_metrics, record_run
+from ai_gateway import SCAN_MODEL, chunking_model, iter_chunks, run_ai_review
+from events import emit, event_sink, ndjson_writer, stage, staged
+from layout import ReportIndex, index_items, pack_words
+from pipeline import ordered_map, prefetch
+from rule_engine import screen_items
+from tables import Table, pack_items, unpack_items
+
+# TODO: Import AI libraries and other dependencies
+
+# Chunks buffered between the extract/chunk stages and the AI review.
+# This, not the report size, bounds how much extracted data is held in memory.
+PIPELINE_QUEUE_DEPTH = int(os.environ.get("TAB_CRUSHER_QUEUE_DEPTH", "4"))
+# Set to 1 to screen every chunk with the scan model first (see ai_gateway.run_ai_review).
+DUAL_PASS_DEFAULT = os.environ.get("TAB_CRUSHER_DUAL_PASS", "0") == "1"
+
+# --- PDF Extraction ---
+
+# Number of processes used for page-level PDF extraction. 0 means one per CPU core.
+EXTRACT_WORKERS = int(os.environ.get("TAB_CRUSHER_EXTRACT_WORKERS", "0"))
+# Below this many pages the process pool start-up cost outweighs the gain.
+MIN_PAGES_FOR_POOL = 16
+# Pages handed to a pool worker per task. Small enough that pages stream out steadily.
+PAGES_PER_TASK = 4
+# Bump whenever _extract_pages changes what it returns, so older cached extractions are not reused.
+EXTRACTOR_VERSION = 3
+# Extracted pages are cached on disk by file hash (see extract_cache.py). Set to 0 to disable.
+EXTRACT_CACHE_ENABLED = os.environ.get("TAB_CRUSHER_EXTRACT_CACHE", "1") != "0"
+
+def _within_any(obj: dict, bboxes: list) -> bool:
+    """True if the centre of a pdfplumber object lies inside any of the (x0, top, x1, bottom) boxes."""
+    if "x0" not in obj or "top" not in obj:
+        return False
+    x = (obj["x0"] + obj["x1"]) / 2
+    y = (obj["top"] + obj["bottom"]) / 2
+    return any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in bboxes)
+
+def _extract_page(pdf, i: int) -> list:
+    """Extracts tables and text from the 0-based page `i` of an open pdfplumber document."""
+    data = []
+    page = pdf.pages[i]
+    # Extract tables, keeping each cell's position for the annotator.
+    # Tables are numbered from 1 on each page, so findings can name them.
+    tables = page.find_tables()
+    for number, table in enumerate(tables, start=1):
+        cell_bboxes = [row.cells for row in table.rows]
+        content = Table.from_rows(table.extract(), page=i + 1, bbox=table.bbox, cell_bboxes=cell_bboxes)
+        data.append({"type": "table", "page": i + 1, "table": number, "content": content})
+
+    # Extract text, preserving some structure. Table cells are already
+    # captured above, so only the text outside the tables is kept.
+    bboxes = [table.bbox for table in tables]
+    text_page = page.filter(lambda obj: not _within_any(obj, bboxes)) if bboxes else page
+    text = text_page.extract_text()
+    # Every word of the page with its box, for placing annotations (see layout.py).
+    words = pack_words(page.extract_words())
+    data.append({"type": "text", "page": i + 1, "content": text, "words": words})
+    # Release pdfplumber's per-page object cache as we go.
+    page.flush_cache()
+    return data
+
+def _extract_pages(file_path: str, page_indexes: list) -> list:
+    """Extracts tables and text from the given 0-based pages of a PDF file.
+
+    Runs inside a pool worker, so it opens its own handle to the file.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        return [item for i in page_indexes for item in _extract_page(pdf, i)]
+
+def _extract_pages_measured(file_path: str, page_indexes: list) -> tuple:
+    """_extract_pages for pool workers: also returns the CPU seconds the worker spent."""
+    started_cpu = time.process_time()
+    data = _extract_pages(file_path, page_indexes)
+    return data, time.process_time() - started_cpu
+
+def _page_batches(page_indexes: list, batch_size: int):
+    """Yields lists of at most `batch_size` page indexes, in order."""
+    for start in range(0, len(page_indexes), batch_size):
+        yield page_indexes[start:start + batch_size]
+
+def _iter_extracted_pages(file_path: str, pages: list, workers: int, executor: ProcessPoolExecutor):
+    """Parses the given 0-based pages and yields (page index, items) for each, in order."""
+    if not pages:
+        return
+    if workers <= 1 or len(pages) < MIN_PAGES_FOR_POOL:
+        import pdfplumber
+
+        # In process, one open document serves every page.
+        with pdfplumber.open(file_path) as pdf:
+            for i in pages:
+                yield i, _extract_page(pdf, i)
+        return
+
+    batches = list(_page_batches(pages, PAGES_PER_TASK))
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=min(workers, len(pages))))
+        calls = ((file_path, batch) for batch in batches)
+        measured = ordered_map(executor, _extract_pages_measured, calls, max_pending=workers * 2)
+        results = _record_worker_cpu("extraction", measured)
+
+        for batch, data in zip(batches, results):
+            by_page = {i: [] for i in batch}
+            for item in data:
+                by_page[item["page"] - 1].append(item)
+            yield from by_page.items()
+
+def iter_pdf_data(file_path: str, workers: int = None, pages: list = None, executor: ProcessPoolExecutor = None,
+                  file_hash: str = None, use_cache: bool = None):
+    """
+    Yields extracted tables and text from a PDF file, in page order, as pages are parsed.
+
+    Only the 0-based page indexes in `pages` are extracted when it is given.
+    Small batches of pages are handed to a process pool of `workers` processes
+    (defaults to EXTRACT_WORKERS, then the CPU count). Only a bounded number of
+    batches is in flight at once, so memory does not grow with the report size.
+    A long-lived `executor` can be passed in to reuse its warm worker processes.
+
+    With `use_cache` (default: EXTRACT_CACHE_ENABLED), pages already extracted
+    from a file with the same content hash are read from the extraction cache
+    instead of being parsed again, and newly parsed pages are added to it once
+    the whole report has been read.
+    """
+    if pages is None:
+        import fitz  # PyMuPDF
+
+        with fitz.open(file_path) as doc:
+            pages = list(range(doc.page_count))
+    else:
+        pages = sorted(pages)
+    workers = workers or getattr(executor, "_max_workers", None) or EXTRACT_WORKERS or os.cpu_count() or 1
+
+    if use_cache is None:
+        use_cache = EXTRACT_CACHE_ENABLED
+    reader = writer = None
+    if use_cache:
+        file_hash = file_hash or hash_file(file_path)
+        reader = extract_cache.open_reader(file_hash, EXTRACTOR_VERSION)
+    missing = [i for i in pages if reader is None or i not in reader]
+    if use_cache and missing:
+        writer = extract_cache.CacheWriter(extract_cache.cache_path(file_hash, EXTRACTOR_VERSION))
+    if use_cache:
+        print(f"Extraction cache: {len(pages) - len(missing)} of {len(pages)} pages cached.", file=sys.stderr)
+
+    fresh = _iter_extracted_pages(file_path, missing, workers, executor)
+    completed = False
+    try:
+        for pages_done, i in enumerate(pages, start=1):
+            if reader is not None and i in reader:
+                record = reader.read_raw(i)
+                items = unpack_items(extract_cache.decode(record))
+                if writer is not None:
+                    writer.add_raw(i, record)
+            else:
+                page, items = next(fresh)
+                if writer is not None:
+                    writer.add_page(page, pack_items(items))
+            emit("pages_extracted", pages_done=pages_done, page_count=len(pages))
+            yield from items
+        completed = True
+    finally:
+        fresh.close()
+        if writer is not None and completed and reader is not None:
+            # Keep cached pages this review did not ask for (e.g. during an incremental re-review).
+            for i in sorted(set(reader.offsets) - set(pages)):
+                writer.add_raw(i, reader.read_raw(i))
+        if reader is not None:
+            reader.close()
+        if writer is not None:
+            if completed:
+                writer.commit()
+                extract_cache.evict()
+            else:
+                writer.abort()
+
+def _record_worker_cpu(stage_name: str, measured):
+    """Unwraps (data, cpu seconds) results from pool workers, adding the CPU time to the run metrics."""
+    for data, cpu_seconds in measured:
+        profiling.add_worker_cpu(stage_name, cpu_seconds)
+        yield data
+
+def extract_data_from_pdf(file_path: str, workers: int = None) -> list:
+    """Extracts tables and text from a PDF file. See iter_pdf_data."""
+    data = list(iter_pdf_data(file_path, workers))
+    print(f"Extracted {len(data)} data chunks from PDF.", file=sys.stderr)
+    return data
+
+# --- Excel Extraction ---
+
+def _trim_row(row: tuple) -> list:
+    """Drops trailing empty cells from a row of values."""
+    end = len(row)
+    while end and (row[end - 1] is None or row[end - 1] == ""):
+        end -= 1
+    return list(row[:end])
+
+def _block_item(sheet_name: str, rows: list, first_row: int) -> dict:
+    """Turns a block of adjacent non-empty sheet rows into a table item, or a text item if it has one column."""
+    from openpyxl.utils import get_column_letter
+
+    width = max(len(row) for row in rows)
+    ref = f"A{first_row}:{get_column_letter(width)}{first_row + len(rows) - 1}"
+    if width < 2:
+        text = "\n".join(str(row[0]) for row in rows)
+        return {"type": "text", "sheet": sheet_name, "ref": ref, "content": text}
+    content = Table.from_rows(rows, sheet=sheet_name, first_row=first_row)
+    return {"type": "table", "sheet": sheet_name, "ref": ref, "content": content}
+
+def iter_excel_data(file_path: str):
+    """
+    Yields the data of an Excel file one block of rows at a time.
+
+    The workbook is streamed in read-only, values-only mode, so cell objects are
+    never materialized. Each sheet is split into blocks at empty rows, and
+    trailing empty columns are trimmed. A block becomes a table item (see
+    tables.Table, whose row_numbers are sheet row numbers), or a text item if
+    it has a single column, such as a title. `ref` is the range the block
+    covers on its sheet, e.g. "A3:G15".
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            # Some writers record bogus dimensions; read what is actually there.
+            sheet.reset_dimensions()
+            block, first_row = [], None
+            for row_number, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+                values = _trim_row(values)
+                if values:
+                    if not block:
+                        first_row = row_number
+                    block.append(values)
+                elif block:
+                    yield _block_item(sheet.title, block, first_row)
+                    block = []
+            if block:
+                yield _block_item(sheet.title, block, first_row)
+    finally:
+        # Read-only workbooks keep the file open until closed.
+        workbook.close()
+
+def extract_data_from_excel(file_path: str) -> list:
+    """Extracts data from all sheets in an Excel file. See iter_excel_data."""
+    data = list(iter_excel_data(file_path))
+    print(f"Extracted {len(data)} blocks from Excel file.", file=sys.stderr)
+    return data
+
+# --- Incremental Re-Review ---
+
+def hash_file(file_path: str) -> str:
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint_pdf_pages(file_path: str) -> list:
+    """
+    Returns a content hash for each page of a PDF, in page order.
+
+    Hashes are taken over the page text via PyMuPDF, which is far cheaper than
+    a pdfplumber extraction, so unchanged pages can be skipped before parsing.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(file_path) as doc:
+        return [hashlib.sha256(page.get_text().encode("utf-8")).hexdigest() for page in doc]
+
+def match_pages(base_hashes: list, page_hashes: list) -> dict:
+    """
+    Matches the pages of an earlier run to unchanged pages of the new report.
+
+    Returns {old page: new page}, both numbered from 1. A page that keeps its
+    position and content keeps its number. The rest are paired in order with
+    the new pages carrying the same fingerprint, one to one, so a repeated
+    page is matched once per copy; copies left without a partner stay
+    unmatched. Pages recorded without a fingerprint are never matched.
+    """
+    matches = {}
+    for i, page_hash in enumerate(page_hashes[:len(base_hashes)]):
+        if page_hash is not None and base_hashes[i] == page_hash:
+            matches[i + 1] = i + 1
+
+    # Remaining new pages by fingerprint, in page order.
+    free_pages = {}
+    for i, page_hash in enumerate(page_hashes):
+        if i + 1 not in matches:
+            free_pages.setdefault(page_hash, []).append(i + 1)
+    for i, page_hash in enumerate(base_hashes):
+        if page_hash is None or i + 1 in matches:
+            continue
+        candidates = free_pages.get(page_hash)
+        if candidates:
+            matches[i + 1] = candidates.pop(0)
+    return matches
+
+def plan_incremental_review(project: str, profile: dict, page_hashes: list, model_name: str = None,
+                            scan_model: str = None):
+    """
+    Compares page fingerprints against the closest earlier run of the same project
+    reviewed with the same models.
+
+    Returns (base_run_id, changed page indexes, carried-forward findings). Findings
+    from the earlier run are kept for every page matched by match_pages and
+    renumbered to that page's position in the new report; unmatched pages are
+    reviewed again.
+    """
+    base_run_id = find_closest_run(project, profile, page_hashes, model_name, scan_model)
+    if base_run_id is None:
+        return None, list(range(len(page_hashes))), []
+
+    base_result, base_hashes = get_run(base_run_id)
+    new_page_by_old_page = match_pages(base_hashes, page_hashes)
+    matched = set(new_page_by_old_page.values())
+    changed = [i for i in range(len(page_hashes)) if i + 1 not in matched]
+    carried = []
+    for finding in base_result.get("findings", []):
+        new_page = new_page_by_old_page.get(finding.get("page"))
+        if new_page is not None:
+            carried.append({**finding, "page": new_page})
+    return base_run_id, changed, carried
+
+def iter_report_data(file_path: str, pages: list = None, executor: ProcessPoolExecutor = None,
+                     file_hash: str = None):
+    """Yields extracted data items for a PDF or Excel report."""
+    file_extension = Path(file_path).suffix.lower()
+    if file_extension == '.pdf':
+        return iter_pdf_data(file_path, pages=pages, executor=executor, file_hash=file_hash)
+    if file_extension in ['.xlsx', '.xls']:
+        return iter_excel_data(file_path)
+    raise ValueError(f"Unsupported file type: {file_extension}")
+
+def review_file(file_path: str, api_key: str, selected_model: str, project: str = None,
+                incremental: bool = True, annotation_mode: str = "fast",
+                executor: ProcessPoolExecutor = None, scan_model: str = None,
+                ai_executor: ThreadPoolExecutor = None) -> dict:
+    """
+    Reviews a single report and returns the result payload.
+
+    Extraction and chunking run in a background thread and feed a bounded queue,
+    so each chunk is sent to the model as soon as it fills while later pages
+    are still being parsed.
+
+    For PDFs, when `incremental` is set and an earlier run of the same `project`
+    (default: the report's folder name) shares pages with this one, only the
+    changed pages are extracted and reviewed; findings for the rest are carried
+    forward from that run.
+
+    `annotation_mode` is passed to add_annotations_to_pdf ("fast" or "compact").
+    `executor` is an optional long-lived process pool for PDF extraction.
+    With a `scan_model`, the review is dual-pass and only the chunks that model
+    flags are reviewed by `selected_model`. `ai_executor` is an optional thread
+    pool for model calls shared with other reviews running at the same time.
+
+    Chunks the model could not review are listed under "llm_errors"; their
+    pages are reviewed again by the next incremental review of the project.
+
+    Per-stage timings, memory and model token usage are returned under
+    "metrics" and stored with the run (see profiling.py).
+    """
+    print(f"Processing file: {file_path}", file=sys.stderr)
+    is_pdf = Path(file_path).suffix.lower() == '.pdf'
+    project = project or Path(file_path).resolve().parent.name
+    active_profile = get_active_profile()
+
+    base_run_id, pages, carried_findings = None, None, []
+    # Where the tables and words of the extracted pages are, for the annotator.
+    layout_index = ReportIndex()
+    with profiling.collect() as collector:
+        with stage("fingerprint"), profiling.timed("fingerprint"):
+            file_hash = hash_file(file_path)
+            page_hashes = fingerprint_pdf_pages(file_path) if is_pdf else []
+            if incremental and page_hashes:
+                base_run_id, pages, carried_findings = plan_incremental_review(
+                    project, active_profile, page_hashes, selected_model, scan_model
+                )
+                if base_run_id:
+                    print(f"Re-reviewing {len(pages)} of {len(page_hashes)} pages changed since run {base_run_id}.",
+                          file=sys.stderr)
+        for finding in carried_findings:
+            emit("finding", finding=finding)
+
+        # Filled by the rule engine from the extraction thread as tables are screened.
+        rule_findings = []
+        ai_findings = []
+        llm_errors = []
+        if pages is None or pages:
+            # Stages nest: the time of each wrapped generator includes the stages it pulls from,
+            # and the self time recorded for it excludes them.
+            report_items = iter_report_data(file_path, pages=pages, executor=executor, file_hash=file_hash)
+            items = profiling.timed_iter("extraction", report_items)
+            items = staged("extraction", items)
+            if is_pdf:
+                items = index_items(items, layout_index)
+            items = profiling.timed_iter("rule_engine", screen_items(items, active_profile, rule_findings))
+            chunks = profiling.timed_iter("chunking", iter_chunks(items, chunking_model(selected_model, scan_model)))
+            chunks = prefetch(chunks, depth=PIPELINE_QUEUE_DEPTH)
+            with stage("review"), profiling.timed("review"):
+                ai_findings = run_ai_review(api_key, selected_model, chunks, active_profile, scan_model=scan_model,
+                                            executor=ai_executor, errors=llm_errors)
+
+        # TODO: Apply the user-defined YAML rules as well
+        findings = sorted(carried_findings + rule_findings + ai_findings, key=lambda f: f.get("page") or 0)
+
+        # Annotate the PDF with the findings
+        if is_pdf:
+            from annotator import add_annotations_to_pdf
+
+            output_path = Path(file_path).with_name(f"{Path(file_path).stem}_review.pdf")
+            with stage("annotation"):
+                add_annotations_to_pdf(file_path, findings, str(output_path), mode=annotation_mode,
+                                       index=layout_index)
+
+    result = {"status": "success", "findings": findings}
+    if base_run_id:
+        result["incremental"] = {
+            "base_run_id": base_run_id,
+            "changed_pages": [i + 1 for i in pages],
+            "carried_findings": len(carried_findings),
+        }
+    if llm_errors:
+        result["llm_errors"] = llm_errors
+        print(f"{len(llm_errors)} chunks could not be reviewed.", file=sys.stderr)
+    # Pages of failed chunks are recorded without their fingerprint, so the next review of the project redoes them.
+    failed_pages = {page for error in llm_errors for page in error["pages"]}
+    recorded_hashes = [None if i + 1 in failed_pages else page_hash for i, page_hash in enumerate(page_hashes)]
+    metrics = collector.to_dict()
+    run_id = str(uuid.uuid4())
+    record_run(run_id, active_profile, project, file_hash, result, recorded_hashes, metrics,
+               model_name=selected_model, scan_model=scan_model)
+    result["run_id"] = run_id
+    result["metrics"] = metrics
+    return result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Review a TAB report with AI assistance.")
+    parser.add_argument("file_path", nargs="?", help="PDF or Excel report to review")
+    parser.add_argument("api_key", nargs="?", help="API key for the selected model provider")
+    parser.add_argument("model_name", nargs="?", help="Model to review with, e.g. gpt-4o")
+    parser.add_argument("--project", help="Project the report belongs to (default: its folder name)")
+    parser.add_argument("--full", action="store_true",
+                        help="Review every page even if an earlier run of the project matches")
+    parser.add_argument("--compact", action="store_true",
+                        help="Rewrite and compress the annotated PDF instead of appending an incremental update")
+    parser.add_argument("--dual-pass", action="store_true", default=DUAL_PASS_DEFAULT,
+                        help="Scan every chunk with a cheap model and review only the flagged ones")
+    parser.add_argument("--scan-model", default=SCAN_MODEL,
+                        help=f"Model for the dual-pass scan (default: {SCAN_MODEL})")
+    parser.add_argument("--metrics", metavar="PATH", help="Write the run's performance metrics to a JSON file")
+    parser.add_argument("--profile", metavar="PATH", help="Write a cProfile dump of the review to PATH")
+    parser.add_argument("--export-metrics", metavar="RUN_ID",
+                        help="Print the stored performance metrics of an earlier run as JSON and exit")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived worker taking JSON-RPC requests on stdin (see rpc_server.py)")
+    args = parser.parse_args(argv)
+    if not (args.serve or args.export_metrics) and not (args.file_path and args.api_key and args.model_name):
+        parser.error("Missing arguments (file_path, api_key, model_name).")
+    return args
+
+def main():
+    """
+    Main function to process the report.
+    Takes a file path, API key and model name as command-line arguments,
+    or --serve to handle reviews over stdin/stdout.
+    Progress events and the final result are written to stdout (see events.py).
+    """
+    args = parse_args()
+
+    # Initialize the local database schema
+    create_schema()
+
+    if args.serve:
+        from rpc_server import serve
+        serve()
+        return
+
+    if args.export_metrics:
+        metrics = get_run_metrics(args.export_metrics)
+        if metrics is None:
+            print(f"No metrics recorded for run {args.export_metrics}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(metrics, indent=2))
+        return
+    
+    file_extension = Path(args.file_path).suffix.lower()
+    if file_extension not in ['.pdf', '.xlsx', '.xls']:
+        print(f"Unsupported file type: {file_extension}", file=sys.stderr)
+        return
+
+    # Progress goes to stdout as newline-delimited JSON events; the last one is "done" with the result.
+    with event_sink(ndjson_writer(sys.stdout)):
+        with profiling.cprofile(args.profile) if args.profile else nullcontext():
+            result = review_file(args.file_path, args.api_key, args.model_name,
+                                 project=args.project, incremental=not args.full,
+                                 annotation_mode="compact" if args.compact else "fast",
+                                 scan_model=args.scan_model if args.dual_pass else None)
+        if args.metrics:
+            profiling.export_json(result["metrics"], args.metrics)
+        emit("done", result=result)
+
+if __name__ == "__main__":
+    # Required for the extraction process pool in the PyInstaller-frozen executable.
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Long-lived worker mode for the Tauri shell (`review.py --serve`).
+
+Requests and responses are JSON-RPC 2.0 messages framed one per line on
+stdin/stdout. While a request runs, its progress events (see events.py) are
+sent as `event` notifications carrying the request id, ahead of the response.
+The process stays up between reviews, so imports, tokenizers, AI clients,
+the extraction process pool and the database schema are paid for once instead
+of on every review. Anything else written to stdout is redirected to stderr so
+it cannot corrupt the protocol stream.
+
+Methods:
+    ping                      -> "pong"
+    warmup {model_name?, api_key?}
+                              -> preloads parsing libraries, the tokenizer and the AI client
+    review {file_path, api_key, model_name, project?, full?, compact?, dual_pass?, scan_model?}
+                              -> the same result payload `review.py` prints in one-shot mode
+    review_batch {paths, api_key, model_name, files?, restart?, full?, compact?, dual_pass?, scan_model?}
+                              -> reviews a folder or list of reports (see batch.py) and returns the
+                                 throughput report; events carry the report's "file"
+    sync {api_url?, token?}   -> uploads the offline queue to the cloud API (see sync.py)
+    shutdown                  -> stops the loop after replying
+"""
+
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from events import emit, event_sink
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+class WorkerServer:
+    """Dispatches JSON-RPC requests to the review pipeline and keeps its state warm."""
+
+    def __init__(self, output):
+        self._output = output
+        self._output_lock = threading.Lock()
+        self._executor = None
+        self.running = True
+        self.methods = {
+            "ping": self.ping,
+            "warmup": self.warmup,
+            "review": self.review,
+            "review_batch": self.review_batch,
+            "sync": self.sync,
+            "shutdown": self.shutdown,
+        }
+
+    def executor(self) -> ProcessPoolExecutor:
+        """The extraction process pool, started on first use and reused across reviews."""
+        if self._executor is None:
+            from review import EXTRACT_WORKERS
+
+            self._executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS or os.cpu_count() or 1)
+        return self._executor
+
+    def send(self, message: dict):
+        line = json.dumps(message)
+        # Events arrive from pipeline threads; keep each frame on its own line.
+        with self._output_lock:
+            self._output.write(line + "\n")
+            self._output.flush()
+
+    def notify_event(self, request_id, event: dict):
+        self.send({"jsonrpc": "2.0", "method": "event", "params": {"request_id": request_id, **event}})
+
+    # --- Methods ---
+
+    def ping(self):
+        return "pong"
+
+    def warmup(self, model_name: str = None, api_key: str = None):
+        started = time.perf_counter()
+        import fitz  # noqa: F401 -- PyMuPDF
+        import openpyxl  # noqa: F401
+        import pdfplumber  # noqa: F401
+        import annotator  # noqa: F401
+        from ai_gateway import get_ai_client, get_tokenizer
+
+        if model_name:
+            get_tokenizer(model_name)
+        if api_key:
+            get_ai_client(api_key)
+        return {"elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    def review(self, file_path: str, api_key: str, model_name: str, project: str = None,
+               full: bool = False, compact: bool = False, dual_pass: bool = None, scan_model: str = None):
+        from review import DUAL_PASS_DEFAULT, review_file
+        from ai_gateway import SCAN_MODEL
+
+        if dual_pass is None:
+            dual_pass = DUAL_PASS_DEFAULT
+        return review_file(file_path, api_key, model_name, project=project, incremental=not full,
+                           annotation_mode="compact" if compact else "fast", executor=self.executor(),
+                           scan_model=(scan_model or SCAN_MODEL) if dual_pass else None)
+
+    def review_batch(self, paths: list, api_key: str, model_name: str, files: int = None, restart: bool = False,
+                     full: bool = False, compact: bool = False, dual_pass: bool = None, scan_model: str = None):
+        from batch import BATCH_FILES, run_batch
+        from review import DUAL_PASS_DEFAULT
+        from ai_gateway import SCAN_MODEL
+
+        if dual_pass is None:
+            dual_pass = DUAL_PASS_DEFAULT
+        return run_batch(paths, api_key, model_name, files_at_once=files or BATCH_FILES, restart=restart,
+                         incremental=not full, annotation_mode="compact" if compact else "fast",
+                         scan_model=(scan_model or SCAN_MODEL) if dual_pass else None, executor=self.executor())
+
+    def sync(self, api_url: str = None, token: str = None):
+        import sync
+
+        return sync.flush(api_url or sync.API_URL, token or sync.API_TOKEN)
+
+    def shutdown(self):
+        self.running = False
+        return None
+
+    # --- Dispatch ---
+
+    def handle(self, line: str):
+        """Handles one framed request and returns the response, or None for notifications."""
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            return _error(None, PARSE_ERROR, f"Parse error: {e}")
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error(request.get("id") if isinstance(request, dict) else None, INVALID_REQUEST,
+                          "Invalid request")
+
+        request_id = request.get("id")
+        method = self.methods.get(request["method"])
+        if method is None:
+            return _error(request_id, METHOD_NOT_FOUND, f"Method not found: {request['method']}")
+        params = request.get("params") or {}
+        if not isinstance(params, dict):
+            return _error(request_id, INVALID_PARAMS, "Params must be an object")
+
+        try:
+            inspect.signature(method).bind(**params)
+        except TypeError as e:
+            return _error(request_id, INVALID_PARAMS, str(e))
+        try:
+            with event_sink(lambda event: self.notify_event(request_id, event)):
+                result = method(**params)
+                if request["method"] == "review":
+                    emit("done", result=result)
+        except Exception as e:
+            print(f"Error handling {request['method']}: {e}", file=sys.stderr)
+            return _error(request_id, INTERNAL_ERROR, str(e))
+        if "id" not in request:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+def _error(request_id, code: int, message: str) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+def serve(stdin=None, stdout=None):
+    """Runs the request loop until `shutdown` is received or stdin closes."""
+    stdin = stdin or sys.stdin
+    protocol_out = stdout or sys.stdout
+    # Stray prints from libraries or placeholder model calls must not reach the protocol stream.
+    sys.stdout = sys.stderr
+
+    server = WorkerServer(protocol_out)
+    print("Worker ready for JSON-RPC requests on stdin.", file=sys.stderr)
+    try:
+        for line in stdin:
+            if not line.strip():
+                continue
+            response = server.handle(line)
+            if response is not None:
+                server.send(response)
+            if not server.running:
+                break
+    finally:
+        server.close()
+        sys.stdout = protocol_out
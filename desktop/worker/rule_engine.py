@@ -0,0 +1,195 @@
+"""
+Deterministic rule engine for TAB reports.
+
+Checks design-vs-actual readings against the numeric tolerances of the active
+profile before anything is sent to a model. Readings that are clearly in or
+out of tolerance are settled here; only rows that cannot be parsed or
+classified are left for the AI review.
+"""
+
+import re
+import sys
+
+import numpy as np
+
+from events import emit
+from tables import Table
+
+# Header cells that identify the design and measured columns of a table.
+DESIGN_HEADER = re.compile(r"\b(design|required|specified|spec)\b", re.IGNORECASE)
+ACTUAL_HEADER = re.compile(r"\b(actual|measured|final|field|test)\b", re.IGNORECASE)
+# Columns about the reading rather than the reading itself, e.g. "Test Date" or "Field Notes".
+NOT_A_READING_HEADER = re.compile(r"\b(date|time|by|notes?|remarks?|comments?|no|number|id)\b|#", re.IGNORECASE)
+
+def _category_pattern(words: list, tags: list):
+    """
+    Matches any of `words` as whole words in any case, or any of `tags` in
+    upper case. Tags such as SA or EA are only tags when they stand alone or
+    are followed by a number (SA-1, EA2), so "area", "Rated" or "each" match
+    nothing.
+    """
+    word_pattern = r"\b(?:" + "|".join(words) + r")\b"
+    tag_pattern = r"(?<![^\W\d_])(?:" + "|".join(tags) + r")(?![^\W\d_])"
+    return re.compile(f"(?i:{word_pattern})|{tag_pattern}")
+
+# Words and terminal tags that map a row or column to a profile tolerance key.
+CATEGORY_PATTERNS = [
+    ("Coil_dT", _category_pattern([r"coil", r"delta[\s-]?t", r"Δt"], ["DT", "ΔT"])),
+    ("OA", _category_pattern([r"outside air", r"outdoor air"], ["OA"])),
+    ("Exhaust", _category_pattern([r"exhaust"], ["EA", "EF"])),
+    ("Return", _category_pattern([r"return"], ["RA"])),
+    ("Supply", _category_pattern([r"supply"], ["SA"])),
+]
+
+NUMBER = re.compile(r"[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+")
+LETTERS = re.compile(r"[^\W\d_]")
+
+def parse_number(value) -> float:
+    """Returns the first number in a cell value, or NaN if there is none."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if value is None:
+        return np.nan
+    match = NUMBER.search(str(value))
+    return float(match.group().replace(",", "")) if match else np.nan
+
+def classify(text: str):
+    """Returns the tolerance key a label refers to, or None."""
+    if not text:
+        return None
+    for key, pattern in CATEGORY_PATTERNS:
+        if pattern.search(text):
+            return key
+    return None
+
+def find_columns(table: Table):
+    """Returns (design column, actual column) from the table's header, or None if it has no such columns."""
+    design_col = actual_col = None
+    for c in range(table.width):
+        text = table.header_text(c)
+        if NOT_A_READING_HEADER.search(text):
+            continue
+        if design_col is None and DESIGN_HEADER.search(text):
+            design_col = c
+        elif actual_col is None and ACTUAL_HEADER.search(text):
+            actual_col = c
+    if design_col is None or actual_col is None:
+        return None
+    return design_col, actual_col
+
+def _numbers(column) -> np.ndarray:
+    """A column's values as floats; numeric columns are already parsed, text columns are parsed here."""
+    if column.numeric:
+        return column.values
+    return np.fromiter((parse_number(value) for value in column.values), dtype=float, count=len(column.values))
+
+def _row_labels(table: Table, skip: tuple) -> list:
+    """Joins the text cells of each body row that contain words, which name the terminal or reading."""
+    text_columns = [column.values for c, column in enumerate(table.columns) if c not in skip and not column.numeric]
+    return [" ".join(cell for cell in cells if LETTERS.search(cell)) for cells in zip(*text_columns)] \
+        if text_columns else [""] * len(table)
+
+def check_table(table: Table, tolerances: dict):
+    """
+    Checks every design/actual row of a table against the profile in one vectorized pass.
+
+    Returns (violations, ambiguous body row indexes, rows checked) where each
+    violation is a dict describing an out-of-tolerance body row, or None if
+    the table has no recognizable design and actual columns.
+    """
+    columns = find_columns(table)
+    if columns is None:
+        return None
+    design_col, actual_col = columns
+    # A column header such as "Design Supply CFM" classifies every row of the table.
+    table_category = classify(" ".join(table.header_text(c) for c in range(table.width)))
+
+    labels = _row_labels(table, (design_col, actual_col))
+    design = _numbers(table.columns[design_col])
+    actual = _numbers(table.columns[actual_col])
+
+    limits = np.full(len(table), np.nan)
+    is_percent = np.zeros(len(table), dtype=bool)
+    categories = []
+    for i, label in enumerate(labels):
+        category = classify(label) or table_category
+        categories.append(category)
+        tolerance = tolerances.get(category) if category else None
+        if tolerance:
+            limits[i] = float(tolerance["value"])
+            is_percent[i] = tolerance.get("type") == "percent"
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        difference = actual - design
+        deviation = np.where(is_percent, np.abs(difference) / np.abs(design) * 100, np.abs(difference))
+    checked = np.isfinite(deviation) & np.isfinite(limits)
+    out_of_tolerance = checked & (deviation > limits)
+    # Blank separator rows are neither checked nor worth sending to the model.
+    blank = np.ones(len(table), dtype=bool)
+    for column in table.columns:
+        blank &= np.isnan(column.values) if column.numeric else (column.values == "")
+    ambiguous = ~checked & ~blank
+
+    violations = []
+    for i in np.flatnonzero(out_of_tolerance):
+        unit = "%" if is_percent[i] else f" {tolerances[categories[i]].get('unit', '')}".rstrip()
+        violations.append({
+            "row": int(i),
+            "column": actual_col,
+            "category": categories[i],
+            "label": labels[i],
+            "design": float(design[i]),
+            "actual": float(actual[i]),
+            "deviation": float(deviation[i]),
+            "limit": f"±{limits[i]:g}{unit}",
+        })
+    return violations, np.flatnonzero(ambiguous), int(checked.sum())
+
+def _issue_text(violation: dict) -> str:
+    deviation = violation["deviation"]
+    off = f"{deviation:.1f}%" if violation["limit"].endswith("%") else f"{deviation:g}"
+    label = f" at {violation['label']}" if violation["label"] else ""
+    return (f"{violation['category']} reading{label} out of tolerance: design {violation['design']:g}, "
+            f"actual {violation['actual']:g} ({off} off, limit {violation['limit']}).")
+
+def screen_items(items, profile: dict, findings: list):
+    """
+    Pre-screens extracted items against the profile's numeric tolerances.
+
+    Out-of-tolerance readings are appended to `findings` and emitted as
+    finding events. Tables are passed on with only their header and the rows
+    the engine could not decide, and are dropped entirely once every row is
+    settled. Other items pass through unchanged.
+    """
+    tolerances = profile.get("tolerances") or {}
+    settled = 0
+    for item in items:
+        table = item.get("content")
+        if not isinstance(table, Table) or not tolerances or not len(table):
+            yield item
+            continue
+
+        result = check_table(table, tolerances)
+        if result is None:
+            yield item
+            continue
+
+        violations, ambiguous_rows, checked = result
+        for violation in violations:
+            finding = {"page": item.get("page"), "issue": _issue_text(violation), "source": "rule_engine"}
+            if item.get("sheet"):
+                finding["sheet"] = item["sheet"]
+                finding["row"] = int(table.row_numbers[violation["row"]])
+            elif item.get("table") is not None:
+                # Names the cell with the actual reading, for the annotator (see layout.py).
+                finding["table"] = item["table"]
+                finding["row"] = int(table.row_numbers[violation["row"]])
+                finding["column"] = table.header_text(violation["column"]) or None
+            findings.append(finding)
+            emit("finding", finding=finding)
+        settled += checked
+
+        if len(ambiguous_rows):
+            yield {**item, "content": table.take(ambiguous_rows)}
+
+    print(f"Rule engine settled {settled} rows; {len(findings)} out of tolerance.", file=sys.stderr)
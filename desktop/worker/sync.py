@@ -0,0 +1,132 @@
+"""
+Uploads the offline queue (pending_updates) to the cloud API.
+
+Queued payloads are profile and rule writes:
+    {"entity": "profile" | "rule", "id": ..., "op": "upsert" | "delete", "data": {...}}
+where `data` is the full record for an upsert. Before upload the queue is
+collapsed to the last write per entity, so a profile edited fifty times while
+offline is sent once. The result goes to POST /sync/batch as gzip-compressed
+JSON, up to SYNC_BATCH_OPS entities per request: after a day offline that is
+normally a single request, which the server applies in one transaction.
+
+Each batch is saved to sync_state before it is sent and removed together with
+its queue rows once the server confirms it. A flush interrupted at any point
+resends the saved batch first; the server recognizes its batch_id and does not
+apply it twice.
+
+Usage:
+    python sync.py --api-url http://localhost:8000 --token <JWT>
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import uuid
+
+import database
+
+API_URL = os.environ.get("TAB_CRUSHER_API_URL", "http://localhost:8000")
+API_TOKEN = os.environ.get("TAB_CRUSHER_API_TOKEN")
+# Entities per request. Generous, so a long offline stretch still syncs in one request.
+SYNC_BATCH_OPS = int(os.environ.get("TAB_CRUSHER_SYNC_BATCH_OPS", "5000"))
+SYNC_TIMEOUT_SECONDS = 60
+
+# sync_state key of the batch that was sent (or was about to be) but not yet confirmed.
+INFLIGHT_BATCH_KEY = "inflight_batch"
+
+class SyncError(Exception):
+    pass
+
+def collapse(rows: list) -> list:
+    """
+    Merges queued (id, payload) rows into one op per entity; the last write wins.
+    Returns (payload, row ids) pairs in the order each entity was first queued.
+    """
+    ops = {}
+    for row_id, payload in rows:
+        key = (payload.get("entity"), payload.get("id"))
+        if key in ops:
+            ops[key][0] = payload
+            ops[key][1].append(row_id)
+        else:
+            ops[key] = [payload, [row_id]]
+    return [tuple(op) for op in ops.values()]
+
+def _send(client, batch: dict) -> dict:
+    body = gzip.compress(json.dumps({"batch_id": batch["batch_id"], "ops": batch["ops"]}).encode("utf-8"))
+    try:
+        response = client.post(
+            "/sync/batch", content=body,
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+    except Exception as e:
+        raise SyncError(f"Sync request failed: {e}") from e
+    if response.status_code != 200:
+        raise SyncError(f"Sync request failed with HTTP {response.status_code}: {response.text[:200]}")
+    return response.json()
+
+def _report(result: dict, stats: dict):
+    stats["requests"] += 1
+    stats["applied"] += result.get("applied", 0)
+    stats["stale"] += len(result.get("stale", []))
+    stats["version"] = result.get("version", stats["version"])
+    for rejected in result.get("rejected", []):
+        # An op the server cannot apply will not get better on retry; it is dropped.
+        stats["rejected"] += 1
+        print(f"Sync rejected {rejected['entity']} {rejected['id']}: {rejected['reason']}", file=sys.stderr)
+
+def flush(api_url: str = API_URL, token: str = API_TOKEN, batch_ops: int = SYNC_BATCH_OPS, client=None) -> dict:
+    """
+    Uploads everything queued. Stops at the first failed request and leaves the
+    rest queued for the next flush. Returns counts and, on failure, the error.
+    """
+    stats = {"requests": 0, "rows": 0, "applied": 0, "stale": 0, "rejected": 0, "version": None, "error": None}
+    own_client = client is None
+    if own_client:
+        import httpx
+
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        client = httpx.Client(base_url=api_url, headers=headers, timeout=SYNC_TIMEOUT_SECONDS)
+    try:
+        # A batch left over from an interrupted flush goes first, unchanged.
+        batch = database.get_sync_state(INFLIGHT_BATCH_KEY)
+        while True:
+            if batch is None:
+                ops = collapse(database.get_pending_updates())[:batch_ops]
+                if not ops:
+                    break
+                batch = {
+                    "batch_id": uuid.uuid4().hex,
+                    "ops": [payload for payload, _ in ops],
+                    "row_ids": [row_id for _, row_ids in ops for row_id in row_ids],
+                }
+                database.set_sync_state(INFLIGHT_BATCH_KEY, batch)
+            _report(_send(client, batch), stats)
+            database.complete_sync_batch(INFLIGHT_BATCH_KEY, batch["row_ids"])
+            stats["rows"] += len(batch["row_ids"])
+            batch = None
+    except SyncError as e:
+        print(str(e), file=sys.stderr)
+        stats["error"] = str(e)
+    finally:
+        if own_client:
+            client.close()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--api-url", default=API_URL)
+    parser.add_argument("--token", default=API_TOKEN, help="Manager access token from the API's /token endpoint")
+    parser.add_argument("--batch-ops", type=int, default=SYNC_BATCH_OPS, help="Entities per request")
+    args = parser.parse_args()
+
+    database.create_schema()
+    stats = flush(args.api_url, args.token, args.batch_ops)
+    print(json.dumps(stats, indent=2))
+    if stats["error"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Columnar representation of the tables extracted from a report.
+
+A Table keeps its header rows as text and its body column by column. Columns
+whose cells are all plain numbers (optionally with a % sign) are parsed once
+into float64 arrays, with NaN for blank cells; every other column is an object
+array of strings. Each table carries where it came from: the page and
+bounding boxes of a PDF table, or the sheet and row numbers of a workbook
+range. Tables serialize straight to compact CSV or JSON for prompts, and to
+plain tuples of bytes and strings for the extraction cache.
+"""
+
+import json
+import re
+
+import numpy as np
+
+# A cell that is nothing but a number, e.g. "1,727", "-0.5", "98%".
+NUMERIC_CELL = re.compile(r"\s*([-+]?(?:\d[\d,]*(?:\.\d*)?|\.\d+))\s*(%?)\s*")
+# Leading rows searched for the start of the numeric body; rows above it are the header.
+MAX_HEADER_ROWS = 5
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return format_number(value)
+    return str(value).strip()
+
+def format_number(value: float) -> str:
+    """Formats a float without exponent noise: 1727.0 -> "1727", 0.5 -> "0.5"."""
+    if value != value:  # NaN
+        return ""
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+def _csv_field(text: str) -> str:
+    if any(c in text for c in ',"\n\r'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+def _parse_numeric(cells: list):
+    """Returns (float array, suffix) if every non-blank cell is a plain number with the same suffix, else None."""
+    values = np.full(len(cells), np.nan)
+    suffix = None
+    for i, cell in enumerate(cells):
+        if cell is None or cell == "":
+            continue
+        if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+            cell_suffix, value = "", float(cell)
+        else:
+            match = NUMERIC_CELL.fullmatch(str(cell))
+            if match is None or match.group(1) in ("+", "-"):
+                return None
+            cell_suffix, value = match.group(2), float(match.group(1).replace(",", ""))
+        if suffix is None:
+            suffix = cell_suffix
+        elif suffix != cell_suffix:
+            return None
+        values[i] = value
+    if suffix is None:
+        # An all-blank column is kept as text.
+        return None
+    return values, suffix
+
+def _is_numeric_cell(cell) -> bool:
+    if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+        return True
+    return cell is not None and NUMERIC_CELL.fullmatch(str(cell)) is not None
+
+def detect_header_rows(rows: list) -> int:
+    """Number of leading rows before the first row with a numeric cell; 1 if there is no such row nearby."""
+    for r, row in enumerate(rows[:MAX_HEADER_ROWS + 1]):
+        if any(_is_numeric_cell(cell) for cell in row):
+            return r
+    return min(1, len(rows))
+
+class Column:
+    """One body column: a float64 array (numeric) or an object array of strings (text)."""
+
+    __slots__ = ("values", "suffix")
+
+    def __init__(self, values: np.ndarray, suffix: str = ""):
+        self.values = values
+        self.suffix = suffix
+
+    @property
+    def numeric(self) -> bool:
+        return self.values.dtype.kind == "f"
+
+    def text(self, i: int) -> str:
+        if self.numeric:
+            value = self.values[i]
+            return format_number(float(value)) + self.suffix if value == value else ""
+        return self.values[i]
+
+    def texts(self) -> list:
+        if self.numeric:
+            return [format_number(value) + self.suffix if value == value else "" for value in self.values.tolist()]
+        return self.values.tolist()
+
+    def take(self, indexes) -> "Column":
+        return Column(self.values[indexes], self.suffix)
+
+class Table:
+    """
+    A table with text header rows and typed, array-backed body columns.
+
+    `row_numbers[i]` is the source row of body row i: the sheet row number for
+    workbooks, the 0-based row of the detected table for PDFs. `bbox` is the
+    table's (x0, top, x1, bottom) on its PDF page and `cell_bboxes`, when
+    known, a float32 array of shape (body rows, columns, 4) with NaN for
+    merged or missing cells.
+    """
+
+    __slots__ = ("header", "columns", "row_numbers", "page", "sheet", "bbox", "cell_bboxes")
+
+    def __init__(self, header: list, columns: list, row_numbers: np.ndarray, page: int = None, sheet: str = None,
+                 bbox: tuple = None, cell_bboxes: np.ndarray = None):
+        self.header = header
+        self.columns = columns
+        self.row_numbers = row_numbers
+        self.page = page
+        self.sheet = sheet
+        self.bbox = bbox
+        self.cell_bboxes = cell_bboxes
+
+    @classmethod
+    def from_rows(cls, rows: list, header_rows: int = None, page: int = None, sheet: str = None,
+                  first_row: int = 0, bbox: tuple = None, cell_bboxes: list = None) -> "Table":
+        """
+        Builds a table from a list of row lists, as returned by pdfplumber or openpyxl.
+
+        `header_rows` defaults to detect_header_rows(). `first_row` is the source
+        row number of rows[0]. `cell_bboxes` is a per-row list of per-cell boxes
+        (or None) aligned with `rows`.
+        """
+        if header_rows is None:
+            header_rows = detect_header_rows(rows)
+        width = max((len(row) for row in rows), default=0)
+        padded = [list(row) + [None] * (width - len(row)) for row in rows]
+        header = [[_cell_text(cell) for cell in row] for row in padded[:header_rows]]
+        body = padded[header_rows:]
+
+        columns = []
+        for c in range(width):
+            cells = [row[c] for row in body]
+            parsed = _parse_numeric(cells)
+            if parsed is not None:
+                columns.append(Column(*parsed))
+            else:
+                columns.append(Column(np.array([_cell_text(cell) for cell in cells], dtype=object)))
+
+        boxes = None
+        if cell_bboxes is not None and body:
+            boxes = np.full((len(body), width, 4), np.nan, dtype=np.float32)
+            for r, row_boxes in enumerate(cell_bboxes[header_rows:]):
+                for c, box in enumerate(row_boxes[:width]):
+                    if box is not None:
+                        boxes[r, c] = box
+        row_numbers = np.arange(first_row + header_rows, first_row + len(rows), dtype=np.int32)
+        return cls(header, columns, row_numbers, page, sheet, tuple(bbox) if bbox else None, boxes)
+
+    def __len__(self) -> int:
+        return len(self.row_numbers)
+
+    @property
+    def width(self) -> int:
+        return len(self.columns)
+
+    def header_text(self, c: int) -> str:
+        """The header cells above column `c`, joined top to bottom."""
+        return " ".join(row[c] for row in self.header if c < len(row) and row[c])
+
+    def body_row(self, i: int) -> list:
+        return [column.text(i) for column in self.columns]
+
+    def body_rows(self) -> list:
+        return [list(row) for row in zip(*(column.texts() for column in self.columns))] if self.columns else []
+
+    def rows(self) -> list:
+        """Header and body as lists of strings, as the table appeared in the source."""
+        return [list(row) for row in self.header] + self.body_rows()
+
+    def take(self, indexes) -> "Table":
+        """A table with the same header and only the body rows at `indexes`."""
+        indexes = np.asarray(indexes, dtype=np.intp)
+        return Table(
+            self.header,
+            [column.take(indexes) for column in self.columns],
+            self.row_numbers[indexes],
+            self.page,
+            self.sheet,
+            self.bbox,
+            self.cell_bboxes[indexes] if self.cell_bboxes is not None else None,
+        )
+
+    def slice(self, start: int, stop: int) -> "Table":
+        return self.take(np.arange(start, min(stop, len(self))))
+
+    # --- Serialization ---
+    # The CSV is written for prompts, so it leaves out what carries no data:
+    # columns blank in every row, blank rows and the trailing empty cells of a row.
+
+    def _csv_columns(self) -> list:
+        """Indexes of the columns with any text in the header or body."""
+        return [
+            c for c, column in enumerate(self.columns)
+            if column.numeric or any(row[c] for row in self.header if c < len(row)) or (column.values != "").any()
+        ]
+
+    def csv_header(self, row_numbers: bool = False) -> str:
+        prefix = "row," if row_numbers else ""
+        columns = self._csv_columns()
+        lines = []
+        for row in self.header:
+            line = ",".join(_csv_field(row[c]) if c < len(row) else "" for c in columns).rstrip(",")
+            if line:
+                lines.append(prefix + line + "\n")
+        return "".join(lines)
+
+    def csv_lines(self, row_numbers: bool = False) -> list:
+        """
+        One CSV line per body row, optionally prefixed with its source row
+        number; blank rows give an empty string, so the list stays aligned with the rows.
+        """
+        texts = [[_csv_field(text) for text in self.columns[c].texts()] for c in self._csv_columns()]
+        if not texts:
+            return [""] * len(self)
+        lines = [",".join(cells).rstrip(",") for cells in zip(*texts)]
+        if row_numbers:
+            return [f"{number},{line}\n" if line else "" for number, line in zip(self.row_numbers.tolist(), lines)]
+        return [line + "\n" if line else "" for line in lines]
+
+    def to_csv(self, row_numbers: bool = False) -> str:
+        return self.csv_header(row_numbers) + "".join(self.csv_lines(row_numbers))
+
+    def to_json(self) -> str:
+        columns = [
+            [None if value != value else value for value in column.values.tolist()] if column.numeric
+            else column.values.tolist()
+            for column in self.columns
+        ]
+        return json.dumps({
+            "header": self.header,
+            "rows": [list(row) for row in zip(*columns)],
+            "row_numbers": self.row_numbers.tolist(),
+        })
+
+    def to_record(self) -> tuple:
+        """A tuple of plain strings, numbers and bytes (marshal-friendly) that from_record() restores."""
+        columns = tuple(
+            (True, column.values.tobytes(), column.suffix) if column.numeric
+            else (False, tuple(column.values.tolist()), "")
+            for column in self.columns
+        )
+        boxes = self.cell_bboxes.tobytes() if self.cell_bboxes is not None else None
+        return (tuple(tuple(row) for row in self.header), columns, self.row_numbers.tobytes(), self.page,
+                self.sheet, self.bbox, boxes)
+
+    @classmethod
+    def from_record(cls, record: tuple) -> "Table":
+        header, columns, row_numbers, page, sheet, bbox, boxes = record
+        row_numbers = np.frombuffer(row_numbers, dtype=np.int32).copy()
+        restored = []
+        for numeric, values, suffix in columns:
+            if numeric:
+                restored.append(Column(np.frombuffer(values, dtype=np.float64).copy(), suffix))
+            else:
+                restored.append(Column(np.array(values, dtype=object)))
+        if boxes is not None:
+            boxes = np.frombuffer(boxes, dtype=np.float32).reshape(len(row_numbers), len(restored), 4).copy()
+        return cls([list(row) for row in header], restored, row_numbers, page, sheet, bbox, boxes)
+
+    def __repr__(self) -> str:
+        where = f"page {self.page}" if self.page is not None else f"sheet {self.sheet!r}"
+        return f"<Table {where}: {len(self.header)} header rows, {len(self)} x {self.width}>"
+
+def pack_items(items: list) -> list:
+    """Replaces Table contents with their records so a list of items can be marshalled."""
+    return [{**item, "content": item["content"].to_record()} if isinstance(item.get("content"), Table) else item
+            for item in items]
+
+def unpack_items(items: list) -> list:
+    """Inverse of pack_items."""
+    return [{**item, "content": Table.from_record(item["content"])} if item.get("type") == "table" else item
+            for item in items]
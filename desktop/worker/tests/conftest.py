@@ -0,0 +1,108 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# The worker's modules import each other by name, as when run from its folder.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ai_gateway  # noqa: E402
+import database  # noqa: E402
+import extract_cache  # noqa: E402
+
+class ApproxTokenizer:
+    """About four characters per token, so the tests do not need tiktoken's downloaded encodings."""
+
+    def encode(self, text, **kwargs):
+        return range((len(text) + 3) // 4)
+
+    def encode_batch(self, texts, **kwargs):
+        return [self.encode(text) for text in texts]
+
+@pytest.fixture(autouse=True)
+def worker_env(tmp_path, monkeypatch):
+    """A fresh database and extraction cache per test, and the approximate tokenizer."""
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "tab_crusher.sqlite"))
+    monkeypatch.setattr(extract_cache, "EXTRACT_CACHE_DIR", tmp_path / "extract_cache")
+    monkeypatch.setattr(ai_gateway, "get_tokenizer", lambda model_name: ApproxTokenizer())
+    database.create_schema()
+
+class StubOpenAI(ThreadingHTTPServer):
+    """
+    A local OpenAI-compatible chat completions endpoint.
+
+    Each request takes the next of `errors` ((status, headers) pairs) while
+    there are any, otherwise it is answered by `respond(user message)`, which
+    returns (content, seconds to wait first). Request bodies are kept in
+    `requests` and the most requests ever handled at once in `max_in_flight`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.errors = []
+        self.respond = lambda message: ('{"findings": []}', 0)
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append(body)
+            error = server.errors.pop(0) if server.errors else None
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if error is not None:
+                status, headers = error
+                self._send(status, {"error": {"message": f"stub error {status}", "type": "stub"}}, headers)
+                return
+            content, delay = server.respond(body["messages"][-1]["content"])
+            if delay:
+                threading.Event().wait(delay)
+            self._send(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+@pytest.fixture
+def stub_openai(monkeypatch):
+    """A running StubOpenAI that new AI clients are pointed at through OPENAI_BASE_URL."""
+    server = StubOpenAI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    # Clients are cached per API key; start from none so the new base URL is used.
+    monkeypatch.setattr(ai_gateway, "_clients", {})
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,124 @@
+import json
+import re
+import time
+
+import pytest
+
+import ai_gateway
+from ai_gateway import RateLimiter, call_gpt, get_ai_client, iter_chunks, run_ai_review
+
+PROFILE = {"id": "default", "version": 1, "tolerances": {"airflow": {"type": "percent", "value": 10}}}
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The delays call_gpt backs off for, without actually waiting."""
+    delays = []
+    monkeypatch.setattr(ai_gateway.time, "sleep", delays.append)
+    return delays
+
+class XTokenizer:
+    """One token per "x", so an item's size is set by its content alone."""
+
+    def encode_batch(self, texts, **kwargs):
+        return [range(text.count("x")) for text in texts]
+
+@pytest.fixture
+def small_model(monkeypatch):
+    """A model whose chunks hold 100 tokens."""
+    monkeypatch.setitem(ai_gateway.MODEL_CONTEXT_WINDOWS, "small", 100)
+    monkeypatch.setattr(ai_gateway, "get_tokenizer", lambda model_name: XTokenizer())
+    return "small"
+
+def _item(page: int, tokens: int) -> dict:
+    return {"type": "note", "page": page, "content": "x" * tokens}
+
+def _chunks(count: int) -> list:
+    return [[{"type": "text", "page": i + 1, "content": f"chunk-{i}"}] for i in range(count)]
+
+def test_retry_after_header_sets_the_delay(stub_openai, sleeps):
+    stub_openai.errors = [(429, {"Retry-After": "2.5"})]
+
+    response = call_gpt(get_ai_client("test-key"), "gpt-4o", "hello")
+
+    assert json.loads(response) == {"findings": []}
+    assert len(stub_openai.requests) == 2
+    assert sleeps == [2.5]
+
+def test_server_errors_back_off_exponentially_then_give_up(stub_openai, sleeps, monkeypatch):
+    monkeypatch.setattr(ai_gateway, "MAX_RETRIES", 3)
+    stub_openai.errors = [(503, {})] * 4
+
+    assert call_gpt(get_ai_client("test-key"), "gpt-4o", "hello") is None
+    assert len(stub_openai.requests) == 4
+    # Exponential from RETRY_BASE_DELAY, with up to half of each delay taken off as jitter.
+    for attempt, delay in enumerate(sleeps):
+        base = ai_gateway.RETRY_BASE_DELAY * 2 ** attempt
+        assert base / 2 <= delay <= base
+
+def test_client_errors_are_not_retried(stub_openai, sleeps):
+    stub_openai.errors = [(400, {})]
+
+    assert call_gpt(get_ai_client("test-key"), "gpt-4o", "hello") is None
+    assert len(stub_openai.requests) == 1
+    assert sleeps == []
+
+def test_rate_limiter_bounds_requests_per_minute():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10 ** 9)
+    for _ in range(600):
+        assert limiter.acquire() == 0.0
+    started = time.monotonic()
+    waited = sum(limiter.acquire() for _ in range(3))
+    # The bucket is empty; it refills at 10 requests per second.
+    assert time.monotonic() - started >= 0.25
+    assert waited >= 0.25
+
+def test_rate_limiter_bounds_tokens_per_minute():
+    limiter = RateLimiter(requests_per_minute=10 ** 6, tokens_per_minute=6000)
+    assert limiter.acquire(6000) == 0.0
+    started = time.monotonic()
+    limiter.acquire(30)
+    # 30 tokens at 100 per second.
+    assert time.monotonic() - started >= 0.25
+
+def test_chunks_keep_a_page_together_where_it_fits(small_model):
+    items = [_item(1, 40), _item(2, 70), _item(2, 30)]
+
+    chunks = list(iter_chunks(items, small_model, chunk_size_ratio=1.0))
+
+    # First-fit would put the last page 2 item next to page 1.
+    assert [[item["page"] for item in chunk] for chunk in chunks] == [[2, 2], [1]]
+
+def test_full_chunks_are_sent_before_later_items_are_read(small_model):
+    pulled = []
+
+    def stream():
+        for n in range(6):
+            pulled.append(n)
+            yield _item(n + 1, 50)
+
+    chunks = iter_chunks(stream(), small_model, chunk_size_ratio=1.0)
+
+    assert [item["page"] for item in next(chunks)] == [1, 2]
+    assert pulled == [0, 1]
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+
+def test_review_keeps_chunk_order_and_concurrency_bound(stub_openai):
+    def respond(message):
+        number = int(re.search(r"chunk-(\d+)", message).group(1))
+        # Later chunks are answered first.
+        return json.dumps({"findings": [{"page": number + 1, "issue": f"issue {number}"}]}), 0.02 * (12 - number)
+    stub_openai.respond = respond
+
+    findings = run_ai_review("test-key", "gpt-4o", iter(_chunks(12)), PROFILE, concurrency=3, use_cache=False)
+
+    assert [finding["issue"] for finding in findings] == [f"issue {i}" for i in range(12)]
+    assert len(stub_openai.requests) == 12
+    assert stub_openai.max_in_flight <= 3
+
+def test_failed_chunks_are_reported_with_their_pages(stub_openai):
+    stub_openai.respond = lambda message: ("not json" if "chunk-1" in message else '{"findings": []}', 0)
+    errors = []
+
+    run_ai_review("test-key", "gpt-4o", _chunks(3), PROFILE, concurrency=2, use_cache=False, errors=errors)
+
+    assert errors == [{"chunk": 1, "pages": [2], "error": "could not decode the model's response"}]
@@ -0,0 +1,101 @@
+from pathlib import Path
+
+import pytest
+
+import batch
+from batch import find_reports, make_batch_id, run_batch
+from database import get_batch_files, set_batch_file_status
+
+@pytest.fixture
+def project(tmp_path):
+    folder = tmp_path / "project"
+    folder.mkdir()
+    for name in ["a.pdf", "b.pdf", "c.xlsx", "a_review.pdf", "~$c.xlsx", "notes.txt"]:
+        (folder / name).write_bytes(b"")
+    return folder
+
+@pytest.fixture
+def reviews(monkeypatch):
+    """
+    Stands in for review_file. Reports named in `reviews.failing` raise, those
+    in `reviews.partial` come back with a chunk the model could not review.
+    Every call is kept in `reviews.calls`.
+    """
+    class Reviews:
+        calls = []
+        failing = set()
+        partial = set()
+
+        def __call__(self, file_path, api_key, model_name, **options):
+            name = Path(file_path).name
+            self.calls.append(name)
+            if name in self.failing:
+                raise RuntimeError("worker crashed")
+            result = {
+                "run_id": f"run-{name}-{len(self.calls)}",
+                "findings": [{"page": 1, "issue": "off"}],
+                "metrics": {"wall_ms": 10.0, "llm": {"calls": 1, "prompt_tokens": 100, "completion_tokens": 10,
+                                                     "cost_usd": 0.001}},
+            }
+            if name in self.partial:
+                result["llm_errors"] = [{"chunk": 0, "pages": [1], "error": "rate limited"}]
+            return result
+
+    stub = Reviews()
+    monkeypatch.setattr(batch, "review_file", stub)
+    return stub
+
+def _run(project) -> dict:
+    # The extraction pool is never used by the stub review.
+    return run_batch([str(project)], "test-key", "gpt-4o", files_at_once=2, executor=object())
+
+def test_find_reports_skips_annotated_copies_and_lock_files(project):
+    assert [Path(path).name for path in find_reports([str(project)])] == ["a.pdf", "b.pdf", "c.xlsx"]
+
+def test_batch_id_is_stable_under_reordered_paths():
+    paths = ["/reports/b.pdf", "/reports/a.pdf", "/reports/c.xlsx"]
+
+    assert make_batch_id(paths, "gpt-4o") == make_batch_id(list(reversed(paths)), "gpt-4o")
+    assert make_batch_id(paths, "gpt-4o") != make_batch_id(paths, "gpt-4o", "gpt-4o-mini")
+    assert make_batch_id(paths, "gpt-4o") != make_batch_id(paths[:2], "gpt-4o")
+
+def test_rerun_skips_done_reports_and_retries_failed_ones(project, reviews):
+    reviews.failing = {"b.pdf"}
+    reviews.partial = {"c.xlsx"}
+
+    first = _run(project)
+
+    assert sorted(reviews.calls) == ["a.pdf", "b.pdf", "c.xlsx"]
+    assert (first["done"], first["reviewed"], first["skipped"]) == (1, 1, 0)
+    failed = {Path(f["file"]).name: f["error"] for f in first["failed"]}
+    assert failed == {"b.pdf": "worker crashed", "c.xlsx": "1 chunks could not be reviewed: rate limited"}
+    states = {Path(f["file_path"]).name: f for f in get_batch_files(first["batch_id"])}
+    # The partial review is kept for reference, but the report is not done.
+    assert states["c.xlsx"]["status"] == "failed" and states["c.xlsx"]["run_id"].startswith("run-c.xlsx")
+
+    reviews.calls.clear()
+    reviews.failing = set()
+    reviews.partial = set()
+    second = _run(project)
+
+    assert second["batch_id"] == first["batch_id"]
+    assert sorted(reviews.calls) == ["b.pdf", "c.xlsx"]
+    assert (second["done"], second["reviewed"], second["skipped"], second["failed"]) == (3, 2, 1, [])
+
+    reviews.calls.clear()
+    third = _run(project)
+
+    assert reviews.calls == []
+    assert (third["done"], third["skipped"]) == (3, 3)
+
+def test_reports_left_running_by_a_killed_batch_are_reviewed_again(project, reviews):
+    first = _run(project)
+    a_pdf = str(project.resolve() / "a.pdf")
+    # As if the worker had been killed while reviewing a.pdf.
+    set_batch_file_status(first["batch_id"], a_pdf, "running")
+    reviews.calls.clear()
+
+    second = _run(project)
+
+    assert reviews.calls == ["a.pdf"]
+    assert (second["done"], second["skipped"]) == (3, 2)
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import extract_cache
+import review
+from benchmarks.synthetic import make_tab_pdf
+from review import EXTRACTOR_VERSION, _extract_pages, iter_pdf_data
+from tables import Table, pack_items, unpack_items
+
+@pytest.fixture
+def report(tmp_path):
+    path = str(tmp_path / "report.pdf")
+    make_tab_pdf(path, pages=5, tables_per_page=1, rows_per_table=4, seed=7)
+    return path
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """The 0-based pages extracted by pdfplumber, as opposed to read from the cache."""
+    pages = []
+    extract_page = review._extract_page
+
+    def counting_extract_page(pdf, i):
+        pages.append(i)
+        return extract_page(pdf, i)
+
+    monkeypatch.setattr(review, "_extract_page", counting_extract_page)
+    return pages
+
+def _extract(path: str, **kwargs) -> list:
+    return pack_items(iter_pdf_data(path, workers=1, **kwargs))
+
+def test_pack_round_trip(report):
+    items = _extract_pages(report, [0, 1])
+
+    restored = unpack_items(extract_cache.decode(extract_cache.encode(pack_items(items))))
+
+    assert pack_items(restored) == pack_items(items)
+    table = next(item["content"] for item in restored if item["type"] == "table")
+    original = next(item["content"] for item in items if item["type"] == "table")
+    assert isinstance(table, Table)
+    assert table.to_csv(row_numbers=True) == original.to_csv(row_numbers=True)
+    assert (table.cell_bboxes == original.cell_bboxes).all()
+
+def test_partial_run_then_full_run_merges_cached_and_fresh_pages(report, parsed):
+    uncached = _extract(report, use_cache=False)
+    parsed.clear()
+
+    partial = _extract(report, pages=[1, 3], use_cache=True)
+    full = _extract(report, use_cache=True)
+    again = _extract(report, use_cache=True)
+
+    assert partial == [item for item in uncached if item["page"] in (2, 4)]
+    assert full == again == uncached
+    # Pages 1 and 3 were parsed by the first run only, the rest by the second; the third read everything cached.
+    assert parsed == [1, 3, 0, 2, 4]
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage"])
+def test_unreadable_cache_falls_back_to_extraction(report, parsed, damage):
+    expected = _extract(report, use_cache=True)
+    path = extract_cache.cache_path(review.hash_file(report), EXTRACTOR_VERSION)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2] if damage == "truncate" else b"not a cache file" + data[16:])
+    parsed.clear()
+
+    assert _extract(report, use_cache=True) == expected
+    assert parsed == [0, 1, 2, 3, 4]
+    # The damaged file was replaced by a good one.
+    with extract_cache.CacheReader(path) as reader:
+        assert sorted(reader.offsets) == [0, 1, 2, 3, 4]
+
+def test_evict_removes_least_recently_used_files_first():
+    extract_cache.EXTRACT_CACHE_DIR.mkdir(parents=True)
+    now = 1_700_000_000
+    for age, name in enumerate(["newest", "middle", "oldest"]):
+        path = extract_cache.EXTRACT_CACHE_DIR / f"{name}-v1.tcx"
+        path.write_bytes(b"x" * 1000)
+        os.utime(path, (now - age * 60, now - age * 60))
+    # A temporary file a worker left behind long ago.
+    leftover = extract_cache.EXTRACT_CACHE_DIR / "oldest-v1.tcx.abc.tmp"
+    leftover.write_bytes(b"x")
+    os.utime(leftover, (now, now))
+
+    assert extract_cache.evict(max_bytes=2500) == 1
+    assert sorted(p.name for p in extract_cache.EXTRACT_CACHE_DIR.iterdir()) == ["middle-v1.tcx", "newest-v1.tcx"]
+
+    assert extract_cache.evict(max_bytes=0) == 2
+    assert list(extract_cache.EXTRACT_CACHE_DIR.iterdir()) == []
@@ -0,0 +1,22 @@
+import pdfplumber
+
+import review
+from benchmarks.synthetic import make_tab_pdf
+
+def test_in_process_extraction_opens_the_pdf_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "report.pdf")
+    make_tab_pdf(path, pages=9, tables_per_page=1, rows_per_table=3, seed=5)
+    opened = []
+    real_open = pdfplumber.open
+
+    def counting_open(file_path, *args, **kwargs):
+        opened.append(file_path)
+        return real_open(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber, "open", counting_open)
+
+    items = list(review.iter_pdf_data(path, workers=1, use_cache=False))
+
+    assert opened == [path]
+    assert sorted({item["page"] for item in items}) == list(range(1, 10))
+    assert [item["type"] for item in items if item["page"] == 1] == ["table", "text"]
@@ -0,0 +1,49 @@
+from database import find_closest_run, record_run
+from review import match_pages, plan_incremental_review
+
+PROFILE = {"id": "default", "version": 1}
+
+def _record(run_id: str, page_hashes: list, findings: list = (), profile: dict = PROFILE, model_name: str = "gpt-4o",
+            scan_model: str = None):
+    record_run(run_id, profile, "project", f"file-{run_id}", {"findings": list(findings)}, page_hashes,
+               model_name=model_name, scan_model=scan_model)
+
+def test_repeated_pages_keep_their_findings_in_place():
+    _record("run-1", ["A", "B", "A"], [{"page": 1, "issue": "first"}, {"page": 3, "issue": "third"}])
+
+    base_run_id, changed, carried = plan_incremental_review("project", PROFILE, ["A", "B", "A"], "gpt-4o")
+
+    assert base_run_id == "run-1"
+    assert changed == []
+    assert [(finding["page"], finding["issue"]) for finding in carried] == [(1, "first"), (3, "third")]
+
+def test_moved_pages_are_matched_once_per_copy():
+    _record("run-1", ["A", "B"], [{"page": 1, "issue": "on A"}, {"page": 2, "issue": "on B"}])
+
+    _, changed, carried = plan_incremental_review("project", PROFILE, ["B", "A", "A", "C"], "gpt-4o")
+
+    # The second copy of A has no page to be matched with, so it is reviewed again with the new page C.
+    assert changed == [2, 3]
+    assert sorted((finding["page"], finding["issue"]) for finding in carried) == [(1, "on B"), (2, "on A")]
+
+def test_pages_without_a_fingerprint_are_never_matched():
+    assert match_pages(["A", None, "C"], ["A", "B", "C"]) == {1: 1, 3: 3}
+    assert match_pages(["A", "A"], ["X", "A", "A"]) == {2: 2, 1: 3}
+
+def test_closest_run_needs_the_same_profile_version_and_models():
+    _record("review-only", ["A", "B"])
+    _record("dual-pass", ["A", "B"], scan_model="gpt-4o-mini")
+    _record("other-model", ["A", "B", "C"], model_name="gpt-4")
+    _record("old-profile", ["A", "B", "C"], profile={"id": "default", "version": 0})
+
+    assert find_closest_run("project", PROFILE, ["A", "B", "C"], "gpt-4o") == "review-only"
+    assert find_closest_run("project", PROFILE, ["A", "B", "C"], "gpt-4o", "gpt-4o-mini") == "dual-pass"
+    assert find_closest_run("project", PROFILE, ["A", "B", "C"], "gpt-4") == "other-model"
+    assert find_closest_run("project", PROFILE, ["X"], "gpt-4o") is None
+    assert find_closest_run("other project", PROFILE, ["A"], "gpt-4o") is None
+
+def test_closest_run_prefers_the_most_shared_pages():
+    _record("one-shared", ["A", "X"])
+    _record("two-shared", ["A", "B"])
+
+    assert find_closest_run("project", PROFILE, ["A", "B", "C"], "gpt-4o") == "two-shared"
@@ -0,0 +1,72 @@
+import fitz  # PyMuPDF
+import pytest
+
+from annotator import add_annotations_to_pdf
+from benchmarks.synthetic import make_tab_pdf
+from layout import ReportIndex, index_items
+from review import _extract_pages
+
+@pytest.fixture
+def report(tmp_path):
+    """A one-page synthetic report, its extracted items and their layout index."""
+    path = str(tmp_path / "report.pdf")
+    make_tab_pdf(path, pages=1, tables_per_page=2, rows_per_table=5, seed=3)
+    index = ReportIndex()
+    items = list(index_items(_extract_pages(path, [0]), index))
+    return path, items, index
+
+def _inside(box, outer) -> bool:
+    return outer[0] - 1 <= box[0] <= box[2] <= outer[2] + 1 and outer[1] - 1 <= box[1] <= box[3] <= outer[3] + 1
+
+def test_index_keeps_boxes_not_contents(report):
+    _, items, index = report
+
+    assert all("words" not in item for item in items)
+    page = index.pages[1]
+    assert sorted(page.tables) == [1, 2]
+    table = page.tables[1]
+    assert table.columns["actual"] == 4
+    assert table.cell_bboxes.shape == (5, 7, 4)
+
+def test_locate_cell_row_and_table(report):
+    _, items, index = report
+    table = next(item for item in items if item.get("table") == 1)
+    table_box = table["content"].bbox
+    row = int(table["content"].row_numbers[2])
+
+    [cell] = index.locate({"page": 1, "table": 1, "row": row, "column": "Actual"})
+    [whole_row] = index.locate({"page": 1, "table": 1, "row": row})
+    [whole_table] = index.locate({"page": 1, "table": 1, "row": 999})
+
+    assert _inside(cell, whole_row) and _inside(whole_row, table_box)
+    assert whole_row[2] - whole_row[0] > cell[2] - cell[0]
+    assert whole_table == pytest.approx(table_box, abs=0.1)
+
+def test_locate_quote_matches_whole_words(report):
+    _, _, index = report
+
+    boxes = index.locate({"page": 1, "quote": "Air  Balance report"})
+    partial = index.locate({"page": 1, "quote": "ir Balance"})
+
+    assert len(boxes) == 1
+    assert boxes[0][0] < boxes[0][2]
+    assert partial == []
+    assert index.locate({"page": 2, "quote": "Air Balance Report"}) == []
+
+def test_annotator_falls_back_to_text_search(report, tmp_path):
+    path, _, _ = report
+    output = str(tmp_path / "report_review.pdf")
+    findings = [
+        # Nothing in the index: placed by searching the page for the quote.
+        {"page": 1, "quote": "Air Balance Report", "issue": "Title is missing the system name."},
+        {"page": 1, "issue": "Something that is not on the page."},
+    ]
+
+    add_annotations_to_pdf(path, findings, output, index=ReportIndex())
+
+    assert findings[0]["rects"]
+    assert findings[1]["rects"] == []
+    with fitz.open(output) as doc:
+        kinds = [annot.type[1] for annot in doc[0].annots()]
+    assert kinds.count("Highlight") == len(findings[0]["rects"])
+    assert kinds.count("Text") == 2
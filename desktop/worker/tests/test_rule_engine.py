@@ -0,0 +1,97 @@
+import pytest
+
+from rule_engine import check_table, classify, find_columns, screen_items
+from tables import Table
+
+TOLERANCES = {
+    "Supply": {"type": "percent", "value": 10},
+    "Coil_dT": {"type": "absolute", "value": 1.5, "unit": "°F"},
+}
+
+def _table(*body, header=("Terminal", "Design CFM", "Actual CFM")) -> Table:
+    return Table.from_rows([list(header)] + [list(row) for row in body], header_rows=1, page=1)
+
+@pytest.mark.parametrize("label, category", [
+    ("Supply Fan SA-1", "Supply"),
+    ("SA2", "Supply"),
+    ("EF-3", "Exhaust"),
+    ("RA", "Return"),
+    ("Outdoor Air Damper", "OA"),
+    ("Coil ΔT", "Coil_dT"),
+    ("DT", "Coil_dT"),
+    # Tags only count in upper case and outside longer words.
+    ("Area 3", None),
+    ("Rated flow", None),
+    ("Each", None),
+    ("Date", None),
+    ("sa", None),
+    ("SAT", None),
+])
+def test_classify_matches_whole_words_and_tags(label, category):
+    assert classify(label) == category
+
+def test_find_columns_skips_columns_about_the_reading():
+    table = _table(header=("Terminal", "Test Date", "Design CFM", "Test CFM"))
+
+    assert find_columns(table) == (2, 3)
+
+def test_find_columns_needs_design_and_actual():
+    assert find_columns(_table(header=("Terminal", "Design CFM", "Remarks"))) is None
+
+def test_check_table_flags_rows_out_of_tolerance():
+    table = _table(
+        ["SA-1", 500, 540],   # 8% off: within 10%
+        ["SA-2", 500, 600],   # 20% off
+        ["DT-1", 20, 18],     # 2 °F off: over 1.5
+        ["DT-2", 20, 19],     # 1 °F off
+        ["SA-3", 400, 300],   # 25% off
+    )
+
+    violations, ambiguous, checked = check_table(table, TOLERANCES)
+
+    assert checked == 5
+    assert list(ambiguous) == []
+    assert [(v["row"], v["category"]) for v in violations] == [(1, "Supply"), (2, "Coil_dT"), (4, "Supply")]
+    assert violations[0]["deviation"] == pytest.approx(20.0)
+    assert violations[0]["limit"] == "±10%"
+    assert violations[1]["deviation"] == pytest.approx(2.0)
+    assert violations[1]["limit"] == "±1.5 °F"
+
+def test_check_table_leaves_undecidable_rows_ambiguous():
+    table = _table(
+        ["SA-1", "500", "510"],
+        ["SA-2", "500", "n/a"],    # no reading
+        ["VAV-7", "500", "900"],   # no tolerance for the terminal
+        ["", "", ""],              # separator row: neither checked nor ambiguous
+        ["SA-3", "0", "20"],       # percent of a zero design value
+    )
+
+    violations, ambiguous, checked = check_table(table, TOLERANCES)
+
+    assert violations == []
+    assert checked == 1
+    assert list(ambiguous) == [1, 2, 4]
+
+def test_check_table_uses_the_header_category():
+    table = _table(["VAV-7", 500, 600], header=("Terminal", "Design Supply CFM", "Actual Supply CFM"))
+
+    violations, _, _ = check_table(table, TOLERANCES)
+
+    assert [v["category"] for v in violations] == ["Supply"]
+
+def test_screen_items_passes_on_only_ambiguous_rows():
+    settled = {"type": "table", "page": 1, "table": 1, "content": _table(["SA-1", 500, 600])}
+    mixed = {"type": "table", "page": 2, "table": 1, "content": _table(["SA-1", 500, 510], ["VAV-7", 500, 900])}
+    text = {"type": "text", "page": 2, "content": "Notes"}
+    findings = []
+
+    passed = list(screen_items([settled, mixed, text], {"tolerances": TOLERANCES}, findings))
+
+    assert [finding["page"] for finding in findings] == [1]
+    assert findings[0]["table"] == 1 and findings[0]["column"] == "Actual CFM"
+    assert [item["page"] for item in passed] == [2, 2]
+    remaining = passed[0]["content"]
+    assert remaining.body_rows() == [["VAV-7", "500", "900"]]
+    # Row numbers still point at the row in the source table.
+    assert list(remaining.row_numbers) == [2]
+    assert passed[1] is text
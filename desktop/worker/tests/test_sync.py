@@ -0,0 +1,107 @@
+import gzip
+import json
+
+import database
+from sync import INFLIGHT_BATCH_KEY, collapse, flush
+
+class StubResponse:
+    def __init__(self, status_code: int, body: dict):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+class StubClient:
+    """
+    Stands in for the httpx client of the cloud API. Keeps every batch posted
+    to /sync/batch and answers with the next of `statuses` (200 once they run out).
+    """
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.batches = []
+
+    def post(self, path, content, headers):
+        assert path == "/sync/batch" and headers["Content-Encoding"] == "gzip"
+        batch = json.loads(gzip.decompress(content))
+        self.batches.append(batch)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status != 200:
+            return StubResponse(status, {"detail": "unavailable"})
+        return StubResponse(200, {"applied": len(batch["ops"]), "stale": [], "rejected": [], "version": 7})
+
+def _profile(profile_id: str, name: str, version: int) -> dict:
+    return {"entity": "profile", "id": profile_id, "op": "upsert",
+            "data": {"name": name, "json_data": "{}", "version": version}}
+
+def test_collapse_keeps_the_last_write_per_entity():
+    rows = [
+        (1, _profile("p1", "First", 1)),
+        (2, {"entity": "rule", "id": "r1", "op": "upsert", "data": {"yaml_rule": "a", "version": 1}}),
+        (3, _profile("p1", "Second", 2)),
+        (4, {"entity": "rule", "id": "r1", "op": "delete"}),
+        # Same id, other entity: kept apart.
+        (5, {"entity": "rule", "id": "p1", "op": "delete"}),
+    ]
+
+    collapsed = collapse(rows)
+
+    assert collapsed == [
+        (_profile("p1", "Second", 2), [1, 3]),
+        ({"entity": "rule", "id": "r1", "op": "delete"}, [2, 4]),
+        ({"entity": "rule", "id": "p1", "op": "delete"}, [5]),
+    ]
+
+def test_failed_batch_is_resent_unchanged_and_rows_kept_until_confirmed():
+    database.queue_pending_updates([_profile("p1", "First", 1), _profile("p1", "Second", 2)])
+    client = StubClient(statuses=[503])
+
+    failed = flush(client=client)
+
+    assert failed["error"] and failed["rows"] == 0
+    assert len(database.get_pending_updates()) == 2
+    saved = database.get_sync_state(INFLIGHT_BATCH_KEY)
+    assert saved["ops"] == [_profile("p1", "Second", 2)]
+
+    # A write queued since then does not change the batch being retried.
+    database.queue_pending_updates([_profile("p1", "Third", 3)])
+    retried = flush(client=client)
+
+    first, second, third = client.batches
+    assert second == first == {"batch_id": saved["batch_id"], "ops": saved["ops"]}
+    assert third["ops"] == [_profile("p1", "Third", 3)]
+    assert retried["error"] is None
+    assert (retried["requests"], retried["rows"], retried["applied"], retried["version"]) == (2, 3, 2, 7)
+    assert database.get_pending_updates() == []
+    assert database.get_sync_state(INFLIGHT_BATCH_KEY) is None
+
+def test_transport_errors_leave_the_queue_alone():
+    class FailingClient(StubClient):
+        def post(self, path, content, headers):
+            raise ConnectionError("offline")
+
+    database.queue_pending_updates([_profile("p1", "First", 1)])
+
+    stats = flush(client=FailingClient())
+
+    assert "offline" in stats["error"]
+    assert [payload for _, payload in database.get_pending_updates()] == [_profile("p1", "First", 1)]
+
+def test_batch_ops_limit_leaves_the_rest_queued():
+    database.queue_pending_updates([_profile(f"p{i}", f"Profile {i}", 1) for i in range(5)])
+    client = StubClient(statuses=[200, 503])
+
+    stats = flush(batch_ops=2, client=client)
+
+    assert [[op["id"] for op in batch["ops"]] for batch in client.batches] == [["p0", "p1"], ["p2", "p3"]]
+    assert stats["rows"] == 2 and stats["error"]
+    assert [payload["id"] for _, payload in database.get_pending_updates()] == ["p2", "p3", "p4"]
+
+    stats = flush(batch_ops=2, client=client)
+
+    assert [op["id"] for op in client.batches[2]["ops"]] == ["p2", "p3"]
+    assert [op["id"] for op in client.batches[3]["ops"]] == ["p4"]
+    assert stats["rows"] == 3
+    assert database.get_pending_updates() == []